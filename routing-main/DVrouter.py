@@ -5,7 +5,7 @@
 #####################################################
 
 import sys
-import json # <<< QUAN TRỌNG: Đã import json
+import codec # <<< QUAN TRỌNG: Mã hóa/giải mã thông điệp định tuyến
 from router import Router
 from packet import Packet
 
@@ -13,13 +13,26 @@ from packet import Packet
 INFINITY = sys.maxsize
 
 class DVrouter(Router):
-    """Distance Vector Router implementation."""
+    """Distance Vector Router implementation.
 
-    def __init__(self, addr, heartbeat_time):
+    Cập nhật kích hoạt (triggered update) chỉ mang các đích có chi phí hoặc trạng thái
+    poison thay đổi so với lần gửi trước cho từng hàng xóm, và được gom lại trong
+    `coalesce_time` ms rồi gửi một lần ở handle_time. Với `coalesce_time` bằng 0 (mặc
+    định), cập nhật được gửi ngay trong callback làm route thay đổi, như trước đây.
+    Heartbeat vẫn gửi toàn bộ vector để đồng bộ lại.
+
+    Thông điệp được mã hóa bằng `codec_name` (xem codec.py); khi nhận, định dạng được
+    tự nhận diện nên router dùng JSON và router dùng định dạng gọn vẫn hiểu nhau.
+    """
+
+    def __init__(self, addr, heartbeat_time, coalesce_time=0, codec_name=None):
         """Initialize the router."""
         Router.__init__(self, addr) # Gọi __init__ của lớp cha
         self.heartbeat_time = heartbeat_time
+        self.codec = codec.get_codec(codec_name)
+        self.coalesce_time = coalesce_time
         self.last_time = 0
+        self.now = 0 # Thời gian của lần gọi handle_time gần nhất
 
         # --- Cấu trúc dữ liệu ---
         # Chi phí đến hàng xóm trực tiếp: {port: cost}
@@ -32,26 +45,92 @@ class DVrouter(Router):
         self.distance_vector = {self.addr: 0} # Khoảng cách đến chính mình luôn là 0
         # Bảng chuyển tiếp: {destination: (port, cost)}
         self.forwarding_table = {self.addr: (None, 0)} # Route đến chính mình
+        # Chỉ mục ngược của neighbor_endpoints: {endpoint_addr: {port: None}} (giữ thứ tự port)
+        self.endpoint_ports = {}
+        # Các đích đang đi qua từng port: {port: set(destination)}
+        self.routes_via = {}
+
+        # --- Cập nhật kích hoạt ---
+        # Vector đã gửi gần nhất cho từng hàng xóm: {port: {destination: cost}}
+        self.sent_vectors = {}
+        # Các đích thay đổi chưa được gửi, và thời điểm bắt đầu gom
+        self.dirty_dsts = set()
+        self.dirty_since = None
+        # Các port mới cần nhận toàn bộ vector ở lần gửi tới
+        self.full_sync_ports = set()
 
     def handle_new_link(self, port, endpoint, cost):
         """Xử lý khi có một liên kết mới được thiết lập."""
         # print(f"[{self.addr}] New link port {port} to {endpoint} cost {cost}")
-        self.link_costs[port] = cost
-        self.neighbor_endpoints[port] = endpoint
-        # Khởi tạo vector trống cho hàng xóm mới, chờ nhận thông tin
-        self.neighbor_vectors[port] = {}
-        # Tính toán lại và gửi cập nhật nếu cần
-        self.recompute_routes()
+        self.recompute_routes(self._add_neighbor(port, endpoint, cost))
 
     def handle_remove_link(self, port):
         """Xử lý khi một liên kết bị gỡ bỏ."""
         # print(f"[{self.addr}] Remove link port {port}")
-        # Xóa thông tin liên quan đến liên kết/port này
+        self.recompute_routes(self._remove_neighbor(port))
+        self.routes_via.pop(port, None)
+
+    def handle_link_cost(self, port, endpoint, cost):
+        """Xử lý khi chi phí của một liên kết thay đổi (liên kết vẫn giữ nguyên)."""
+        # print(f"[{self.addr}] Cost of link port {port} to {endpoint} is now {cost}")
+        self.recompute_routes(self._change_cost(port, cost))
+
+    def handle_link_changes(self, changes):
+        """Xử lý một loạt thay đổi liên kết xảy ra cùng lúc: cập nhật trạng thái của
+        từng liên kết rồi chỉ tính lại route một lần cho tất cả các đích bị ảnh hưởng,
+        và gửi một cập nhật kích hoạt cho cả loạt."""
+        affected = set()
+        removed = []
+        for change in changes:
+            if change[0] == "add":
+                affected |= self._add_neighbor(*change[1:])
+            elif change[0] == "cost":
+                affected |= self._change_cost(change[1], change[3])
+            else:
+                affected |= self._remove_neighbor(change[1])
+                removed.append(change[1])
+        self.recompute_routes(affected)
+        for port in removed:
+            if port not in self.link_costs: self.routes_via.pop(port, None)
+
+    def _add_neighbor(self, port, endpoint, cost):
+        """Ghi nhận liên kết mới; trả về các đích cần tính lại."""
+        self.link_costs[port] = cost
+        self.neighbor_endpoints[port] = endpoint
+        self.endpoint_ports.setdefault(endpoint, {})[port] = None
+        # Khởi tạo vector trống cho hàng xóm mới, chờ nhận thông tin
+        self.neighbor_vectors[port] = {}
+        # Hàng xóm mới cần nhận toàn bộ vector
+        self.full_sync_ports.add(port)
+        self._mark_dirty(())
+        # Vector của hàng xóm mới còn trống nên chỉ route đến chính hàng xóm có thể đổi
+        return {endpoint}
+
+    def _remove_neighbor(self, port):
+        """Xóa thông tin liên quan đến liên kết/port này; trả về các đích cần tính lại."""
         if port in self.link_costs: del self.link_costs[port]
-        if port in self.neighbor_endpoints: del self.neighbor_endpoints[port]
+        if port in self.neighbor_endpoints:
+            endpoint = self.neighbor_endpoints.pop(port)
+            ports = self.endpoint_ports.get(endpoint, {})
+            ports.pop(port, None)
+            if not ports: self.endpoint_ports.pop(endpoint, None)
         if port in self.neighbor_vectors: del self.neighbor_vectors[port]
-        # Tính toán lại và gửi cập nhật nếu cần
-        self.recompute_routes()
+        self.sent_vectors.pop(port, None)
+        self.full_sync_ports.discard(port)
+        # Chỉ các đích đang đi qua port này bị ảnh hưởng
+        return set(self.routes_via.get(port, ()))
+
+    def _change_cost(self, port, cost):
+        """Cập nhật chi phí liên kết tại chỗ; trả về các đích cần tính lại.
+        Vector của hàng xóm vẫn còn hiệu lực nên không cần đồng bộ lại toàn bộ."""
+        if port not in self.link_costs: return set()
+        self.link_costs[port] = cost
+        # Tăng chi phí chỉ ảnh hưởng các đích đang đi qua port này; giảm chi phí có thể
+        # kéo về port này các đích mà hàng xóm đã quảng bá, và cả chính hàng xóm
+        affected = set(self.routes_via.get(port, ()))
+        affected.update(self.neighbor_vectors.get(port, ()))
+        affected.add(self.neighbor_endpoints[port])
+        return affected
 
     def handle_packet(self, port, packet):
         """Xử lý một gói tin đến."""
@@ -82,133 +161,205 @@ class DVrouter(Router):
                  # print(f"[{self.addr}] Rcv ROUTING with empty content from {neighbor_addr}. Ignoring.")
                  return
 
-            # <<< QUAN TRỌNG: Giải mã JSON từ chuỗi content >>>
+            # <<< QUAN TRỌNG: Giải mã chuỗi content (JSON hoặc định dạng gọn) >>>
+            # Vector đầy đủ là một dict, cập nhật delta là ["delta", {destination: cost}]
             try:
-                received_vector = json.loads(content_str)
+                received_vector = codec.decode(content_str)
+                is_delta = isinstance(received_vector, list)
+                if is_delta:
+                    if len(received_vector) != 2 or received_vector[0] != "delta":
+                        return
+                    received_vector = received_vector[1]
                 # Đảm bảo kết quả giải mã là một dictionary
                 if not isinstance(received_vector, dict):
                     # print(f"[{self.addr}] Warning: Decoded JSON content is not a dict from {neighbor_addr}. Type: {type(received_vector)}")
                     return
-            except json.JSONDecodeError:
-                # print(f"[{self.addr}] Warning: Failed to decode JSON content from {neighbor_addr}. Content: '{content_str}'")
-                return # Bỏ qua gói tin không thể giải mã JSON
-            # <<< KẾT THÚC GIẢI MÃ JSON >>>
+            except ValueError:
+                # print(f"[{self.addr}] Warning: Failed to decode content from {neighbor_addr}. Content: '{content_str}'")
+                return # Bỏ qua gói tin không thể giải mã
+            # <<< KẾT THÚC GIẢI MÃ >>>
+
+            # Chỉ những đích có giá trị thay đổi so với vector trước mới cần tính lại.
+            # Đích không đổi giá trị thì kết quả không đổi, kể cả khi đang đi qua port này.
+            old_vector = self.neighbor_vectors.get(port, {})
+            changed_dsts = {dst for dst, cost in received_vector.items() if old_vector.get(dst) != cost}
 
             # Lưu trữ vector distance của hàng xóm
-            self.neighbor_vectors[port] = received_vector
+            if is_delta:
+                old_vector.update(received_vector)
+                self.neighbor_vectors[port] = old_vector
+            else:
+                changed_dsts.update(dst for dst in old_vector if dst not in received_vector)
+                self.neighbor_vectors[port] = received_vector
             # print(f"[{self.addr}] Stored vector from {neighbor_addr} (port {port}): {received_vector}")
 
             # Tính toán lại route dựa trên thông tin mới
-            self.recompute_routes()
+            self.recompute_routes(changed_dsts)
 
-    def recompute_routes(self):
+    def recompute_routes(self, destinations=None):
         """
-        Tính toán lại toàn bộ distance_vector và forwarding_table
-        dựa trên link_costs và neighbor_vectors hiện tại.
+        Tính toán lại distance_vector và forwarding_table dựa trên link_costs và
+        neighbor_vectors hiện tại.
+
+        Nếu `destinations` được cung cấp, chỉ tính lại các đích đó (Bellman-Ford tăng
+        dần, O(số đích thay đổi · số hàng xóm)). Nếu không, tính lại toàn bộ các đích.
+        Trả về tập các đích có route thay đổi (rỗng nếu không có thay đổi). Khi
+        `coalesce_time` bằng 0, cập nhật kích hoạt được gửi ngay tại đây.
         """
-        new_dv = {self.addr: 0} # Bắt đầu với route đến chính mình
-        new_ft = {self.addr: (None, 0)}
-
-        # Thu thập tất cả các đích có thể biết (từ hàng xóm và vector của hàng xóm)
-        all_possible_destinations = set()
-        for neighbor_vec in self.neighbor_vectors.values():
-            all_possible_destinations.update(neighbor_vec.keys())
-        all_possible_destinations.update(self.neighbor_endpoints.values())
-        if self.addr in all_possible_destinations:
-            all_possible_destinations.remove(self.addr) # Không cần tính route đến chính mình qua người khác
-
-        # Áp dụng Bellman-Ford để tìm đường đi ngắn nhất cho từng đích
-        for dst in all_possible_destinations:
-            min_cost_to_dst = INFINITY
-            best_port_to_dst = None
-
-            # 1. Kiểm tra đường đi trực tiếp (nếu đích là hàng xóm)
-            for port, neighbor_addr in self.neighbor_endpoints.items():
-                if neighbor_addr == dst:
-                    direct_cost = self.link_costs.get(port, INFINITY)
-                    if direct_cost < min_cost_to_dst:
-                        min_cost_to_dst = direct_cost
-                        best_port_to_dst = port
-                    # Không cần break, có thể có nhiều link đến cùng 1 hàng xóm (ít gặp)
-                    # Nhưng thường chỉ có 1 link trực tiếp
-
-            # 2. Kiểm tra đường đi qua các hàng xóm khác
-            for neighbor_port, neighbor_vector in self.neighbor_vectors.items():
-                cost_to_neighbor = self.link_costs.get(neighbor_port, INFINITY)
-                if cost_to_neighbor == INFINITY: continue # Link đến hàng xóm này đã mất
-
-                # Chi phí từ hàng xóm đó đến đích dst (theo vector hàng xóm gửi)
-                cost_via_neighbor = neighbor_vector.get(dst, INFINITY)
-
-                # Tính tổng chi phí: self -> neighbor -> dst
-                total_cost = INFINITY
-                if cost_via_neighbor != INFINITY: # Chỉ tính nếu hàng xóm biết đường đến dst
-                    total_cost = cost_to_neighbor + cost_via_neighbor
-
-                # Cập nhật nếu tìm được đường tốt hơn
-                if total_cost < min_cost_to_dst:
-                    min_cost_to_dst = total_cost
-                    best_port_to_dst = neighbor_port
-
-            # Lưu kết quả tốt nhất tìm được cho đích dst
+        if destinations is None:
+            # Thu thập tất cả các đích có thể biết (từ hàng xóm, vector của hàng xóm và
+            # bảng hiện tại để xóa các đích không còn đến được)
+            destinations = set(self.forwarding_table)
+            for neighbor_vec in self.neighbor_vectors.values():
+                destinations.update(neighbor_vec.keys())
+            destinations.update(self.neighbor_endpoints.values())
+
+        self.metrics.inc("router_route_computations_total", "recompute")
+        changed = set()
+        for dst in destinations:
+            if dst == self.addr:
+                continue # Không cần tính route đến chính mình qua người khác
+            best_port_to_dst, min_cost_to_dst = self._best_route(dst)
+            old_route = self.forwarding_table.get(dst)
             if best_port_to_dst is not None and min_cost_to_dst < INFINITY:
-                 new_dv[dst] = min_cost_to_dst
-                 new_ft[dst] = (best_port_to_dst, min_cost_to_dst)
-
-        # So sánh bảng mới với bảng cũ để xem có thay đổi không
-        if new_dv != self.distance_vector or new_ft != self.forwarding_table:
-            # print(f"[{self.addr}] Routes changed after recompute.") # Debug
-            self.distance_vector = new_dv
-            self.forwarding_table = new_ft
-            # Nếu có thay đổi, gửi vector mới của mình cho hàng xóm
-            self.send_vector()
-            return True # Có thay đổi
-        return False # Không có thay đổi
+                new_route = (best_port_to_dst, min_cost_to_dst)
+            else:
+                new_route = None
+            if new_route == old_route:
+                continue
+
+            # Cập nhật bảng và chỉ mục routes_via cho đích dst
+            changed.add(dst)
+            if old_route is not None:
+                self.routes_via[old_route[0]].discard(dst)
+            if new_route is None:
+                del self.distance_vector[dst]
+                del self.forwarding_table[dst]
+            else:
+                self.distance_vector[dst] = min_cost_to_dst
+                self.forwarding_table[dst] = new_route
+                self.routes_via.setdefault(best_port_to_dst, set()).add(dst)
+
+        if changed:
+            # print(f"[{self.addr}] Routes changed after recompute: {changed}") # Debug
+            self.metrics.add("router_forwarding_changes_total", len(changed))
+            # Nếu có thay đổi, lên lịch gửi cập nhật cho hàng xóm
+            self._mark_dirty(changed)
+        if self.coalesce_time == 0 and self.dirty_since is not None:
+            # Không gom: gửi cập nhật kích hoạt ngay, trong cùng callback
+            self.flush_updates()
+        return changed
+
+    def _best_route(self, dst):
+        """Áp dụng Bellman-Ford cho một đích: trả về (port, cost) tốt nhất đến dst."""
+        min_cost_to_dst = INFINITY
+        best_port_to_dst = None
+
+        # 1. Kiểm tra đường đi trực tiếp (nếu đích là hàng xóm)
+        for port in self.endpoint_ports.get(dst, ()):
+            direct_cost = self.link_costs.get(port, INFINITY)
+            if direct_cost < min_cost_to_dst:
+                min_cost_to_dst = direct_cost
+                best_port_to_dst = port
+            # Không cần break, có thể có nhiều link đến cùng 1 hàng xóm (ít gặp)
+
+        # 2. Kiểm tra đường đi qua các hàng xóm khác
+        for neighbor_port, neighbor_vector in self.neighbor_vectors.items():
+            cost_to_neighbor = self.link_costs.get(neighbor_port, INFINITY)
+            if cost_to_neighbor == INFINITY: continue # Link đến hàng xóm này đã mất
+
+            # Chi phí từ hàng xóm đó đến đích dst (theo vector hàng xóm gửi)
+            cost_via_neighbor = neighbor_vector.get(dst, INFINITY)
+            if cost_via_neighbor == INFINITY: continue # Hàng xóm không biết đường đến dst
+
+            # Cập nhật nếu tìm được đường tốt hơn: self -> neighbor -> dst
+            total_cost = cost_to_neighbor + cost_via_neighbor
+            if total_cost < min_cost_to_dst:
+                min_cost_to_dst = total_cost
+                best_port_to_dst = neighbor_port
+
+        return best_port_to_dst, min_cost_to_dst
 
     def handle_time(self, time_ms):
         """Xử lý sự kiện thời gian (heartbeat)."""
+        self.now = time_ms
         # Gửi định kỳ để đảm bảo thông tin được cập nhật và xử lý link down tiềm ẩn
         if time_ms - self.last_time >= self.heartbeat_time:
             self.last_time = time_ms
             # print(f"[{self.addr}] Heartbeat triggered. Sending vector.") # Debug
             self.send_vector()
+        elif self.dirty_since is not None and time_ms - self.dirty_since >= self.coalesce_time:
+            self.flush_updates()
+
+    def _mark_dirty(self, dsts):
+        """Ghi nhận các đích cần gửi trong cập nhật kích hoạt tiếp theo."""
+        self.dirty_dsts.update(dsts)
+        if self.dirty_since is None:
+            self.dirty_since = self.now
+
+    def _advertised_cost(self, dst, port):
+        """Chi phí đến dst quảng bá cho hàng xóm ở port (Split Horizon w/ Poisoned Reverse)."""
+        # Lấy thông tin route hiện tại để quyết định poisoned reverse
+        route_port, route_cost = self.forwarding_table.get(dst, (None, INFINITY))
+
+        # Poisoned Reverse logic:
+        if route_port == port:
+            # Nếu đường đi tốt nhất đến dst là qua chính hàng xóm (port) này,
+            # báo cho hàng xóm đó biết chi phí là vô cực (poison).
+            return INFINITY
+        # Ngược lại, báo chi phí thực tế (có thể là INFINITY nếu không có đường).
+        return route_cost
+
+    def _send_content(self, port, content):
+        # <<< QUAN TRỌNG: Mã hóa thành chuỗi >>>
+        try:
+            content_str = self.codec.encode(content)
+        except TypeError as e:
+            # print(f"[{self.addr}] ERROR: Failed to serialize DV: {e}. DV: {content}")
+            return # Không gửi nếu không serialize được
+        # <<< KẾT THÚC MÃ HÓA >>>
+
+        # Tạo gói tin với content là chuỗi đã mã hóa
+        pkt = Packet(Packet.ROUTING, self.addr, None, content=content_str)
+
+        # print(f"[{self.addr}] Sending vector to port {port}: {content_str}") # Debug
+        self.send(port, pkt) # Gửi gói tin
 
     def send_vector(self):
-        """Gửi distance vector tới tất cả các hàng xóm (Split Horizon w/ Poisoned Reverse)."""
+        """Gửi toàn bộ distance vector tới tất cả các hàng xóm (Split Horizon w/ Poisoned Reverse)."""
         # print(f"[{self.addr}] Preparing to send vectors. Current DV: {self.distance_vector}") # Debug
-        for port, link_cost in self.link_costs.items():
-            dv_to_send = {}
+        for port in self.link_costs:
             # Xây dựng vector riêng cho hàng xóm này
-            for dst, cost in self.distance_vector.items():
-                if dst == self.addr:
-                     continue # Không gửi route đến chính mình
-
-                # Lấy thông tin route hiện tại để quyết định poisoned reverse
-                route_port, route_cost = self.forwarding_table.get(dst, (None, INFINITY))
-
-                # Poisoned Reverse logic:
-                if route_port == port:
-                    # Nếu đường đi tốt nhất đến dst là qua chính hàng xóm (port) này,
-                    # báo cho hàng xóm đó biết chi phí là vô cực (poison).
-                    dv_to_send[dst] = INFINITY
-                    # print(f"[{self.addr}] Poisoning route to {dst} for port {port}") # Debug
-                else:
-                    # Ngược lại, báo chi phí thực tế (có thể là INFINITY nếu không có đường).
-                    dv_to_send[dst] = route_cost # Gửi chi phí thực tế trong DV của mình
-
-            # <<< QUAN TRỌNG: Chuyển đổi dictionary thành chuỗi JSON >>>
-            try:
-                content_str = json.dumps(dv_to_send)
-            except TypeError as e:
-                 # print(f"[{self.addr}] ERROR: Failed to serialize DV to JSON: {e}. DV: {dv_to_send}")
-                 continue # Không gửi nếu không serialize được
-            # <<< KẾT THÚC CHUYỂN ĐỔI JSON >>>
-
-            # Tạo gói tin với content là chuỗi JSON
-            pkt = Packet(Packet.ROUTING, self.addr, None, content=content_str)
-
-            # print(f"[{self.addr}] Sending vector to port {port}: {content_str}") # Debug
-            self.send(port, pkt) # Gửi gói tin
+            dv_to_send = {dst: self._advertised_cost(dst, port) for dst in self.distance_vector if dst != self.addr}
+            self._send_content(port, dv_to_send)
+            self.sent_vectors[port] = dv_to_send
+        self.dirty_dsts = set()
+        self.dirty_since = None
+        self.full_sync_ports = set()
+
+    def flush_updates(self):
+        """Gửi cập nhật kích hoạt: toàn bộ vector cho hàng xóm mới, và chỉ các đích
+        thay đổi so với lần gửi trước cho các hàng xóm còn lại."""
+        for port in self.link_costs:
+            if port in self.full_sync_ports:
+                dv_to_send = {dst: self._advertised_cost(dst, port) for dst in self.distance_vector if dst != self.addr}
+                self._send_content(port, dv_to_send)
+                self.sent_vectors[port] = dv_to_send
+                continue
+
+            sent = self.sent_vectors.setdefault(port, {})
+            delta = {}
+            for dst in self.dirty_dsts:
+                cost = self._advertised_cost(dst, port)
+                # Đích không có trong vector đã gửi được hàng xóm coi là vô cực
+                if sent.get(dst, INFINITY) != cost:
+                    delta[dst] = cost
+                    sent[dst] = cost
+            if delta:
+                self._send_content(port, ["delta", delta])
+        self.dirty_dsts = set()
+        self.dirty_since = None
+        self.full_sync_ports = set()
 
     def __repr__(self):
         """Representation for debugging."""
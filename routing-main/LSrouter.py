@@ -5,24 +5,49 @@
 #####################################################
 
 import sys
-import json
 import heapq
+import codec
 from router import Router
 from packet import Packet
 
 INFINITY = sys.maxsize
 
 class LSrouter(Router):
-    def __init__(self, addr, heartbeat_time):
+    """Link State Router implementation.
+
+    LSP chỉ được phát khi tập liên kết cục bộ thay đổi và được làm mới sau mỗi
+    `refresh_time` ms (mặc định 10 * heartbeat_time). Mỗi LSP mang tuổi (age); mục
+    nào trong LSDB không được làm mới sau `max_age` ms (mặc định 3 * refresh_time)
+    sẽ bị xóa. Tuổi được kiểm tra mỗi heartbeat_time ms.
+
+    LSP được mã hóa bằng `codec_name` (xem codec.py) và chuyển tiếp nguyên văn; khi
+    nhận, định dạng được tự nhận diện.
+    """
+
+    def __init__(self, addr, heartbeat_time, refresh_time=None, max_age=None, codec_name=None):
         Router.__init__(self, addr)
         self.heartbeat_time = heartbeat_time
+        self.codec = codec.get_codec(codec_name)
+        self.refresh_time = refresh_time or 10 * heartbeat_time
+        self.max_age = max_age or 3 * self.refresh_time
         self.last_time = 0
+        self.last_refresh = 0
+        self.now = None  # Thời gian của lần gọi handle_time gần nhất
         self.sequence_number = 0
         # LSDB: {router_addr: (sequence_num, {neighbor_addr: cost})}
         self.link_state_db = {self.addr: (self.sequence_number, {})}
+        # Thời điểm phát (ước lượng) của từng LSP trong LSDB: {router_addr: time_ms}
+        self.lsp_origin = {}
         self.forwarding_table = {self.addr: (None, 0)}
         self.link_costs = {}  # {port: cost}
         self.neighbor_endpoints = {}  # {port: endpoint_addr}
+        # Cây đường đi ngắn nhất (SPT) hiện tại, được cập nhật tăng dần
+        self.spf_dist = {self.addr: 0}  # {node: cost}
+        self.spf_parent = {self.addr: None}  # {node: predecessor trên SPT}
+        self.spf_children = {}  # {node: set(con trên SPT)}
+        self.spf_first_hop = {self.addr: None}  # {node: hàng xóm trực tiếp đầu tiên}
+        self.in_edges = {}  # Chỉ mục ngược của LSDB: {node: {router_addr: cost}}
+        self.neighbor_ports = {}  # {neighbor_addr: port} dùng cho forwarding_table
         # print(f"[{self.addr}] LSrouter Initialized. LSDB: {self.link_state_db}")
 
 
@@ -31,6 +56,8 @@ class LSrouter(Router):
         self.link_costs[port] = cost
         self.neighbor_endpoints[port] = endpoint
         self._broadcast_lsp("new_link")
+        # Đồng bộ LSDB với hàng xóm mới, vì LSP không còn được phát lại mỗi heartbeat
+        self._send_database(port)
 
 
     def handle_remove_link(self, port):
@@ -40,6 +67,35 @@ class LSrouter(Router):
         self._broadcast_lsp("remove_link")
 
 
+    def handle_link_cost(self, port, endpoint, cost):
+        # print(f"[{self.addr}] LS: LINK_COST - Port {port} to {endpoint}, Cost {cost}")
+        # Chỉ cạnh này thay đổi: phát lại LSP của mình, hàng xóm đã có đủ LSDB
+        if port not in self.link_costs: return
+        self.link_costs[port] = cost
+        self._broadcast_lsp("link_cost")
+
+
+    def handle_link_changes(self, changes):
+        """Xử lý một loạt thay đổi liên kết xảy ra cùng lúc: cập nhật tập liên kết cục
+        bộ, rồi chỉ phát một LSP (và chạy SPF một lần) cho cả loạt."""
+        added = []
+        for change in changes:
+            if change[0] == "add":
+                _, port, endpoint, cost = change
+                self.link_costs[port] = cost
+                self.neighbor_endpoints[port] = endpoint
+                added.append(port)
+            elif change[0] == "cost":
+                if change[1] in self.link_costs: self.link_costs[change[1]] = change[3]
+            else:
+                port = change[1]
+                if port in self.link_costs: del self.link_costs[port]
+                if port in self.neighbor_endpoints: del self.neighbor_endpoints[port]
+        self._broadcast_lsp("link_changes")
+        for port in added:
+            if port in self.link_costs: self._send_database(port)
+
+
     def handle_packet(self, port, packet):
         if packet.is_traceroute:
             if packet.dst_addr == self.addr: return
@@ -55,33 +111,41 @@ class LSrouter(Router):
                 return
 
             try:
-                lsp_data = json.loads(content_str)
+                lsp_data = codec.decode(content_str)
                 if not (isinstance(lsp_data, dict) and 'src' in lsp_data and
                         'seq' in lsp_data and 'neighbors' in lsp_data and
                         isinstance(lsp_data['neighbors'], dict)):
                     # print(f"[{self.addr}] LS: Invalid LSP format from {packet.src_addr}. Data: {lsp_data}")
                     return
-            except json.JSONDecodeError as e:
-                # print(f"[{self.addr}] LS: Failed to decode LSP JSON from {packet.src_addr}. Error: {e}. Content: '{content_str}'")
+            except ValueError as e:
+                # print(f"[{self.addr}] LS: Failed to decode LSP from {packet.src_addr}. Error: {e}. Content: '{content_str}'")
                 return
 
             lsp_src = lsp_data['src']
             lsp_seq = lsp_data['seq']
             lsp_neighbors = lsp_data['neighbors']
+            lsp_age = lsp_data.get('age', 0)
 
-            if lsp_src == self.addr:
+            if lsp_src == self.addr or lsp_age >= self.max_age:
+                self.metrics.inc("router_lsps_total", "ignored")
                 return
 
-            current_seq, _ = self.link_state_db.get(lsp_src, (-1, {}))
+            current_seq, old_neighbors = self.link_state_db.get(lsp_src, (-1, {}))
 
             if lsp_seq <= current_seq:
+                self.metrics.inc("router_lsps_total", "stale") # LSP cũ hoặc trùng lặp
                 return
 
+            self.metrics.inc("router_lsps_total", "accepted")
+
             # print(f"[{self.addr}] LS: ACCEPTED new LSP from {lsp_src} (Seq {lsp_seq}). Neighbors: {lsp_neighbors}. OLD_SEQ: {current_seq}")
             self.link_state_db[lsp_src] = (lsp_seq, lsp_neighbors)
+            self.lsp_origin[lsp_src] = None if self.now is None else self.now - lsp_age
             # print(f"[{self.addr}] LS: Updated LSDB for {lsp_src}. LSDB is now: {self.link_state_db}")
 
-            self._run_dijkstra(f"lsp_received_from_{lsp_src}")
+            # LSP làm mới với nội dung không đổi chỉ cập nhật seq và tuổi, không chạy SPF
+            if lsp_neighbors != old_neighbors:
+                self._update_spf(lsp_src, old_neighbors)
 
             pkt_to_flood = Packet(Packet.ROUTING, self.addr, None, content=content_str)
             for out_port_flood in self.link_costs:
@@ -91,9 +155,43 @@ class LSrouter(Router):
 
 
     def handle_time(self, time_ms):
+        if self.now is None:
+            # Các LSP nhận trước lần gọi đầu tiên được tính tuổi từ thời điểm này
+            self.lsp_origin = {src: time_ms if origin is None else origin for src, origin in self.lsp_origin.items()}
+            self.last_refresh = time_ms
+        self.now = time_ms
+
+        if time_ms - self.last_refresh >= self.refresh_time:
+            self._broadcast_lsp("refresh")
         if time_ms - self.last_time >= self.heartbeat_time:
             self.last_time = time_ms
-            self._broadcast_lsp("heartbeat")
+            self._expire_lsps(time_ms)
+
+
+    def _expire_lsps(self, time_ms):
+        """Xóa khỏi LSDB các LSP không được làm mới trong max_age ms."""
+        for lsp_src, origin in list(self.lsp_origin.items()):
+            if origin is not None and time_ms - origin >= self.max_age:
+                # print(f"[{self.addr}] LS: LSP from {lsp_src} expired")
+                self.metrics.inc("router_lsps_total", "expired")
+                del self.lsp_origin[lsp_src]
+                _, old_neighbors = self.link_state_db.pop(lsp_src)
+                self._update_spf(lsp_src, old_neighbors)
+
+
+    def _lsp_content(self, lsp_src, seq, neighbors, age):
+        return self.codec.encode({"src": lsp_src, "seq": seq, "neighbors": neighbors, "age": age})
+
+
+    def _send_database(self, port):
+        """Gửi toàn bộ LSP của các router khác trong LSDB ra `port`."""
+        for lsp_src, (seq, neighbors) in self.link_state_db.items():
+            if lsp_src == self.addr:
+                continue
+            origin = self.lsp_origin.get(lsp_src)
+            age = 0 if origin is None or self.now is None else self.now - origin
+            content_str = self._lsp_content(lsp_src, seq, neighbors, age)
+            self.send(port, Packet(Packet.ROUTING, self.addr, None, content=content_str))
 
 
     def _build_own_lsp_neighbors_dict(self):
@@ -108,24 +206,21 @@ class LSrouter(Router):
 
     def _broadcast_lsp(self, reason="unknown"):
         self.sequence_number += 1
+        if self.now is not None:
+            self.last_refresh = self.now
         own_lsp_neighbors = self._build_own_lsp_neighbors_dict()
-
-        lsp_content_dict = {
-            "src": self.addr,
-            "seq": self.sequence_number,
-            "neighbors": own_lsp_neighbors
-        }
         # print(f"[{self.addr}] LS: BROADCASTING own LSP (Seq {self.sequence_number}) due to '{reason}'. Neighbors: {own_lsp_neighbors}")
 
+        _, old_neighbors = self.link_state_db[self.addr]
         self.link_state_db[self.addr] = (self.sequence_number, own_lsp_neighbors)
         # print(f"[{self.addr}] LS: Updated own entry in LSDB. Current LSDB: {self.link_state_db}")
-        
-        self._run_dijkstra(f"own_lsp_broadcast_seq_{self.sequence_number}")
+
+        self._update_spf(self.addr, old_neighbors)
 
         try:
-            content_str = json.dumps(lsp_content_dict)
+            content_str = self._lsp_content(self.addr, self.sequence_number, own_lsp_neighbors, 0)
         except TypeError as e:
-            # print(f"[{self.addr}] LS: ERROR serializing own LSP to JSON: {e}. Dict: {lsp_content_dict}")
+            # print(f"[{self.addr}] LS: ERROR serializing own LSP to JSON: {e}. Neighbors: {own_lsp_neighbors}")
             return
 
         pkt = Packet(Packet.ROUTING, self.addr, None, content=content_str)
@@ -138,101 +233,166 @@ class LSrouter(Router):
 
 
     def _run_dijkstra(self, reason="unknown"):
+        """Tính lại toàn bộ SPT và forwarding_table từ LSDB.
+
+        Khi có nhiều đường cùng chi phí, predecessor được chọn là nút có địa chỉ nhỏ
+        nhất, để kết quả không phụ thuộc thứ tự xử lý và _update_spf cho ra cùng một
+        cây. First hop được mang theo trong lúc relax thay vì lần ngược chuỗi prev.
+        """
         # print(f"[{self.addr}] LS: RUNNING DIJKSTRA due to '{reason}'. LSDB for Dijkstra: {self.link_state_db}")
-        dist = {}
-        prev = {}
-        pq = []
-
-        # Khởi tạo dist cho tất cả các nút có thể biết được (từ keys của LSDB và neighbors trong values của LSDB)
-        all_reachable_nodes = set()
-        all_reachable_nodes.add(self.addr)
-        for router_addr_in_lsdb, (_, neighbors_dict_in_lsdb) in self.link_state_db.items():
-            all_reachable_nodes.add(router_addr_in_lsdb)
-            all_reachable_nodes.update(neighbors_dict_in_lsdb.keys())
-        
-        # print(f"[{self.addr}] LS Dijkstra: All potentially reachable nodes for init: {all_reachable_nodes}")
-
-        for node in all_reachable_nodes:
-            dist[node] = INFINITY
-            prev[node] = None
-        
-        dist[self.addr] = 0
-        heapq.heappush(pq, (0, self.addr))
-        # print(f"[{self.addr}] LS Dijkstra: Initializing. PQ: {pq}. Dist[{self.addr}]: {dist[self.addr]}")
-
-        processed_nodes = set()
+        self.metrics.inc("router_route_computations_total", "spf_full")
+        self.in_edges = {}
+        for u, (_, u_neighbors) in self.link_state_db.items():
+            for v, cost_uv in u_neighbors.items():
+                self.in_edges.setdefault(v, {})[u] = cost_uv
 
+        dist = {}
+        parent = {}
+        first_hop = {}
+        children = {}
+        best = {self.addr: (0, "")}
+        pq = [(0, "", self.addr)]
         while pq:
-            d, u = heapq.heappop(pq)
-
-            if u in processed_nodes:
+            d, p, u = heapq.heappop(pq)
+            if u in dist:
                 continue
-            processed_nodes.add(u)
-            # print(f"[{self.addr}] LS Dijkstra: Processing node {u} with cost {d}")
+            # Lần pop đầu tiên của u mang khóa (cost, predecessor) nhỏ nhất
+            dist[u] = d
+            parent[u] = p or None
+            if u != self.addr:
+                first_hop[u] = u if p == self.addr else first_hop[p]
+                children.setdefault(p, set()).add(u)
+            else:
+                first_hop[u] = None
 
-            # Lấy thông tin hàng xóm của u TỪ LSDB. Nếu u không có trong LSDB, nó không thể mở rộng.
             if u not in self.link_state_db:
-                # print(f"[{self.addr}] LS Dijkstra: Node {u} not in self.link_state_db, cannot expand its neighbors.")
-                continue
-            
+                continue  # Nút không có LSP (client) không thể mở rộng
             _, u_lsp_neighbors_dict = self.link_state_db[u]
-            # print(f"[{self.addr}] LS Dijkstra: Neighbors of {u} from its LSP: {u_lsp_neighbors_dict}")
-
-            for v_neighbor_addr, cost_uv in u_lsp_neighbors_dict.items():
-                # Hàng xóm v phải là một nút đã được khởi tạo trong dist
-                if v_neighbor_addr not in dist:
-                    # print(f"[{self.addr}] LS Dijkstra WARNING: Neighbor {v_neighbor_addr} of {u} was not in initial reachable set. Skipping relax.")
+            for v, cost_uv in u_lsp_neighbors_dict.items():
+                if v in dist:
                     continue
-
-                if v_neighbor_addr not in processed_nodes:
-                    new_dist_to_v = d + cost_uv
-                    if new_dist_to_v < dist[v_neighbor_addr]:
-                        dist[v_neighbor_addr] = new_dist_to_v
-                        prev[v_neighbor_addr] = u
-                        heapq.heappush(pq, (new_dist_to_v, v_neighbor_addr))
-                        # print(f"[{self.addr}] LS Dijkstra: Relaxed {u}->{v_neighbor_addr}. New dist[{v_neighbor_addr}] = {new_dist_to_v}. Prev[{v_neighbor_addr}] = {u}")
-        
-        # print(f"[{self.addr}] LS Dijkstra: Final dist: {dist}")
-        # print(f"[{self.addr}] LS Dijkstra: Final prev: {prev}")
-
-        new_ft = {self.addr: (None, 0)}
-        my_direct_neighbor_addr_to_port = {addr: p for p, addr in self.neighbor_endpoints.items() if p in self.link_costs}
-        # print(f"[{self.addr}] LS Dijkstra: My direct neighbor_to_port map for FT: {my_direct_neighbor_addr_to_port}")
-
-        for dest_node in all_reachable_nodes:
-            if dest_node == self.addr or dist.get(dest_node, INFINITY) == INFINITY:
-                continue
-
-            path_curr = dest_node
-            first_hop_on_path = None
-            
-            # print(f"[{self.addr}] LS Dijkstra: Tracing path from {self.addr} to {dest_node}")
-            while prev.get(path_curr) is not None:
-                if prev[path_curr] == self.addr:
-                    first_hop_on_path = path_curr
-                    break
-                path_curr = prev[path_curr]
-                if path_curr == self.addr : # Đã quay về gốc mà không qua hàng xóm trực tiếp
-                    break # Dừng nếu prev[path_curr] không phải là self.addr
-            
-            # print(f"[{self.addr}] LS Dijkstra: For dest {dest_node}, first_hop_on_path: {first_hop_on_path}")
-
-            if first_hop_on_path:
-                outgoing_port = my_direct_neighbor_addr_to_port.get(first_hop_on_path)
-                if outgoing_port is not None:
-                    new_ft[dest_node] = (outgoing_port, dist[dest_node])
-                    # print(f"[{self.addr}] LS Dijkstra: FT ADDED: Dest={dest_node}, NextHop={first_hop_on_path}, OutPort={outgoing_port}, Cost={dist[dest_node]}")
-                # else:
-                    # print(f"[{self.addr}] LS Dijkstra ERROR: No DIRECT outgoing port found for first_hop '{first_hop_on_path}' to reach '{dest_node}'. My direct neighbors: {my_direct_neighbor_addr_to_port}")
-            # else:
-                # print(f"[{self.addr}] LS Dijkstra: No valid first_hop found from {self.addr} for dest '{dest_node}'. Dist: {dist.get(dest_node)}")
-        
-        # print(f"[{self.addr}] LS: Dijkstra computed FT: {new_ft}")
-        if new_ft != self.forwarding_table:
-            # print(f"[{self.addr}] LS: Forwarding table UPDATED.")
-            self.forwarding_table = new_ft
-        # else:
-            # print(f"[{self.addr}] LS: Forwarding table UNCHANGED after Dijkstra.")
+                key = (d + cost_uv, u)
+                if v not in best or key < best[v]:
+                    best[v] = key
+                    heapq.heappush(pq, (d + cost_uv, u, v))
+
+        self.spf_dist = dist
+        self.spf_parent = parent
+        self.spf_first_hop = first_hop
+        self.spf_children = children
+        self._rebuild_forwarding_table()
+
+    def _update_spf(self, src, old_neighbors):
+        """Cập nhật tăng dần SPT sau khi tập hàng xóm của `src` trong LSDB đổi từ
+        `old_neighbors` sang giá trị hiện tại.
+
+        Chỉ cây con nằm dưới các cạnh của `src` bị xóa hoặc tăng chi phí bị tính lại,
+        còn các cạnh mới hoặc giảm chi phí chỉ relax từ `src`. Kết quả giống hệt
+        _run_dijkstra.
+        """
+        self.metrics.inc("router_route_computations_total", "spf_incremental")
+        _, new_neighbors = self.link_state_db.get(src, (-1, {}))
+        for v in old_neighbors:
+            if v not in new_neighbors:
+                self.in_edges.get(v, {}).pop(src, None)
+        for v, cost in new_neighbors.items():
+            self.in_edges.setdefault(v, {})[src] = cost
+
+        dist = self.spf_dist
+        parent = self.spf_parent
+        children = self.spf_children
+        touched = set()
+        if src in dist and new_neighbors != old_neighbors:
+            # 1. Vô hiệu hóa cây con dưới các cạnh bị xóa hoặc tăng chi phí
+            invalid = set()
+            for v, old_cost in old_neighbors.items():
+                if parent.get(v) == src and new_neighbors.get(v, INFINITY) > old_cost:
+                    stack = [v]
+                    while stack:
+                        x = stack.pop()
+                        invalid.add(x)
+                        stack.extend(children.get(x, ()))
+            for x in invalid:
+                if parent[x] not in invalid:
+                    children[parent[x]].discard(x)
+            for x in invalid:
+                children.pop(x, None)
+                del dist[x]
+                del parent[x]
+                self.spf_first_hop.pop(x, None)
+            touched |= invalid
+
+            # 2. Gieo hàng đợi từ các predecessor còn hợp lệ và từ các cạnh của src
+            pq = []
+            for x in invalid:
+                for u, cost_ux in self.in_edges.get(x, {}).items():
+                    if u in dist:
+                        heapq.heappush(pq, (dist[u] + cost_ux, u, x))
+            for v, cost in new_neighbors.items():
+                heapq.heappush(pq, (dist[src] + cost, src, v))
+
+            # 3. Dijkstra chỉ trên vùng bị ảnh hưởng
+            while pq:
+                d, p, v = heapq.heappop(pq)
+                if v in dist and (d, p) >= (dist[v], parent[v] or ""):
+                    continue
+                if v in parent and parent[v] is not None:
+                    children[parent[v]].discard(v)
+                dist[v] = d
+                parent[v] = p
+                children.setdefault(p, set()).add(v)
+                touched.add(v)
+                if v in self.link_state_db:
+                    for w, cost_vw in self.link_state_db[v][1].items():
+                        if w not in dist or (d + cost_vw, v) < (dist[w], parent[w] or ""):
+                            heapq.heappush(pq, (d + cost_vw, v, w))
+
+        # 4. Cập nhật first hop từ trên xuống cho các nút bị ảnh hưởng
+        dirty = set(touched)
+        for x in sorted((x for x in touched if x in dist), key=dist.get):
+            stack = [x]
+            while stack:
+                y = stack.pop()
+                p = parent[y]
+                fh = y if p == self.addr else self.spf_first_hop.get(p)
+                if y != x and self.spf_first_hop.get(y) == fh:
+                    continue
+                self.spf_first_hop[y] = fh
+                dirty.add(y)
+                stack.extend(children.get(y, ()))
+
+        # 5. Cập nhật forwarding_table
+        neighbor_ports = {addr: p for p, addr in self.neighbor_endpoints.items() if p in self.link_costs}
+        if neighbor_ports != self.neighbor_ports:
+            self._rebuild_forwarding_table()
+            return
+        changes = 0
+        for x in dirty:
+            changes += self._set_route(x)
+        self.metrics.add("router_forwarding_changes_total", changes)
+
+    def _rebuild_forwarding_table(self):
+        """Dựng lại forwarding_table từ SPT hiện tại."""
+        self.neighbor_ports = {addr: p for p, addr in self.neighbor_endpoints.items() if p in self.link_costs}
+        old_table = self.forwarding_table
+        self.forwarding_table = {self.addr: (None, 0)}
+        for dest_node in self.spf_dist:
+            self._set_route(dest_node)
+        changes = sum(1 for dst in old_table.keys() | self.forwarding_table.keys() if old_table.get(dst) != self.forwarding_table.get(dst))
+        self.metrics.add("router_forwarding_changes_total", changes)
+
+    def _set_route(self, dest_node):
+        """Cập nhật mục của `dest_node` trong forwarding_table theo SPT hiện tại.
+        Trả về True nếu mục đó thay đổi."""
+        if dest_node == self.addr:
+            return False
+        old_route = self.forwarding_table.get(dest_node)
+        outgoing_port = self.neighbor_ports.get(self.spf_first_hop.get(dest_node))
+        if dest_node in self.spf_dist and outgoing_port is not None:
+            self.forwarding_table[dest_node] = (outgoing_port, self.spf_dist[dest_node])
+        else:
+            self.forwarding_table.pop(dest_node, None)
+        return self.forwarding_table.get(dest_node) != old_route
 
 
     def __repr__(self):
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+
+class AsyncioRuntime:
+    """
+    The AsyncioRuntime class runs the routers, clients, link deliveries and link
+    changes of a network as asyncio tasks in a single event loop, in real time. The
+    loop runs in one background thread, so the rest of the network (and the
+    visualizer) can keep calling into it from other threads.
+
+    It also serves as the link delivery scheduler of the network.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        self._stopped = None
+
+    def time_ms(self):
+        """Return the current time of the event loop clock in ms."""
+        return self.loop.time() * 1000
+
+    def _in_loop(self):
+        return self._thread is not None and threading.get_ident() == self._thread.ident
+
+    def call_soon(self, fn, *args):
+        """Call `fn(*args)` from the event loop as soon as possible. Safe to call from
+        any thread."""
+        if self._in_loop():
+            self.loop.call_soon(fn, *args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def schedule(self, delay, fn, *args):
+        """Call `fn(*args)` from the event loop after `delay` ms."""
+        if self._in_loop():
+            self.loop.call_later(delay / 1000, fn, *args)
+        else:
+            self.loop.call_soon_threadsafe(self.loop.call_later, delay / 1000, fn, *args)
+
+    def start(self, network):
+        """Start the event loop thread running `network`."""
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=self.loop.run_until_complete,
+            args=(self._main(network, started),),
+            daemon=True,
+        )
+        self._thread.start()
+        started.wait()
+
+    def stop(self):
+        """Cancel all tasks and stop the event loop thread."""
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+        self.loop.close()
+        self._thread = None
+
+    async def _main(self, network, started):
+        self._stopped = asyncio.Event()
+        tasks = []
+        for router in network.routers.values():
+            wake = asyncio.Event()
+            router.inbox_listener = lambda wake=wake: self.call_soon(wake.set)
+            tasks.append(asyncio.create_task(self._run_router(router, wake)))
+        for client in network.clients.values():
+            tasks.append(asyncio.create_task(self._run_client(client, network.TICK_MS)))
+        network.add_links()
+        if network.changes:
+            tasks.append(asyncio.create_task(self._handle_changes(network)))
+        started.set()
+
+        await self._stopped.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_router(self, router, wake):
+        """Main loop of a router: wake up on arrivals and call `handle_time` every
+        `TICK_MS` ms, like `Router.run`."""
+        next_time = self.time_ms() + router.TICK_MS
+        while router.keep_running:
+            try:
+                async with asyncio.timeout_at(next_time / 1000):
+                    await wake.wait()
+            except TimeoutError:
+                pass
+            wake.clear()
+            router.process_inbox()
+            time_ms = self.time_ms()
+            if time_ms >= next_time:
+                router.tick(int(round(time_ms)))
+                next_time = time_ms + router.TICK_MS
+
+    async def _run_client(self, client, tick_ms):
+        """Main loop of a client, like `Client.run`."""
+        while client.keep_running:
+            await asyncio.sleep(tick_ms / 1000)
+            client.step(int(round(self.time_ms())))
+
+    async def _handle_changes(self, network):
+        """Apply the link changes of `network` at their scheduled times, like
+        `Network.handle_changes`."""
+        start_time = self.time_ms()
+        while not network.changes.empty():
+            change_time, target, change = network.changes.get()
+            wait_time = (
+                change_time * network.latency_multiplier + start_time
+            ) - self.time_ms()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time / 1000)
+            network.apply_change(change, target)
@@ -0,0 +1,62 @@
+import argparse
+import random
+import sys
+import timeit
+
+import codec
+
+INFINITY = sys.maxsize
+
+
+def sample_messages(num_dsts, seed=0):
+    """Return routing messages like the ones DVrouter and LSrouter send in a network
+    with `num_dsts` destinations."""
+    rng = random.Random(seed)
+    dsts = [f"R{i}" for i in range(num_dsts)]
+    vector = {
+        dst: INFINITY if rng.random() < 0.3 else rng.randint(1, 100) for dst in dsts
+    }
+    delta = ["delta", {dst: vector[dst] for dst in rng.sample(dsts, max(1, num_dsts // 10))}]
+    lsp = {
+        "src": dsts[0],
+        "seq": 1234,
+        "neighbors": {dst: rng.randint(1, 20) for dst in rng.sample(dsts, min(4, num_dsts))},
+        "age": 500,
+    }
+    return {"DV vector": vector, "DV delta": delta, "LSP": lsp}
+
+
+def bench(message, c, number):
+    encoded = c.encode(message)
+    assert codec.decode(encoded) == message
+    encode_time = timeit.timeit(lambda: c.encode(message), number=number) / number
+    decode_time = timeit.timeit(lambda: codec.decode(encoded), number=number) / number
+    return len(encoded), encode_time * 1e6, decode_time * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the size and speed of the routing message codecs."
+    )
+    parser.add_argument(
+        "--dsts",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="Numbers of destinations to benchmark.",
+    )
+    parser.add_argument(
+        "--number", type=int, default=1000, help="Iterations per measurement."
+    )
+    args = parser.parse_args()
+
+    print(f"{'message':<10} {'dsts':>6} {'codec':<8} {'bytes':>8} {'enc us':>9} {'dec us':>9}")
+    for num_dsts in args.dsts:
+        for kind, message in sample_messages(num_dsts).items():
+            for name, c in codec.CODECS.items():
+                size, enc, dec = bench(message, c, args.number)
+                print(f"{kind:<10} {num_dsts:>6} {name:<8} {size:>8} {enc:>9.1f} {dec:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import tempfile
+import time
+from packet import Packet
+
+DEFAULT_SCENARIOS = [
+    "01_small_net.json",
+    "02_small_net_events.json",
+    "03_pg244_net.json",
+    "04_pg244_net_events.json",
+    "05_pg242_net.json",
+    "06_pg242_net_events.json",
+    "07_pg242_net_costs.json",
+]
+ROUTERS = ("DV", "LS")
+# Methods of the routers whose calls are counted, if the router has them
+COUNTED_METHODS = ("recompute_routes", "_run_dijkstra", "_update_spf")
+
+
+def _calls_field(name):
+    return "calls_" + name.lstrip("_")
+
+
+FIELDS = (
+    ["scenario", "router", "routers", "status", "correct"]
+    + ["convergence_ms", "converged_at_ms"]
+    + ["routing_packets", "routing_bytes"]
+    + [_calls_field(name) for name in COUNTED_METHODS]
+    + ["cpu_s", "wall_s", "peak_rss_kb"]
+)
+# Counter of the routers' metrics (see metrics.py) that changes with their
+# forwarding tables
+FORWARDING_CHANGES = ("router_forwarding_changes_total",)
+# Metrics compared against the baseline, where higher is worse
+COMPARED = ["convergence_ms", "routing_packets", "routing_bytes", "cpu_s", "peak_rss_kb"]
+
+
+def instrument(RouterClass, stats, clock):
+    """Return a subclass of `RouterClass` that counts routing packets and bytes,
+    calls of COUNTED_METHODS, and records in `stats` the last time any forwarding
+    table changed, read from `clock()`.
+
+    Forwarding table changes are detected from the router's
+    router_forwarding_changes_total counter, so the network must collect metrics.
+    """
+
+    def send(self, port, packet):
+        if packet.kind == Packet.ROUTING:
+            stats["routing_packets"] += 1
+            stats["routing_bytes"] += len(packet.content or "")
+        RouterClass.send(self, port, packet)
+
+    def watched(method):
+        def wrapper(self, *args):
+            counters = self.metrics.counters
+            before = counters.get(FORWARDING_CHANGES, 0)
+            result = method(self, *args)
+            if counters.get(FORWARDING_CHANGES, 0) != before:
+                stats["converged_at_ms"] = clock()
+            return result
+
+        return wrapper
+
+    def counted(name, method):
+        field = _calls_field(name)
+
+        def wrapper(self, *args, **kwargs):
+            stats[field] += 1
+            return method(self, *args, **kwargs)
+
+        return wrapper
+
+    namespace = {
+        "send": send,
+        "_dispatch": watched(RouterClass._dispatch),
+        "apply_link_changes": watched(RouterClass.apply_link_changes),
+        "handle_time": watched(RouterClass.handle_time),
+    }
+    for name in COUNTED_METHODS:
+        if hasattr(RouterClass, name):
+            namespace[name] = counted(name, getattr(RouterClass, name))
+    return type(RouterClass.__name__, (RouterClass,), namespace)
+
+
+def router_class(name):
+    if name == "DV":
+        from DVrouter import DVrouter
+
+        return DVrouter
+    from LSrouter import LSrouter
+
+    return LSrouter
+
+
+def run_one(net_json_path, router):
+    """Run one scenario with one router on the discrete-event engine and return its
+    measurements. Call it in a fresh process to measure its peak memory."""
+    from network import Network
+
+    stats = dict.fromkeys(FIELDS, 0)
+    stats["status"] = "ok"
+    network = None
+    RouterClass = instrument(
+        router_class(router), stats, lambda: network.time_ms()
+    )
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    network = Network(net_json_path, RouterClass, engine="des")
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        network.run()
+    stats["cpu_s"] = round(time.process_time() - cpu_start, 4)
+    stats["wall_s"] = round(time.perf_counter() - wall_start, 4)
+    stats["peak_rss_kb"] = _peak_rss_kb()
+
+    stats["scenario"] = os.path.basename(net_json_path)
+    stats["router"] = router
+    stats["routers"] = len(network.routers)
+    stats["correct"] = output.getvalue().rstrip().endswith("SUCCESS: All Routes correct!")
+    stats["convergence_ms"] = max(0, stats["converged_at_ms"] - network.last_change_time)
+    return stats
+
+
+def _peak_rss_kb():
+    """Return the peak memory of this process in kB."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_in_child(net_json_path, router, results):
+    results.put(run_one(net_json_path, router))
+
+
+def run_isolated(net_json_path, router, timeout=None):
+    """Run `run_one` in a new process. If the process fails or takes more than
+    `timeout` seconds, return measurements with status "error" or "timeout"."""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_in_child, args=(net_json_path, router, results))
+    start = time.monotonic()
+    process.start()
+    status = "error"
+    while True:
+        try:
+            stats = results.get(timeout=1)
+            process.join()
+            return stats
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # The result may still be in transit when the process exits
+            try:
+                stats = results.get(timeout=1)
+                process.join()
+                return stats
+            except queue.Empty:
+                break
+        if timeout is not None and time.monotonic() - start > timeout:
+            status = "timeout"
+            process.terminate()
+            break
+    process.join()
+    stats = dict.fromkeys(FIELDS, 0)
+    stats.update(
+        scenario=os.path.basename(net_json_path),
+        router=router,
+        status=status,
+        correct=False,
+    )
+    stats["wall_s"] = round(time.monotonic() - start, 4)
+    return stats
+
+
+def generated_scenarios(family, sizes, seed, flaps, directory):
+    """Write one generated configuration per size to `directory` and return their
+    paths."""
+    from generate_network import generate
+
+    paths = []
+    for size in sizes:
+        path = os.path.join(directory, f"{family}_{size}_seed{seed}.json")
+        with open(path, "w") as f:
+            json.dump(generate(family, size, seed=seed, flaps=flaps), f)
+        paths.append(path)
+    return paths
+
+
+def compare(results, baseline, threshold):
+    """Print the relative change of every compared metric against `baseline` and
+    return the list of regressions larger than `threshold`."""
+    previous = {(r["scenario"], r["router"]): r for r in baseline}
+    regressions = []
+    print(f"\n{'scenario':<32} {'router':<6} {'metric':<16} {'baseline':>12} {'now':>12} {'change':>8}")
+    for result in results:
+        base = previous.get((result["scenario"], result["router"]))
+        if base is None:
+            continue
+        fields = COMPARED + [_calls_field(name) for name in COUNTED_METHODS]
+        for field in fields:
+            old, new = base.get(field, 0), result[field]
+            if not old and not new:
+                continue
+            change = (new - old) / old if old else float("inf")
+            flag = ""
+            if change > threshold:
+                flag = " REGRESSION"
+                regressions.append((result["scenario"], result["router"], field, old, new))
+            print(
+                f"{result['scenario']:<32} {result['router']:<6} {field:<16} "
+                f"{old:>12} {new:>12} {change:>+8.1%}{flag}"
+            )
+        if base.get("correct") and not result["correct"]:
+            regressions.append((result["scenario"], result["router"], "correct", True, False))
+            print(f"{result['scenario']:<32} {result['router']:<6} routes are no longer correct")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark DVrouter and LSrouter on a matrix of scenarios."
+    )
+    parser.add_argument(
+        "scenarios",
+        type=str,
+        nargs="*",
+        help="Network configuration files (JSON or binary). Defaults to the "
+        "supplied scenarios unless --sizes is given.",
+    )
+    parser.add_argument(
+        "--routers", type=str, nargs="+", choices=ROUTERS, default=list(ROUTERS)
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=[],
+        help="Also run topologies generated with generate_network.py with these "
+        "numbers of routers.",
+    )
+    parser.add_argument(
+        "--family", type=str, default="geometric", help="Family of generated topologies."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of generated topologies.")
+    parser.add_argument(
+        "--flaps", type=int, default=3, help="Link flaps in generated topologies."
+    )
+    parser.add_argument("--json", type=str, help="Write the results to this JSON file.")
+    parser.add_argument("--csv", type=str, help="Write the results to this CSV file.")
+    parser.add_argument(
+        "--baseline", type=str, help="Compare the results with this JSON file."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="Seconds after which a run is stopped and recorded as timed out.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative increase of a metric reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        scenarios = list(args.scenarios)
+        if not scenarios and not args.sizes:
+            scenarios = DEFAULT_SCENARIOS
+        scenarios += generated_scenarios(
+            args.family, args.sizes, args.seed, args.flaps, directory
+        )
+
+        results = []
+        print(
+            f"{'scenario':<32} {'router':<6} {'ok':<7} {'conv ms':>8} {'pkts':>8} "
+            f"{'bytes':>10} {'cpu s':>7} {'rss kB':>8}"
+        )
+        for scenario in scenarios:
+            for router in args.routers:
+                stats = run_isolated(scenario, router, args.timeout)
+                results.append(stats)
+                ok = "yes" if stats["correct"] else "NO"
+                if stats["status"] != "ok":
+                    ok = stats["status"]
+                print(
+                    f"{stats['scenario']:<32} {router:<6} {ok:<7} "
+                    f"{stats['convergence_ms']:>8} {stats['routing_packets']:>8} "
+                    f"{stats['routing_bytes']:>10} {stats['cpu_s']:>7.2f} "
+                    f"{stats['peak_rss_kb']:>8}"
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
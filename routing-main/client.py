@@ -1,5 +1,6 @@
 import time
 import queue
+import random
 from packet import Packet
 
 
@@ -9,13 +10,14 @@ class Client:
     these packets take back to the network object.
     """
 
-    def __init__(self, addr, all_clients, send_rate, update_fn):
+    def __init__(self, addr, all_clients, send_rate, update_fn, probes=None):
         self.addr = addr
         self.all_clients = all_clients
         self.send_rate = send_rate
-        self.last_time = 0
+        self.last_time = None  # Time of the last batch, None before the first
         self.link = None
         self.update_fn = update_fn
+        self.probes = probes  # ProbeSchedule, or None to probe every client
         self.sending = True
         self.link_changes = queue.Queue()
         self.keep_running = True
@@ -36,9 +38,12 @@ class Client:
         if packet.kind == Packet.TRACEROUTE:
             self.update_fn(packet.src_addr, packet.dst_addr, packet.route)
 
-    def send_traceroutes(self):
-        """Send "traceroute" packets to every other client in the network."""
-        for dst_client in self.all_clients:
+    def send_traceroutes(self, dst_clients=None):
+        """Send "traceroute" packets to `dst_clients`, by default to every other
+        client in the network."""
+        if dst_clients is None:
+            dst_clients = self.all_clients
+        for dst_client in dst_clients:
             packet = Packet(Packet.TRACEROUTE, self.addr, dst_client)
             if self.link:
                 self.link.send(packet, self.addr)
@@ -46,28 +51,128 @@ class Client:
 
     def handle_time(self, time_ms):
         """Send traceroute packets regularly."""
+        if self.last_time is None:
+            if self.probes is None:
+                self.last_time = 0
+            else:
+                # Delay the first batch by the phase offset of this client
+                self.last_time = time_ms - self.send_rate + self.probes.offset
         if self.sending and (time_ms - self.last_time > self.send_rate):
-            self.send_traceroutes()
+            if self.probes is None:
+                self.send_traceroutes()
+            else:
+                self.send_traceroutes(self.probes.next_batch())
             self.last_time = time_ms
 
     def run(self):
         """Main loop of client."""
         while self.keep_running:
             time.sleep(0.1)
-            time_ms = int(round(time.time() * 1000))
-            try:
-                change = self.link_changes.get_nowait()
-                if change[0] == "add":
-                    self.link = change[1]
-            except queue.Empty:
-                pass
-            if self.link:
+            self.step(int(round(time.time() * 1000)))
+
+    def step(self, time_ms):
+        """Run one iteration of the main loop at time `time_ms`."""
+        try:
+            change = self.link_changes.get_nowait()
+            if change[0] == "add":
+                self.link = change[1]
+        except queue.Empty:
+            pass
+        if self.link:
+            # Drain every packet that arrived since the last iteration, so that
+            # traceroutes are not recorded late when many clients send at once
+            packet = self.link.recv(self.addr)
+            while packet:
+                self.handle_packet(packet)
                 packet = self.link.recv(self.addr)
-                if packet:
-                    self.handle_packet(packet)
-            self.handle_time(time_ms)
+        self.handle_time(time_ms)
 
     def last_send(self):
         """Send one final batch of "traceroute" packets."""
         self.sending = False
         self.send_traceroutes()
+
+
+class ProbeSchedule:
+    """
+    The ProbeSchedule class chooses the destinations of the traceroute packets that
+    one client sends every `send_rate`, so that probing a network with C clients
+    sends O(C) instead of O(C^2) packets per interval.
+
+    Destinations are taken in turn from a random permutation of all clients, drawn
+    once per client and walked cyclically, so every pair is probed at least once
+    every ceil(C / K) intervals, where K is `sample` or `budget` if smaller.
+    Destinations passed to `prioritize` (e.g. pairs whose route crossed a changed
+    link) go first, but take at most half of the batch, so while they are pending
+    the bound is ceil(C / ceil(K / 2)) intervals.
+
+    Parameters
+    ----------
+    addr
+        The address of the client.
+    all_clients
+        The addresses of all clients.
+    send_rate
+        The interval between batches in ms.
+    sample
+        Destinations probed per interval from the rotation, or 0 for all clients.
+    budget
+        Maximum traceroute packets per interval, including prioritized ones, or 0
+        for no limit.
+    stagger
+        Whether to delay the first batch by a random offset within `send_rate`, so
+        that clients do not all send at the same time.
+    seed
+        Seed of the permutations and offsets. The same seed gives every client the
+        same schedule.
+    """
+
+    def __init__(
+        self, addr, all_clients, send_rate, sample=0, budget=0, stagger=False, seed=0
+    ):
+        self.all_clients = list(all_clients)
+        self.random = random.Random(f"{seed}:{addr}")
+        self.sample = len(self.all_clients)
+        if 0 < sample < self.sample:
+            self.sample = sample
+        self.budget = budget
+        self.offset = 0
+        if stagger and send_rate > 0:
+            self.offset = self.random.randrange(send_rate)
+        self.order = self.all_clients[:]  # Rotation, walked from self.position
+        self.random.shuffle(self.order)
+        self.position = 0
+        self.priority = []  # Destinations to probe before the rotation, in order
+        self.prioritized = queue.SimpleQueue()  # Filled by other threads
+
+    def prioritize(self, dst_clients):
+        """Probe `dst_clients` before the rotation in the next batches."""
+        self.prioritized.put(list(dst_clients))
+
+    def next_batch(self):
+        """Return the destinations of the next batch of traceroute packets."""
+        while True:
+            try:
+                for dst in self.prioritized.get_nowait():
+                    if dst not in self.priority:
+                        self.priority.append(dst)
+            except queue.Empty:
+                break
+
+        size = self.sample + len(self.priority)
+        if self.budget:
+            size = min(size, self.budget)
+        # Keep at least half of the batch for the rotation
+        reserved = min(self.sample, max(1, (size + 1) // 2))
+        batch = self.priority[: max(0, size - reserved)]
+        self.priority = self.priority[len(batch) :]
+        from_rotation = min(self.sample, size - len(batch))
+
+        chosen = set(batch)
+        for _ in range(from_rotation):
+            dst = self.order[self.position]
+            self.position = (self.position + 1) % len(self.order)
+            if dst not in chosen:
+                chosen.add(dst)
+                batch.append(dst)
+        return batch
@@ -0,0 +1,243 @@
+import json
+import struct
+import sys
+
+INFINITY = sys.maxsize  # Cost of an unreachable destination, as used by the routers
+
+# Every compact message starts with MAGIC. JSON text never starts with a NUL
+# character, so decode() can tell the two formats apart.
+MAGIC = "\x00"
+
+# Value tags of the compact format
+_NONE, _FALSE, _TRUE, _INT, _INF, _STR, _LIST, _DICT, _FLOAT = range(9)
+_KEY_TAGS = (_STR, _INT, _INF)  # Dict keys are strings or integers
+
+# Deepest nesting of lists and dicts that decode() accepts. Routing messages nest
+# a few levels; anything deeper is malformed and would exhaust the stack.
+MAX_DEPTH = 32
+
+
+class JsonCodec:
+    """
+    The JsonCodec class encodes routing messages as JSON text, like the routers
+    originally did.
+    """
+
+    name = "json"
+
+    def encode(self, obj):
+        """Encode `obj` into a string that fits in `Packet.content`."""
+        return json.dumps(obj)
+
+    def decode(self, content):
+        """Decode a string created by `encode`. Raise ValueError if it is
+        malformed."""
+        try:
+            return json.loads(content)
+        except RecursionError as e:
+            raise ValueError("JSON message nested too deeply") from e
+
+
+class CompactCodec:
+    """
+    The CompactCodec class encodes routing messages in a compact binary format.
+
+    A message is MAGIC, followed by a table of all strings in the message, followed
+    by the message itself, in which every string is an index into the table.
+    Integers are zigzag varints and INFINITY is a single tag byte. The bytes are
+    mapped one-to-one to characters (latin-1), so the result is still a string and
+    its length is its size in bytes.
+
+    Messages are made of dicts, lists, strings, integers, floats, booleans and None,
+    like JSON, nested at most MAX_DEPTH levels. Dict keys are strings or integers;
+    unlike JSON, integer dict keys stay integers.
+    """
+
+    name = "compact"
+
+    def encode(self, obj):
+        """Encode `obj` into a string that fits in `Packet.content`."""
+        strings = {}
+        body = bytearray()
+        self._encode_value(obj, body, strings)
+
+        out = bytearray()
+        _write_varint(out, len(strings))
+        for s in strings:
+            data = s.encode("utf-8")
+            _write_varint(out, len(data))
+            out += data
+        out += body
+        return MAGIC + out.decode("latin-1")
+
+    def _encode_value(self, obj, out, strings):
+        kind = type(obj)
+        if kind is str:
+            index = strings.get(obj)
+            if index is None:
+                index = strings[obj] = len(strings)
+            out.append(_STR)
+            _write_varint(out, index)
+        elif kind is int:
+            if obj == INFINITY:
+                out.append(_INF)
+            else:
+                out.append(_INT)
+                _write_varint(out, obj << 1 if obj >= 0 else (-obj << 1) - 1)
+        elif kind is dict:
+            out.append(_DICT)
+            _write_varint(out, len(obj))
+            for key, value in obj.items():
+                # Routing tables map addresses to costs: encode those inline
+                if type(key) is str and type(value) is int and 0 <= value < INFINITY:
+                    index = strings.get(key)
+                    if index is None:
+                        index = strings[key] = len(strings)
+                    out.append(_STR)
+                    _write_varint(out, index)
+                    out.append(_INT)
+                    _write_varint(out, value << 1)
+                elif type(key) is str or (isinstance(key, int) and type(key) is not bool):
+                    self._encode_value(key, out, strings)
+                    self._encode_value(value, out, strings)
+                else:
+                    raise TypeError(f"Cannot encode dict key of type {type(key).__name__}")
+        elif obj is None:
+            out.append(_NONE)
+        elif obj is True:
+            out.append(_TRUE)
+        elif obj is False:
+            out.append(_FALSE)
+        elif isinstance(obj, (list, tuple)):
+            out.append(_LIST)
+            _write_varint(out, len(obj))
+            for value in obj:
+                self._encode_value(value, out, strings)
+        elif isinstance(obj, int):
+            self._encode_value(int(obj), out, strings)
+        elif isinstance(obj, float):
+            out.append(_FLOAT)
+            out += struct.pack("<d", obj)
+        else:
+            raise TypeError(f"Cannot encode object of type {kind.__name__}")
+
+    def decode(self, content):
+        """Decode a string created by `encode`. Raise ValueError if it is
+        malformed."""
+        if not content.startswith(MAGIC):
+            raise ValueError("Not a compact message")
+        try:
+            data = content.encode("latin-1")
+            pos = len(MAGIC)
+            count, pos = _read_varint(data, pos)
+            strings = []
+            for _ in range(count):
+                length, pos = _read_varint(data, pos)
+                strings.append(data[pos : pos + length].decode("utf-8"))
+                pos += length
+            obj, pos = self._decode_value(data, pos, strings, 0)
+        except (IndexError, UnicodeError, struct.error) as e:
+            raise ValueError(f"Malformed compact message: {e}") from e
+        if pos != len(data):
+            raise ValueError("Trailing data after compact message")
+        return obj
+
+    def _decode_value(self, data, pos, strings, depth):
+        tag = data[pos]
+        pos += 1
+        if tag == _STR:
+            index, pos = _read_varint(data, pos)
+            return strings[index], pos
+        if tag == _INT:
+            n, pos = _read_varint(data, pos)
+            return (n >> 1) ^ -(n & 1), pos
+        if tag == _INF:
+            return INFINITY, pos
+        if tag == _DICT or tag == _LIST:
+            depth += 1
+            if depth > MAX_DEPTH:
+                raise ValueError(f"Compact message nested deeper than {MAX_DEPTH}")
+        if tag == _DICT:
+            length, pos = _read_varint(data, pos)
+            obj = {}
+            for _ in range(length):
+                # Routing tables map addresses to costs: decode those inline
+                if data[pos] == _STR:
+                    index, pos = _read_varint(data, pos + 1)
+                    key = strings[index]
+                    if data[pos] == _INT and data[pos + 1] < 0x80:
+                        n = data[pos + 1]
+                        obj[key] = (n >> 1) ^ -(n & 1)
+                        pos += 2
+                        continue
+                    if data[pos] == _INF:
+                        obj[key] = INFINITY
+                        pos += 1
+                        continue
+                elif data[pos] in _KEY_TAGS:
+                    key, pos = self._decode_value(data, pos, strings, depth)
+                else:
+                    raise ValueError(f"Dict key with tag {data[pos]}")
+                obj[key], pos = self._decode_value(data, pos, strings, depth)
+            return obj, pos
+        if tag == _LIST:
+            length, pos = _read_varint(data, pos)
+            obj = []
+            for _ in range(length):
+                value, pos = self._decode_value(data, pos, strings, depth)
+                obj.append(value)
+            return obj, pos
+        if tag == _NONE:
+            return None, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _FLOAT:
+            return struct.unpack_from("<d", data, pos)[0], pos + 8
+        raise ValueError(f"Unknown tag {tag}")
+
+
+def _write_varint(out, n):
+    if n < 0x80:
+        out.append(n)
+        return
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), CompactCodec())}
+DEFAULT_CODEC = "compact"
+
+
+def get_codec(name=None):
+    """Return the codec called `name`, or the default codec."""
+    try:
+        return CODECS[name or DEFAULT_CODEC]
+    except KeyError:
+        raise ValueError(f"Unknown codec: {name}") from None
+
+
+def decode(content):
+    """Decode a message created by any codec, detecting its format. Raise
+    ValueError if it is malformed."""
+    if content.startswith(MAGIC):
+        return CODECS["compact"].decode(content)
+    return CODECS["json"].decode(content)
@@ -0,0 +1,89 @@
+class ConvergenceMonitor:
+    """
+    The ConvergenceMonitor class watches a running network and decides when its
+    routing has converged, so that the simulation can end early.
+
+    Every `poll_ms` it takes a fingerprint of the forwarding table of every router
+    that has one (`forwarding_table`) and of the latest route found by traceroute
+    packets between every pair of clients. The network has converged once the last
+    scheduled link change has happened and none of these changed for `quiet_ms`.
+
+    Parameters
+    ----------
+    network
+        The network to watch.
+    quiet_ms
+        How long the routing state must stay unchanged after the last link change.
+    poll_ms
+        The interval between fingerprints. Defaults to the main loop interval of
+        the network.
+    """
+
+    def __init__(self, network, quiet_ms, poll_ms=None):
+        self.network = network
+        self.quiet_ms = quiet_ms
+        self.poll_ms = poll_ms or network.TICK_MS
+        self.start_ms = None
+        self.last_change_ms = None  # Time of the last observed change
+        self.converged_at_ms = None  # Convergence instant, relative to the start
+        self.tables = {}  # {router addr: fingerprint of its forwarding table}
+        self.routes = {}  # {(src, dst): latest non-empty traceroute route}
+
+    def start(self):
+        """Start watching. Call right after the network has started."""
+        self.start_ms = self.network.time_ms()
+        self.last_change_ms = self.start_ms
+        self.poll()
+
+    def poll(self):
+        """Take a fingerprint of the routing state and record whether it changed."""
+        now = self.network.time_ms()
+        changed = False
+        for addr, router in self.network.routers.items():
+            table = getattr(router, "forwarding_table", None)
+            if table is None:
+                continue
+            try:
+                fingerprint = hash(frozenset(table.items()))
+            except RuntimeError:
+                # The router thread modified its table during the fingerprint
+                changed = True
+                continue
+            if self.tables.get(addr) != fingerprint:
+                self.tables[addr] = fingerprint
+                changed = True
+
+        with self.network.routes_lock:
+            routes = list(self.network.routes.items())
+        for pair, (route, _, _) in routes:
+            # An empty route is a traceroute that is still on its way
+            if route and self.routes.get(pair) != route:
+                self.routes[pair] = route
+                changed = True
+
+        if changed:
+            self.last_change_ms = now
+        return changed
+
+    def converged(self):
+        """Return True if the routing state has been quiet for `quiet_ms` since the
+        last scheduled link change, and record the convergence instant."""
+        now = self.network.time_ms()
+        last_scheduled = self.start_ms + self.network.last_change_time
+        if now < last_scheduled:
+            return False
+        if now - max(self.last_change_ms, last_scheduled) < self.quiet_ms:
+            return False
+        self.converged_at_ms = max(self.last_change_ms, last_scheduled) - self.start_ms
+        return True
+
+    def wait(self, timeout_ms):
+        """Let the network run until it converges or for `timeout_ms` since the start,
+        whichever comes first. Return True if it converged."""
+        while self.network.time_ms() - self.start_ms < timeout_ms:
+            remaining = timeout_ms - (self.network.time_ms() - self.start_ms)
+            self.network.wait(min(self.poll_ms, remaining))
+            self.poll()
+            if self.converged():
+                return True
+        return False
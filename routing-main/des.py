@@ -0,0 +1,51 @@
+import heapq
+import itertools
+
+
+class EventScheduler:
+    """
+    The EventScheduler class drives a discrete-event simulation with a single event
+    heap and a simulated clock. Nothing ever sleeps: `run` pops events in time order
+    and advances the clock straight to the next one.
+
+    Events scheduled for the same instant run in the order they were scheduled.
+    """
+
+    def __init__(self):
+        self.now = 0
+        self._events = []
+        self._counter = itertools.count()
+
+    def time_ms(self):
+        """Return the current simulated time in ms."""
+        return self.now
+
+    def schedule(self, delay, fn, *args):
+        """Call `fn(*args)` after `delay` simulated ms."""
+        self.schedule_at(self.now + delay, fn, *args)
+
+    def schedule_at(self, time_ms, fn, *args):
+        """Call `fn(*args)` at simulated time `time_ms`."""
+        heapq.heappush(self._events, (time_ms, next(self._counter), fn, args))
+
+    def schedule_periodic(self, interval, fn, start=None):
+        """Call `fn(time_ms)` every `interval` ms, first at `start` (default now +
+        `interval`)."""
+
+        def fire():
+            fn(self.now)
+            self.schedule(interval, fire)
+
+        self.schedule_at(self.now + interval if start is None else start, fire)
+
+    def run(self, until):
+        """Process all events up to and including time `until`."""
+        events = self._events
+        while events and events[0][0] <= until:
+            time_ms, _, fn, args = heapq.heappop(events)
+            self.now = time_ms
+            fn(*args)
+        self.now = max(self.now, until)
+
+    def __len__(self):
+        return len(self._events)
@@ -0,0 +1,300 @@
+import argparse
+import json
+import struct
+import threading
+from functools import wraps
+
+# Events
+SEND = 0  # Packet sent into a link by `src`
+DELIVER = 1  # Packet delivered by a link to `dst`
+HANDLE = 2  # handle_packet of router `dst`, with the port in `link`
+LINK_UP = 3  # Link of router `src` to `dst` added, port in `link`, cost in `size`
+LINK_DOWN = 4  # Link of router `src` removed, with the port in `link`
+LINK_COST = 5  # Cost of the link of router `src` to `dst` changed, like LINK_UP
+EVENT_NAMES = ["send", "deliver", "handle", "link_up", "link_down", "link_cost"]
+KIND_NAMES = {0: "none", 1: "traceroute", 2: "routing"}  # Packet kinds
+
+# One record: time_ms, src, dst, link, size, event, kind and 2 bytes of padding.
+# src and dst are indices into the address table, link into the link table.
+RECORD = struct.Struct("<qIIIIBB2x")
+MAGIC = b"RTEVLOG1"
+INITIAL_BUFFER_RECORDS = 64  # Records in a new thread buffer, doubled as it fills
+NONE = 0xFFFFFFFF  # Missing address
+
+
+class EventRecorder:
+    """
+    The EventRecorder class appends a fixed-width binary record for every packet
+    sent into or delivered by a link and for the packet and link callbacks of
+    routers, for analysis after the run with `load`.
+
+    Records are packed into a buffer per thread and appended to the file when the
+    buffer is full, so recording takes no lock on the hot path. Buffers start small
+    and double up to `buffer_records`, so threads that record little (most of the
+    router and client threads of the threads engine) hold little memory.
+    Records of different threads are therefore not in time order in the file;
+    `load` sorts them. Addresses and links are stored as indices into tables that
+    are written next to the log, in `path + ".names.json"`.
+
+    Parameters
+    ----------
+    path
+        The output file.
+    clock
+        A function returning the current time in ms.
+    buffer_records
+        The maximum number of records buffered per thread before writing them.
+    """
+
+    def __init__(self, path, clock, buffer_records=1 << 16):
+        self.path = path
+        self.clock = clock
+        self.buffer_size = buffer_records * RECORD.size
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.file_lock = threading.Lock()
+        self.addresses = {}  # {address: index}
+        self.links = {}  # {link name: index}
+        self.names_lock = threading.Lock()
+        self.buffers = []  # [[bytearray, used bytes]] of every thread
+        self.local = threading.local()
+        self.records = 0
+
+    def _intern(self, table, name):
+        index = table.get(name)
+        if index is None:
+            with self.names_lock:
+                index = table.setdefault(name, len(table))
+        return index
+
+    def _buffer(self):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            size = min(INITIAL_BUFFER_RECORDS * RECORD.size, self.buffer_size)
+            buffer = self.local.buffer = [bytearray(size), 0]
+            with self.file_lock:
+                self.buffers.append(buffer)
+        return buffer
+
+    def record(self, event, src, dst, link=NONE, size=0, kind=0):
+        """Append one record. `src` and `dst` are addresses or None."""
+        buffer = self._buffer()
+        if buffer[1] == len(buffer[0]):
+            if buffer[1] < self.buffer_size:
+                buffer[0] += bytes(min(buffer[1], self.buffer_size - buffer[1]))
+            else:
+                self._flush(buffer)
+        RECORD.pack_into(
+            buffer[0],
+            buffer[1],
+            int(self.clock()),
+            NONE if src is None else self._intern(self.addresses, src),
+            NONE if dst is None else self._intern(self.addresses, dst),
+            link,
+            size,
+            event,
+            kind,
+        )
+        buffer[1] += RECORD.size
+
+    def _flush(self, buffer):
+        with self.file_lock:
+            self.file.write(memoryview(buffer[0])[: buffer[1]])
+            self.records += buffer[1] // RECORD.size
+        buffer[1] = 0
+
+    def close(self):
+        """Write the remaining records and the name tables."""
+        for buffer in list(self.buffers):
+            self._flush(buffer)
+        self.file.close()
+        with open(self.path + ".names.json", "w") as f:
+            json.dump(
+                {
+                    "addresses": sorted(self.addresses, key=self.addresses.get),
+                    "links": sorted(self.links, key=self.links.get),
+                    "events": EVENT_NAMES,
+                    "kinds": KIND_NAMES,
+                },
+                f,
+            )
+
+    def instrument_link(self, link):
+        """Record the packets sent into and delivered by `link`."""
+        link_index = self._intern(self.links, f"{link.e1}-{link.e2}")
+        send, deliver = link.send, link._deliver
+
+        @wraps(send)
+        def recorded_send(packet, src):
+            dst = link.e2 if src == link.e1 else link.e1
+            size = len(packet.content) if packet.content else 0
+            self.record(SEND, src, dst, link_index, size, packet.kind)
+            return send(packet, src)
+
+        @wraps(deliver)
+        def recorded_deliver(dst, packet):
+            src = link.e1 if dst == link.e2 else link.e2
+            size = len(packet.content) if packet.content else 0
+            self.record(DELIVER, src, dst, link_index, size, packet.kind)
+            return deliver(dst, packet)
+
+        link.send = recorded_send
+        link._deliver = recorded_deliver
+
+    def instrument_router(self, router):
+        """Record the handle_packet calls of `router` and every link change passed
+        to its handle_link_changes."""
+        addr = router.addr
+        handle_packet = router.handle_packet
+        handle_link_changes = router.handle_link_changes
+
+        @wraps(handle_packet)
+        def recorded_handle_packet(port, packet):
+            size = len(packet.content) if packet.content else 0
+            self.record(HANDLE, packet.src_addr, addr, port, size, packet.kind)
+            return handle_packet(port, packet)
+
+        @wraps(handle_link_changes)
+        def recorded_handle_link_changes(changes):
+            for change in changes:
+                if change[0] == "add":
+                    _, port, endpoint, cost = change
+                    self.record(LINK_UP, addr, endpoint, port, cost)
+                elif change[0] == "cost":
+                    _, port, endpoint, cost = change
+                    self.record(LINK_COST, addr, endpoint, port, cost)
+                else:
+                    self.record(LINK_DOWN, addr, None, change[1])
+            return handle_link_changes(changes)
+
+        router.handle_packet = recorded_handle_packet
+        router.handle_link_changes = recorded_handle_link_changes
+
+
+class EventLog:
+    """
+    The EventLog class exposes a file written by EventRecorder as a NumPy
+    structured array, memory-mapped and sorted by time.
+
+    Parameters
+    ----------
+    path
+        The file written by EventRecorder.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.dtype = np.dtype(
+            {
+                "names": ["time_ms", "src", "dst", "link", "size", "event", "kind"],
+                "formats": ["<i8", "<u4", "<u4", "<u4", "<u4", "u1", "u1"],
+                "offsets": [0, 8, 12, 16, 20, 24, 25],
+                "itemsize": RECORD.size,
+            }
+        )
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an event log")
+            empty = not f.read(1)
+        if empty:
+            records = np.zeros(0, dtype=self.dtype)
+        else:
+            records = np.memmap(path, dtype=self.dtype, mode="r", offset=len(MAGIC))
+        order = np.argsort(records["time_ms"], kind="stable")
+        if np.all(order[1:] > order[:-1]):
+            self.records = records
+        else:
+            self.records = records[order]
+        with open(path + ".names.json", "r") as f:
+            names = json.load(f)
+        self.addresses = np.array(names["addresses"] + [None], dtype=object)
+        self.links = np.array(names["links"] + [None], dtype=object)
+
+    def __len__(self):
+        return len(self.records)
+
+    def address(self, indices):
+        """Return the addresses of the `src` or `dst` values `indices`, with None
+        for missing addresses."""
+        import numpy as np
+
+        return self.addresses[np.minimum(indices, len(self.addresses) - 1)]
+
+    def link(self, indices):
+        """Return the link names of the `link` values `indices`, with None for
+        records without a link."""
+        import numpy as np
+
+        return self.links[np.minimum(indices, len(self.links) - 1)]
+
+    def select(self, event=None, kind=None):
+        """Return the records of the given event and packet kind names."""
+        mask = True
+        if event is not None:
+            mask = mask & (self.records["event"] == EVENT_NAMES.index(event))
+        if kind is not None:
+            codes = {name: code for code, name in KIND_NAMES.items()}
+            mask = mask & (self.records["kind"] == codes[kind])
+        return self.records if mask is True else self.records[mask]
+
+    def totals(self):
+        """Return {(event, kind): (records, bytes)}."""
+        import numpy as np
+
+        records = self.records
+        keys = records["event"].astype(np.int64) * 256 + records["kind"]
+        counts = np.bincount(keys, minlength=256 * len(EVENT_NAMES))
+        sizes = np.bincount(keys, weights=records["size"], minlength=len(counts))
+        return {
+            (EVENT_NAMES[key // 256], KIND_NAMES.get(key % 256, key % 256)): (
+                int(counts[key]),
+                int(sizes[key]),
+            )
+            for key in np.flatnonzero(counts)
+        }
+
+    def per_link(self, event="send", kind="routing"):
+        """Return {link name: (packets, bytes)} of the given event and kind."""
+        import numpy as np
+
+        records = self.select(event, kind)
+        records = records[records["link"] != NONE]
+        counts = np.bincount(records["link"], minlength=len(self.links) - 1)
+        sizes = np.bincount(records["link"], weights=records["size"], minlength=len(counts))
+        return {
+            self.links[i]: (int(counts[i]), int(sizes[i])) for i in np.flatnonzero(counts)
+        }
+
+
+def load(path):
+    """Load an event log written by EventRecorder."""
+    return EventLog(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize an event log written by network.py --event-log."
+    )
+    parser.add_argument("path", type=str, help="The event log.")
+    parser.add_argument(
+        "--links", type=int, default=10, help="Number of busiest links to list."
+    )
+    args = parser.parse_args()
+
+    log = load(args.path)
+    print(f"{len(log)} records")
+    if len(log):
+        span = int(log.records["time_ms"][-1] - log.records["time_ms"][0])
+        print(f"{span} ms from first to last record")
+    print(f"\n{'event':<10} {'kind':<11} {'records':>10} {'bytes':>12}")
+    for (event, kind), (count, size) in sorted(log.totals().items()):
+        print(f"{event:<10} {kind:<11} {count:>10} {size:>12}")
+    busiest = sorted(log.per_link().items(), key=lambda item: -item[1][1])
+    print(f"\n{'link':<24} {'routing pkts':>12} {'bytes':>12}")
+    for link, (count, size) in busiest[: args.links]:
+        print(f"{link:<24} {count:>12} {size:>12}")
+
+
+if __name__ == "__main__":
+    main()
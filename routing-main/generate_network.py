@@ -0,0 +1,503 @@
+import argparse
+import json
+import math
+import random
+import sys
+from collections import defaultdict
+
+FAMILIES = ("geometric", "waxman", "scale-free", "grid", "ring", "fat-tree")
+# Largest number of routers times clients for which correct_routes are computed:
+# ground_truth.py keeps that many costs (4 bytes each) in memory
+MAX_ROUTE_ENTRIES = 1 << 26
+
+VISUALIZE_DEFAULTS = {
+    "canvas_width": 800,
+    "canvas_height": 800,
+    "time_multiplier": 20,
+    "latency_correction": 1.5,
+    "animate_rate": 40,
+    "router_color": "red",
+    "client_color": "DodgerBlue2",
+    "line_color": "orange",
+    "inactiveColor": "gray",
+    "line_width": 6,
+    "line_font_size": 16,
+}
+
+
+def geometric_graph(n, rng, degree=6):
+    """Random geometric graph: `n` routers placed uniformly in the unit square,
+    linked when closer than the radius that gives an average of `degree` links."""
+    positions = [(rng.random(), rng.random()) for _ in range(n)]
+    radius = math.sqrt(degree / (math.pi * max(n, 1)))
+    return positions, _close_pairs(positions, radius, lambda d: True)
+
+
+def waxman_graph(n, rng, beta=0.4, degree=6):
+    """Waxman graph: `n` routers placed uniformly in the unit square, each pair
+    linked with probability `beta * exp(-d / scale)`.
+
+    The scale is chosen for an average of about `degree` links per router whatever
+    `n` is. Pairs whose probability is below 1% are never considered, so the cost
+    grows with the number of links rather than the number of pairs.
+    """
+    positions = [(rng.random(), rng.random()) for _ in range(n)]
+    scale = math.sqrt(degree / (2 * math.pi * beta * max(n, 1)))
+    cutoff = scale * math.log(beta / 0.01)
+    return positions, _close_pairs(
+        positions, cutoff, lambda d: rng.random() < beta * math.exp(-d / scale)
+    )
+
+
+def _close_pairs(positions, radius, accept):
+    """Return the pairs of positions closer than `radius` for which `accept(d)`
+    holds, using a grid of buckets of side `radius`."""
+    if radius <= 0:
+        return []
+    cells = defaultdict(list)
+    for i, (x, y) in enumerate(positions):
+        cells[(int(x / radius), int(y / radius))].append(i)
+    edges = []
+    for i, (x, y) in enumerate(positions):
+        cx, cy = int(x / radius), int(y / radius)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx + dx, cy + dy), ()):
+                    if j <= i:
+                        continue
+                    d = math.hypot(positions[j][0] - x, positions[j][1] - y)
+                    if d < radius and accept(d):
+                        edges.append((i, j))
+    return edges
+
+
+def scale_free_graph(n, rng, m=2):
+    """Barabási-Albert graph: every new router links to `m` existing routers chosen
+    with probability proportional to their degree."""
+    m = max(1, min(m, n - 1))
+    edges = [(i, j) for i in range(m + 1) for j in range(i + 1, m + 1) if i < n and j < n]
+    endpoints = [v for edge in edges for v in edge]
+    for new in range(m + 1, n):
+        targets = set()
+        while len(targets) < m:
+            targets.add(rng.choice(endpoints))
+        for target in targets:
+            edges.append((target, new))
+            endpoints.extend((target, new))
+    return _circle_layout(n), edges
+
+
+def grid_graph(n, rng):
+    """Square-ish grid of `n` routers, each linked to its right and lower
+    neighbors."""
+    cols = max(1, math.ceil(math.sqrt(n)))
+    edges = []
+    for i in range(n):
+        if (i + 1) % cols and i + 1 < n:
+            edges.append((i, i + 1))
+        if i + cols < n:
+            edges.append((i, i + cols))
+    rows = math.ceil(n / cols)
+    positions = [((i % cols + 0.5) / cols, (i // cols + 0.5) / rows) for i in range(n)]
+    return positions, edges
+
+
+def ring_graph(n, rng):
+    """Ring of `n` routers."""
+    edges = [(i, i + 1) for i in range(n - 1)]
+    if n > 2:
+        edges.append((n - 1, 0))
+    return _circle_layout(n), edges
+
+
+def fat_tree_graph(n, rng):
+    """k-ary fat tree with the smallest even `k` that has at least `n` switches.
+
+    Return the positions, the links and the edge switches, which the hosts
+    (clients) attach to.
+    """
+    k = 2
+    while 5 * k * k // 4 < n:
+        k += 2
+    half = k // 2
+    core = list(range(half * half))
+    positions = [((i + 0.5) / len(core), 0.1) for i in core]
+    edges = []
+    edge_switches = []
+    for pod in range(k):
+        agg = [len(positions) + i for i in range(half)]
+        positions += [((pod * k + i + 0.5) / (k * k), 0.4) for i in range(half)]
+        edge = [len(positions) + i for i in range(half)]
+        positions += [((pod * k + half + i + 0.5) / (k * k), 0.7) for i in range(half)]
+        edge_switches += edge
+        for i, a in enumerate(agg):
+            for j in range(half):
+                edges.append((core[i * half + j], a))
+            for e in edge:
+                edges.append((a, e))
+    return positions, edges, edge_switches
+
+
+def _circle_layout(n):
+    return [
+        (0.5 + 0.45 * math.cos(2 * math.pi * i / max(n, 1)),
+         0.5 + 0.45 * math.sin(2 * math.pi * i / max(n, 1)))
+        for i in range(n)
+    ]
+
+
+def connect_components(n, edges, positions):
+    """Add links so that the graph is connected, linking every other component to
+    the closest of (a sample of) the routers of the largest component."""
+    parent = list(range(n))
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for u, v in edges:
+        parent[find(u)] = find(v)
+    components = defaultdict(list)
+    for v in range(n):
+        components[find(v)].append(v)
+    if len(components) <= 1:
+        return edges
+    main, *others = sorted(components.values(), key=len, reverse=True)
+    anchors = main[:: max(1, len(main) // 2048)]
+    for component in others:
+        v = component[0]
+        anchor = min(anchors, key=lambda u: math.dist(positions[u], positions[v]))
+        edges.append((anchor, v))
+    return edges
+
+
+def bridges(n, edges):
+    """Return the set of indices of `edges` whose removal disconnects the graph."""
+    adjacency = defaultdict(list)
+    for index, (u, v) in enumerate(edges):
+        adjacency[u].append((v, index))
+        adjacency[v].append((u, index))
+    order = [None] * n
+    low = [0] * n
+    found = set()
+    counter = 0
+    for root in range(n):
+        if order[root] is not None:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack = [(root, None, iter(adjacency[root]))]
+        while stack:
+            node, via, neighbors = stack[-1]
+            advanced = False
+            for neighbor, index in neighbors:
+                if index == via:
+                    continue
+                if order[neighbor] is None:
+                    order[neighbor] = low[neighbor] = counter
+                    counter += 1
+                    stack.append((neighbor, index, iter(adjacency[neighbor])))
+                    advanced = True
+                    break
+                low[node] = min(low[node], order[neighbor])
+            if advanced:
+                continue
+            stack.pop()
+            if stack:
+                parent = stack[-1][0]
+                low[parent] = min(low[parent], low[node])
+                if low[node] > order[parent]:
+                    found.add(via)
+    return found
+
+
+def flap_schedule(edges, rng, flaps, start, duration, gap):
+    """Return link flaps as `(down_time, up_time, edge index)`.
+
+    Flaps happen one after another, `gap` apart, and only on links whose failure
+    leaves the topology connected, so that every pair of clients keeps a route.
+    """
+    candidates = sorted(set(range(len(edges))) - bridges(_num_nodes(edges), edges))
+    schedule = []
+    time = start
+    for _ in range(flaps if candidates else 0):
+        schedule.append((time, time + duration, rng.choice(candidates)))
+        time += duration + gap
+    return schedule
+
+
+def _eccentricity(n, edges, root):
+    """Return the largest number of hops from `root` to any router."""
+    neighbors = defaultdict(list)
+    for u, v in edges:
+        neighbors[u].append(v)
+        neighbors[v].append(u)
+    hops = {root: 0}
+    frontier = [root]
+    depth = 0
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            for neighbor in neighbors[node]:
+                if neighbor not in hops:
+                    hops[neighbor] = depth + 1
+                    next_frontier.append(neighbor)
+        if next_frontier:
+            depth += 1
+        frontier = next_frontier
+    return depth
+
+
+def _num_nodes(edges):
+    return 1 + max((max(edge) for edge in edges), default=-1)
+
+
+def generate(
+    family,
+    size,
+    seed=0,
+    clients=10,
+    min_cost=1,
+    max_cost=10,
+    asymmetric=False,
+    flaps=0,
+    flap_start=20,
+    flap_duration=20,
+    flap_gap=20,
+    settle_time=None,
+    client_send_rate=None,
+    routes=True,
+):
+    """Generate a network configuration.
+
+    Parameters
+    ----------
+    family
+        One of FAMILIES.
+    size
+        The number of routers (for fat trees, the minimum number of switches).
+    seed
+        The seed of the random generator. The same arguments and seed always give
+        the same configuration.
+    clients
+        The number of clients, each attached to a distinct router (an edge switch
+        for fat trees), or 0 for one client per router.
+    min_cost, max_cost
+        The range of the link costs.
+    asymmetric
+        Whether the two directions of a link get independent costs.
+    flaps
+        The number of link flaps. A flap takes a link down at one time and back up
+        `flap_duration` later; the next flap starts `flap_gap` after that. Times
+        are in the units of the configuration file, starting at `flap_start`.
+    settle_time
+        The time between the last change and `end_time`. Defaults to enough time
+        for routing messages to cross the network a few times.
+    client_send_rate
+        The interval between traceroute batches of the clients. Defaults to a
+        quarter of the longest possible route, so that the final traceroutes
+        arrive before the simulation ends, and at least 10.
+    routes
+        Whether to compute `correct_routes` (see ground_truth.py). They are left
+        empty, with a hint on the standard error, when the number of routers times
+        the number of clients exceeds MAX_ROUTE_ENTRIES.
+
+    Returns
+    -------
+    A dict in the format of the network configuration files.
+    """
+    rng = random.Random(seed)
+    size = max(1, size)
+    attach_to = None
+    if family == "geometric":
+        positions, edges = geometric_graph(size, rng)
+    elif family == "waxman":
+        positions, edges = waxman_graph(size, rng)
+    elif family == "scale-free":
+        positions, edges = scale_free_graph(size, rng)
+    elif family == "grid":
+        positions, edges = grid_graph(size, rng)
+    elif family == "ring":
+        positions, edges = ring_graph(size, rng)
+    elif family == "fat-tree":
+        positions, edges, attach_to = fat_tree_graph(size, rng)
+    else:
+        raise ValueError(f"Unknown topology family: {family}")
+    num_routers = len(positions)
+    edges = connect_components(num_routers, edges, positions)
+
+    routers = [f"R{i}" for i in range(num_routers)]
+    next_port = [1] * num_routers
+
+    def cost():
+        return rng.randint(min_cost, max_cost)
+
+    links = []
+    for u, v in edges:
+        c12 = cost()
+        c21 = cost() if asymmetric else c12
+        links.append([routers[u], routers[v], next_port[u], next_port[v], c12, c21])
+        next_port[u] += 1
+        next_port[v] += 1
+
+    # Clients, attached to distinct routers
+    attach_to = list(range(num_routers)) if attach_to is None else attach_to
+    num_clients = len(attach_to) if clients <= 0 else min(clients, len(attach_to))
+    hosts = sorted(rng.sample(attach_to, num_clients))
+    client_names = []
+    grid_size = max(3, math.ceil(math.sqrt(num_routers + num_clients)) * 2)
+    locations = {
+        routers[i]: [round(x * (grid_size - 1), 2), round(y * (grid_size - 1), 2)]
+        for i, (x, y) in enumerate(positions)
+    }
+    for router in hosts:
+        name = f"c{router}"
+        client_names.append(name)
+        c = cost()
+        links.append([name, routers[router], 1, next_port[router], c, c])
+        next_port[router] += 1
+        x, y = locations[routers[router]]
+        locations[name] = [round(min(x + 0.5, grid_size - 1), 2), y]
+
+    changes = []
+    for down, up, index in flap_schedule(
+        edges, rng, flaps, flap_start, flap_duration, flap_gap
+    ):
+        link = links[index]
+        changes.append([down, link[:2], "down"])
+        changes.append([up, list(link), "up"])
+    last_change = max((change[0] for change in changes), default=0)
+
+    # Latency is proportional to cost: make sure routes fit in the time limits
+    longest = (2 * _eccentricity(num_routers, edges, hosts[0] if hosts else 0) + 2) * max_cost
+    if client_send_rate is None:
+        client_send_rate = max(10, -(-longest // 4) + 1)
+    if settle_time is None:
+        settle_time = max(100, 2 * longest + 4 * client_send_rate)
+
+    net_json = {
+        "routers": routers,
+        "clients": client_names,
+        "client_send_rate": client_send_rate,
+        "end_time": last_change + settle_time,
+        "links": links,
+    }
+    if changes:
+        net_json["changes"] = changes
+    net_json["correct_routes"] = []
+    if routes and num_routers * num_clients > MAX_ROUTE_ENTRIES:
+        print(
+            f"{num_routers} routers with {num_clients} clients are too many to "
+            "compute correct_routes; leaving them empty. Run network.py with "
+            "--auto-routes, or use fewer clients.",
+            file=sys.stderr,
+        )
+        routes = False
+    if routes:
+        from ground_truth import route_phases
+
+        net_json["correct_routes"] = route_phases(net_json, cache_dir=None)[-1]["routes"]
+    net_json["visualize"] = {
+        "grid_size": grid_size,
+        "locations": locations,
+        **VISUALIZE_DEFAULTS,
+    }
+    return net_json
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a network configuration file."
+    )
+    parser.add_argument("family", type=str, choices=FAMILIES, help="Topology family.")
+    parser.add_argument(
+        "size",
+        type=int,
+        help="Number of routers (minimum number of switches for fat-tree).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=10,
+        help="Number of clients (0 for one per router).",
+    )
+    parser.add_argument("--min-cost", type=int, default=1, help="Minimum link cost.")
+    parser.add_argument("--max-cost", type=int, default=10, help="Maximum link cost.")
+    parser.add_argument(
+        "--asymmetric",
+        action="store_true",
+        help="Give the two directions of a link independent costs.",
+    )
+    parser.add_argument("--flaps", type=int, default=0, help="Number of link flaps.")
+    parser.add_argument(
+        "--flap-start", type=int, default=20, help="Time of the first flap."
+    )
+    parser.add_argument(
+        "--flap-duration",
+        type=int,
+        default=20,
+        help="Time a flapping link stays down.",
+    )
+    parser.add_argument(
+        "--flap-gap", type=int, default=20, help="Time between consecutive flaps."
+    )
+    parser.add_argument(
+        "--settle-time",
+        type=int,
+        default=None,
+        help="Time between the last change and the end of the simulation. "
+        "Defaults to a multiple of the longest possible route.",
+    )
+    parser.add_argument(
+        "--client-send-rate",
+        type=int,
+        default=None,
+        help="Interval between traceroute batches. Defaults to a quarter of the "
+        "longest possible route, and at least 10.",
+    )
+    parser.add_argument(
+        "--no-routes",
+        action="store_true",
+        help="Leave correct_routes empty (use network.py --auto-routes). They are "
+        "always left empty when routers times clients exceeds "
+        f"{MAX_ROUTE_ENTRIES}.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="Output file. Defaults to the standard output.",
+    )
+    args = parser.parse_args()
+
+    net_json = generate(
+        args.family,
+        args.size,
+        seed=args.seed,
+        clients=args.clients,
+        min_cost=args.min_cost,
+        max_cost=args.max_cost,
+        asymmetric=args.asymmetric,
+        flaps=args.flaps,
+        flap_start=args.flap_start,
+        flap_duration=args.flap_duration,
+        flap_gap=args.flap_gap,
+        settle_time=args.settle_time,
+        client_send_rate=args.client_send_rate,
+        routes=not args.no_routes,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(net_json, f, indent=1)
+            f.write("\n")
+    else:
+        json.dump(net_json, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
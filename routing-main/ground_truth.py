@@ -0,0 +1,369 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import defaultdict, deque
+
+import numpy as np
+
+from topology import BinaryScenario, open_scenario
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".routes_cache")
+UNREACHABLE = np.iinfo(np.int32).max // 4  # Larger than any path cost, and safe to add
+CHUNK_ELEMENTS = 1 << 23  # Upper bound on the size of a relaxation batch
+
+
+def shortest_paths(num_nodes, edges, sources):
+    """Compute the costs of the shortest paths from some nodes to all nodes.
+
+    Parameters
+    ----------
+    num_nodes
+        The number of nodes, numbered from 0.
+    edges
+        A list of directed edges `(src, dst, cost)` with nonnegative integer costs.
+    sources
+        The nodes to compute the shortest paths from.
+
+    Returns
+    -------
+    A `(len(sources), num_nodes)` int32 array whose entry `[i, v]` is the cost of
+    the shortest path from `sources[i]` to `v`, or UNREACHABLE.
+
+    Dijkstra runs for a batch of sources at once with a bucket queue (Dial's
+    algorithm): all (source, node) pairs at the same distance are settled together
+    and their outgoing edges are relaxed as one array operation. Every pair is
+    settled exactly once, so the work is proportional to the number of sources times
+    the number of edges, and the memory to the number of sources times the number
+    of nodes.
+    """
+    sources = np.asarray(sources, dtype=np.int64).reshape(-1)
+    dist = np.full((len(sources), num_nodes), UNREACHABLE, dtype=np.int32)
+    if not num_nodes or not len(sources):
+        return dist
+
+    # Number the nodes in breadth-first order, so that neighbors have nearby entries
+    # in the distance matrix
+    order = _bfs_order(num_nodes, edges)
+    position = np.empty(num_nodes, dtype=np.int64)
+    position[order] = np.arange(num_nodes)
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 3)
+    edges[:, :2] = position[edges[:, :2]]
+    sources = position[sources]
+
+    # Outgoing edges of every node in compressed sparse row form, one table per
+    # distinct cost so that relaxing a table gives candidates of a single distance
+    tables = []
+    for cost in np.unique(edges[:, 2]):
+        same_cost = edges[edges[:, 2] == cost]
+        same_cost = same_cost[np.argsort(same_cost[:, 0], kind="stable")]
+        degree = np.bincount(same_cost[:, 0], minlength=num_nodes).astype(np.int64)
+        first_edge = np.cumsum(degree) - degree
+        tables.append((int(cost), degree, first_edge, same_cost[:, 1]))
+
+    batch = max(1, min(len(sources), CHUNK_ELEMENTS // num_nodes))
+    for start in range(0, len(sources), batch):
+        rows = dist[start : start + batch]
+        flat = rows.reshape(-1)  # Entry row * num_nodes + node of the batch
+        row_starts = np.arange(len(rows), dtype=np.int64) * num_nodes
+        buckets = {0: [row_starts + sources[start : start + batch]]}
+        while buckets:
+            level = min(buckets)
+            keys = np.concatenate(buckets.pop(level))
+            keys = keys[flat[keys] == UNREACHABLE]
+            if not len(keys):
+                continue
+            # Settle every pair once: of duplicate keys, keep the last one written
+            marks = -1 - np.arange(len(keys), dtype=np.int32)
+            flat[keys] = marks
+            keys = keys[flat[keys] == marks]
+            flat[keys] = level
+
+            # Relax the outgoing edges of all settled pairs
+            nodes = keys % num_nodes
+            row_keys = keys - nodes
+            for cost, degree, first_edge, edge_dst in tables:
+                counts = degree[nodes]
+                ends = np.cumsum(counts)
+                if not len(ends) or not ends[-1]:
+                    continue
+                offsets = np.repeat(first_edge[nodes] - (ends - counts), counts)
+                offsets += np.arange(ends[-1])
+                new_keys = np.repeat(row_keys, counts) + edge_dst[offsets]
+                new_keys = new_keys[flat[new_keys] == UNREACHABLE]
+                if len(new_keys):
+                    buckets.setdefault(level + cost, []).append(new_keys)
+    return dist[:, position]
+
+
+def _bfs_order(num_nodes, edges):
+    """Return the nodes in breadth-first order, ignoring edge directions."""
+    neighbors = defaultdict(list)
+    for src, dst, _ in edges:
+        neighbors[src].append(dst)
+        neighbors[dst].append(src)
+    order = []
+    seen = [False] * num_nodes
+    for root in range(num_nodes):
+        if seen[root]:
+            continue
+        seen[root] = True
+        frontier = deque([root])
+        while frontier:
+            node = frontier.popleft()
+            order.append(node)
+            for neighbor in neighbors[node]:
+                if not seen[neighbor]:
+                    seen[neighbor] = True
+                    frontier.append(neighbor)
+    return order
+
+
+def link_table(net_json):
+    """Return the links of `net_json` as a dict `{(addr1, addr2): (c12, c21)}`."""
+    return {
+        (addr1, addr2): (c12, c21) for addr1, addr2, _, _, c12, c21 in net_json["links"]
+    }
+
+
+def apply_change(links, change, target):
+    """Apply one entry of the `changes` schedule to a link table."""
+    if change == "up":
+        addr1, addr2, _, _, c12, c21 = target
+        links[(addr1, addr2)] = (c12, c21)
+    elif change == "down":
+        links.pop((target[0], target[1]), None)
+    elif change == "cost":
+        addr1, addr2, c12, c21 = target
+        if (addr1, addr2) in links:
+            links[(addr1, addr2)] = (c12, c21)
+
+
+def correct_routes(routers, clients, links, max_routes=16):
+    """Compute the lowest-cost routes between every pair of clients.
+
+    Parameters
+    ----------
+    routers
+        The addresses of the routers.
+    clients
+        The addresses of the clients.
+    links
+        A link table as returned by `link_table`.
+    max_routes
+        The maximum number of equal-cost routes listed for each pair of clients.
+
+    Returns
+    -------
+    A list of routes in the format of the `correct_routes` field of the network
+    configurations. Clients do not forward packets, so routes only pass through
+    routers. Pairs that are not connected have no route.
+    """
+    index = {addr: i for i, addr in enumerate(routers)}
+    out_edges = defaultdict(list)  # {router index: [(neighbor index, cost)]}
+    edges = []
+    attached_from = defaultdict(list)  # {client: [(router index, cost to router)]}
+    attached_to = defaultdict(list)  # {client: [(router index, cost from router)]}
+    for (addr1, addr2), (c12, c21) in links.items():
+        for a, b, cost in ((addr1, addr2, c12), (addr2, addr1, c21)):
+            if a in index and b in index:
+                out_edges[index[a]].append((index[b], cost))
+                edges.append((index[a], index[b], cost))
+            elif a in index:
+                attached_to[b].append((index[a], cost))
+            elif b in index:
+                attached_from[a].append((index[b], cost))
+    # Only the costs to the routers that deliver to a client are needed: compute
+    # them from those routers over the reversed edges, one row per router
+    targets = sorted({r for ends in attached_to.values() for r, _ in ends})
+    target_row = {t: i for i, t in enumerate(targets)}
+    reversed_edges = [(b, a, cost) for a, b, cost in edges]
+    dist_to = shortest_paths(len(routers), reversed_edges, targets)
+
+    def router_paths(u, t, limit):
+        """List up to `limit` shortest router paths from `u` to `t`.
+
+        The paths are enumerated depth first with an explicit stack, since
+        shortest paths can be far longer than the recursion limit.
+        """
+        if u == t:
+            return [[u]]
+        to_t = dist_to[target_row[t]]
+        paths = []
+        path = [u]
+        stack = [iter(sorted(out_edges[u]))]
+        while stack:
+            node = path[-1]
+            for v, cost in stack[-1]:
+                if cost + to_t[v] == to_t[node]:
+                    break
+            else:
+                stack.pop()
+                path.pop()
+                continue
+            if v == t:
+                paths.append(path + [v])
+                if len(paths) >= limit:
+                    break
+            else:
+                path.append(v)
+                stack.append(iter(sorted(out_edges[v])))
+        return paths
+
+    routes = []
+    for src in clients:
+        for dst in clients:
+            best_cost = UNREACHABLE
+            ends = []
+            for r1, c1 in attached_from[src]:
+                for r2, c2 in attached_to[dst]:
+                    cost = c1 + dist_to[target_row[r2], r1] + c2
+                    if cost < best_cost:
+                        best_cost, ends = cost, [(r1, r2)]
+                    elif cost == best_cost:
+                        ends.append((r1, r2))
+            if best_cost >= UNREACHABLE:
+                continue
+            found = 0
+            for r1, r2 in ends:
+                for path in router_paths(r1, r2, max_routes - found):
+                    routes.append([src] + [routers[i] for i in path] + [dst])
+                    found += 1
+                if found >= max_routes:
+                    break
+    return routes
+
+
+def topology_hash(net_json, max_routes):
+    """Return a hash of everything in `net_json` the correct routes depend on."""
+    key = {
+        "version": CACHE_VERSION,
+        "max_routes": max_routes,
+        "routers": net_json["routers"],
+        "clients": net_json["clients"],
+        "links": net_json["links"],
+        "changes": net_json.get("changes", []),
+    }
+    data = json.dumps(key, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def route_phases(net_json, max_routes=16, cache_dir=DEFAULT_CACHE_DIR):
+    """Compute the correct routes of every phase of a network configuration.
+
+    A phase starts at time 0 and after every time at which link changes happen.
+    Return a list of dicts with the `time` the phase starts, the number of
+    `changes` applied before it (in the order `Network` applies them) and its
+    `routes`. Results are cached in `cache_dir` under the hash of the topology and
+    its changes; pass `cache_dir=None` to disable the cache.
+    """
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, topology_hash(net_json, max_routes) + ".json")
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    links = link_table(net_json)
+    # Same order as the priority queue of Network.parse_changes
+    changes = sorted(net_json.get("changes", []))
+    phases = []
+    applied = 0
+    while True:
+        time = changes[applied - 1][0] if applied else 0
+        routes = correct_routes(
+            net_json["routers"], net_json["clients"], links, max_routes
+        )
+        phases.append({"time": time, "changes": applied, "routes": routes})
+        if applied == len(changes):
+            break
+        next_time = changes[applied][0]
+        while applied < len(changes) and changes[applied][0] == next_time:
+            _, target, change = changes[applied]
+            apply_change(links, change, target)
+            applied += 1
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(phases, f)
+        os.replace(tmp_path, path)
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the correct routes of a network configuration."
+    )
+    parser.add_argument(
+        "net_json_path",
+        type=str,
+        help="Path to the network simulation configuration file (JSON or binary).",
+    )
+    parser.add_argument(
+        "--max-routes",
+        type=int,
+        default=16,
+        help="Maximum number of equal-cost routes listed per pair of clients.",
+    )
+    parser.add_argument(
+        "--write",
+        action="store_true",
+        help="Replace the correct_routes of the file with the routes of the last "
+        "phase.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Compare the correct_routes of the file with the routes of the last "
+        "phase and exit with status 1 if they differ.",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not read or write the cache."
+    )
+    args = parser.parse_args()
+
+    with open_scenario(args.net_json_path) as scenario:
+        if args.write and isinstance(scenario, BinaryScenario):
+            parser.error("--write needs a JSON configuration file")
+        # Read the sections in the order generate_network.py writes them, so they
+        # are streamed rather than read ahead
+        net_json = {
+            "routers": scenario["routers"],
+            "clients": scenario["clients"],
+            "links": list(scenario.section("links")),
+            "changes": list(scenario.section("changes")),
+        }
+        if args.check:
+            net_json["correct_routes"] = list(scenario.section("correct_routes"))
+    phases = route_phases(
+        net_json,
+        args.max_routes,
+        cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR,
+    )
+    final = phases[-1]["routes"]
+
+    if args.check:
+        expected = sorted(map(tuple, net_json.get("correct_routes", [])))
+        if expected != sorted(map(tuple, final)):
+            print(f"{args.net_json_path}: correct_routes differ")
+            sys.exit(1)
+        print(f"{args.net_json_path}: correct_routes match")
+    elif args.write:
+        # The whole file is rewritten: load it as it is to keep its keys in order
+        with open(args.net_json_path, "r") as f:
+            net_json = json.load(f)
+        net_json["correct_routes"] = final
+        with open(args.net_json_path, "w") as f:
+            json.dump(net_json, f, indent=2)
+    else:
+        json.dump(phases, sys.stdout)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
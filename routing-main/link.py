@@ -2,6 +2,7 @@ import _thread
 import sys
 import queue
 import time
+from metrics import NullMetrics
 
 
 class Link:
@@ -15,9 +16,16 @@ class Link:
         The addresses of the two endpoints of the link.
     l12, l21
         The latencies (in ms) in the e1->e2 and e2->e1 directions, respectively.
+    scheduler
+        Optional scheduler with a `schedule(delay, fn, *args)` method used to deliver
+        packets after their latency. If not provided, every packet is delivered by its
+        own thread.
+    metrics
+        Optional Metrics that count packets and bytes sent into and delivered by the
+        link (see metrics.py).
     """
 
-    def __init__(self, e1, e2, l12, l21, latency):
+    def __init__(self, e1, e2, l12, l21, latency, scheduler=None, metrics=None):
         self.q12 = queue.Queue()
         self.q21 = queue.Queue()
         self.l12 = l12 * latency
@@ -25,33 +33,93 @@ class Link:
         self.latency_multiplier = latency
         self.e1 = e1
         self.e2 = e2
+        self.scheduler = scheduler
+        self.sinks = {}  # Delivery callbacks indexed by endpoint address
+        self.metrics = metrics if metrics is not None else NullMetrics("link", e1)
 
-    def _send_helper(self, packet, src):
+    def connect(self, dst, fn, *args):
         """
-        Run in a separate thread and send packet on link from `src` after waiting for
-        the appropriate latency.
+        Push packets arriving at `dst` by calling `fn(*args, packet)` instead of
+        leaving them in the queue for `recv`. Packets already waiting in the queue are
+        pushed immediately.
+        """
+        self.sinks[dst] = (fn, args)
+        while True:
+            packet = self.recv(dst)
+            if packet is None:
+                break
+            fn(*args, packet)
+
+    def disconnect(self, dst):
+        """Stop pushing packets arriving at `dst`."""
+        self.sinks.pop(dst, None)
+
+    def _add_hop(self, packet, src):
+        """
+        Record the hop of `packet` sent from `src` and return the latency and the
+        receiving endpoint, or `(None, None)` if `src` is not an endpoint of this link.
         """
         if src == self.e1:
             packet.add_to_route(self.e2)
             packet.animate_send(self.e1, self.e2, self.l12)
-            time.sleep(self.l12 / 1000)
-            self.q12.put(packet)
+            return self.l12, self.e2
         elif src == self.e2:
             packet.add_to_route(self.e1)
             packet.animate_send(self.e2, self.e1, self.l21)
-            time.sleep(self.l21 / 1000)
+            return self.l21, self.e1
+        return None, None
+
+    def _deliver(self, dst, packet):
+        """Count `packet` as delivered and hand it to `dst`."""
+        src = self.e1 if dst == self.e2 else self.e2
+        self._count(packet, src, "delivered")
+        self._hand_off(dst, packet)
+
+    def _hand_off(self, dst, packet):
+        """Hand `packet` to `dst`, either through its sink or its queue."""
+        sink = self.sinks.get(dst)
+        if sink is not None:
+            fn, args = sink
+            fn(*args, packet)
+        elif dst == self.e2:
+            self.q12.put(packet)
+        else:
             self.q21.put(packet)
+
+    def _send_helper(self, packet, src):
+        """
+        Run in a separate thread and send packet on link from `src` after waiting for
+        the appropriate latency.
+        """
+        latency, dst = self._add_hop(packet, src)
+        if dst is not None:
+            time.sleep(latency / 1000)
+            self._deliver(dst, packet)
         sys.stdout.flush()
 
     def send(self, packet, src):
         """
         Send packet on link from `src`. Checks that packet content is a string and
-        starts a new thread to send it. `src` must be equal to `self.e1` or `self.e2`.
+        hands it to the scheduler (or a new thread) to deliver after the latency.
+        `src` must be equal to `self.e1` or `self.e2`.
         """
         if packet.content:
             assert isinstance(packet.content, str), "Packet content must be a string"
         p = packet.copy()
-        _thread.start_new_thread(self._send_helper, (p, src))
+        self._count(p, src, "sent")
+        if self.scheduler is None:
+            _thread.start_new_thread(self._send_helper, (p, src))
+            return
+        latency, dst = self._add_hop(p, src)
+        if dst is not None:
+            self.scheduler.schedule(latency, self._deliver, dst, p)
+
+    def _count(self, packet, src, event):
+        self.metrics.inc("link_packets_total", src, packet.kind, event)
+        if packet.content:
+            self.metrics.add(
+                "link_bytes_total", len(packet.content), src, packet.kind, event
+            )
 
     def recv(self, dst, timeout=None):
         """
@@ -0,0 +1,215 @@
+import json
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Exported metrics: {name: (help, label names)}. Every group adds its own label
+# ("router" or "link") in front of these.
+METRICS = {
+    "router_packets_total": (
+        "Packets sent and received by a router.",
+        ("port", "kind", "direction"),
+    ),
+    "router_bytes_total": (
+        "Content bytes of the packets sent and received by a router.",
+        ("port", "kind", "direction"),
+    ),
+    "router_packets_dropped_total": (
+        "Packets that arrived from a link the router has since removed.",
+        (),
+    ),
+    "router_ticks_total": ("Calls of handle_time.", ()),
+    "router_route_computations_total": (
+        "Route computations: DV recompute_routes, LS full and incremental SPF.",
+        ("type",),
+    ),
+    "router_forwarding_changes_total": (
+        "Forwarding table entries added, changed or removed.",
+        (),
+    ),
+    "router_lsps_total": (
+        "Received LSPs by outcome: accepted, stale (old sequence number), ignored "
+        "(own or too old), and LSDB entries expired.",
+        ("result",),
+    ),
+    "link_packets_total": (
+        "Packets sent into a link and delivered by it, by sending endpoint.",
+        ("src", "kind", "event"),
+    ),
+    "link_bytes_total": (
+        "Content bytes of the packets sent into a link and delivered by it.",
+        ("src", "kind", "event"),
+    ),
+}
+KIND_NAMES = {1: "traceroute", 2: "routing"}  # Packet.TRACEROUTE, Packet.ROUTING
+
+
+class Metrics:
+    """
+    The Metrics class holds the counters of one router or link.
+
+    Counters are plain dict entries without locks, so counting costs one dict
+    update. Each counter has a single writer: the counters of a router are written
+    by the thread that runs it, the "sent" counters of a link by the thread of the
+    sending endpoint (they are labelled by `src`), and its "delivered" counters by
+    the thread of the delivery scheduler. Only links without a scheduler, which
+    deliver every packet from its own thread, may lose concurrent increments.
+
+    Parameters
+    ----------
+    group
+        The label that identifies the owner, "router" or "link".
+    name
+        The value of that label.
+    """
+
+    def __init__(self, group, name):
+        self.group = group
+        self.name = name
+        self.counters = defaultdict(int)  # {(metric, *label values): value}
+
+    def inc(self, metric, *labels):
+        """Add one to `metric` with the given label values."""
+        self.counters[(metric,) + labels] += 1
+
+    def add(self, metric, amount, *labels):
+        """Add `amount` to `metric` with the given label values."""
+        self.counters[(metric,) + labels] += amount
+
+
+class NullMetrics(Metrics):
+    """Metrics that count nothing, used while collection is disabled."""
+
+    def inc(self, metric, *labels):
+        pass
+
+    def add(self, metric, amount, *labels):
+        pass
+
+
+class Registry:
+    """
+    The Registry class collects the metrics of every router and link of a network
+    and exports them in the Prometheus text format or as JSON.
+
+    Parameters
+    ----------
+    enabled
+        Whether to count anything. A disabled registry hands out NullMetrics.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.groups = {}  # {(group, name): Metrics}
+        self.lock = threading.Lock()
+
+    def _group(self, group, name):
+        key = (group, name)
+        with self.lock:
+            if key not in self.groups:
+                MetricsClass = Metrics if self.enabled else NullMetrics
+                self.groups[key] = MetricsClass(group, name)
+            return self.groups[key]
+
+    def router(self, addr):
+        """Return the metrics of the router with address `addr`."""
+        return self._group("router", addr)
+
+    def link(self, e1, e2):
+        """Return the metrics of the link between `e1` and `e2`."""
+        return self._group("link", f"{e1}-{e2}")
+
+    def samples(self):
+        """Return every counter as a list of (metric, labels dict, value)."""
+        with self.lock:
+            groups = list(self.groups.values())
+        samples = []
+        for metrics in groups:
+            for key, value in list(metrics.counters.items()):
+                metric, values = key[0], key[1:]
+                labels = {metrics.group: metrics.name}
+                for label, label_value in zip(METRICS[metric][1], values):
+                    if label == "kind":
+                        label_value = KIND_NAMES.get(label_value, label_value)
+                    labels[label] = label_value
+                samples.append((metric, labels, value))
+        return samples
+
+    def get(self, metric, **labels):
+        """Return the sum of `metric` over the counters matching `labels`, e.g.
+        `get("router_lsps_total", router="A", result="stale")`."""
+        total = 0
+        for name, sample_labels, value in self.samples():
+            if name == metric and all(
+                str(sample_labels.get(k)) == str(v) for k, v in labels.items()
+            ):
+                total += value
+        return total
+
+    def to_prometheus(self):
+        """Return all counters in the Prometheus text exposition format."""
+        by_metric = defaultdict(list)
+        for metric, labels, value in self.samples():
+            by_metric[metric].append((labels, value))
+        lines = []
+        for metric in METRICS:
+            if metric not in by_metric:
+                continue
+            lines.append(f"# HELP {metric} {METRICS[metric][0]}")
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(by_metric[metric], key=lambda s: str(s[0])):
+                label_string = ",".join(
+                    f'{k}="{_escape(v)}"' for k, v in labels.items()
+                )
+                lines.append(f"{metric}{{{label_string}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """Return all counters as a JSON list of {"metric", "labels", "value"}."""
+        return json.dumps(
+            [
+                {"metric": metric, "labels": labels, "value": value}
+                for metric, labels, value in self.samples()
+            ]
+        )
+
+    def write(self, path):
+        """Write all counters to `path`, as JSON if it ends with .json and in the
+        Prometheus text format otherwise."""
+        with open(path, "w") as f:
+            f.write(self.to_json() if path.endswith(".json") else self.to_prometheus())
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the counters over HTTP in a background thread, in the Prometheus
+        format at /metrics and as JSON at /metrics.json. Return the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.to_prometheus()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = registry.to_json()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,37 +1,19 @@
 import argparse
 import sys
 import threading
-import json
 import pickle
 import signal
 import time
 import queue
+import metrics
 from collections import defaultdict
-from client import Client
+from aio import AsyncioRuntime
+from client import Client, ProbeSchedule
+from des import EventScheduler
 from link import Link
 from router import Router
-
-
-def json_load_byteified(file_handle):
-    return _byteify(json.load(file_handle, object_hook=_byteify), ignore_dicts=True)
-
-
-def _byteify(data, ignore_dicts=False):
-    # If this is a unicode string, return its string representation
-    if isinstance(data, str):
-        return data.encode("utf-8")
-    # If this is a list of values, return list of byteified values
-    if isinstance(data, list):
-        return [_byteify(item, ignore_dicts=True) for item in data]
-    # If this is a dictionary, return dictionary of byteified keys and values
-    # but only if we haven't already byteified it
-    if isinstance(data, dict) and not ignore_dicts:
-        return {
-            _byteify(key, ignore_dicts=True): _byteify(value, ignore_dicts=True)
-            for key, value in data.items()
-        }
-    # If this is anything else, return it in its original form
-    return data
+from scheduler import DeliveryScheduler
+from topology import open_scenario
 
 
 class Network:
@@ -45,51 +27,183 @@ class Network:
         Whether to use DVrouter, LSrouter, or the default router.
     visualize
         Whether to visualize the network.
+    engine
+        "threads" to run every router and client in its own thread in real time,
+        "asyncio" to run them all as tasks of a single event loop in real time, or
+        "des" to run the whole network as a discrete-event simulation on a simulated
+        clock.
+    auto_routes
+        Whether to compute the correct routes of every phase between link changes
+        from the links (see ground_truth.py) instead of reading `correct_routes`.
+    early_stop
+        Whether to end the run as soon as the routing has converged after the last
+        link change (see convergence.py) instead of waiting until `end_time`.
+    quiet_ms
+        How long the forwarding tables and traceroute routes must stay unchanged to
+        declare convergence. Defaults to one heartbeat plus two client send periods.
+    collect_metrics
+        Whether the routers and links count packets, route computations and the like
+        into `self.metrics` (see metrics.py).
+    timings
+        Whether to time the callbacks and compute steps of every router and the
+        deliveries of links into `self.timings` (see profiling.py).
+    profile_router
+        The address of a router to profile with a SamplingProfiler (`self.profiler`)
+        while the network runs, or None.
+    event_log
+        A path to record packet and link events to with an EventRecorder (see
+        eventlog.py), or None.
+    record
+        A path to save the schedule of inputs of every router to at the end of the
+        run, for replaying the routers deterministically (see replay.py), or None.
+    probes
+        Options of the ProbeSchedule of every client (`sample`, `budget`, `stagger`
+        and `seed`, see client.py), or None to have every client probe every client
+        each send period. With `changed_first`, pairs whose last route visited an
+        endpoint of a changed link are probed first after the change.
     """
 
-    def __init__(self, net_json_path, RouterClass, visualize=False):
-        # Parse configuration details
-        with open(net_json_path, "r") as f:
-            net_json = json.load(f)
+    TICK_MS = 100  # Interval between iterations of the router and client main loops
+
+    def __init__(
+        self,
+        net_json_path,
+        RouterClass,
+        visualize=False,
+        engine="threads",
+        auto_routes=False,
+        early_stop=False,
+        quiet_ms=None,
+        probes=None,
+        collect_metrics=True,
+        timings=False,
+        profile_router=None,
+        event_log=None,
+        record=None,
+    ):
+        if engine not in ("threads", "asyncio", "des"):
+            raise ValueError(f"Unknown engine: {engine}")
+        if visualize and engine == "des":
+            raise ValueError("Visualization requires a real-time engine")
+        self.engine = engine
+        # All links of the network deliver packets through this single scheduler
+        self.scheduler = self.make_scheduler()
+
+        # Parse configuration details. Links, changes and correct routes are streamed
+        # from the file into the structures below (see topology.py)
+        net_json = open_scenario(net_json_path)
         self.latency_multiplier = 100
         self.end_time = net_json["end_time"] * self.latency_multiplier
         self.visualize = visualize
         if visualize:
             self.latency_multiplier *= net_json["visualize"]["time_multiplier"]
         self.client_send_rate = net_json["client_send_rate"] * self.latency_multiplier
+        self.heartbeat_time = self.latency_multiplier * 10
+        self.early_stop = early_stop
+        if quiet_ms is None:
+            quiet_ms = self.heartbeat_time + 2 * self.client_send_rate
+        self.quiet_ms = quiet_ms
+        self.converged_at_ms = None
+        self.probes = dict(probes) if probes is not None else None
+        self.probe_changed_first = False
+        if self.probes is not None:
+            self.probe_changed_first = self.probes.pop("changed_first", False)
+
+        self.metrics = metrics.Registry(enabled=collect_metrics)
+        self.timings = None
+        if timings:
+            from profiling import Timings
+
+            self.timings = Timings()
+        self.recorder = None
+        if event_log is not None:
+            from eventlog import EventRecorder
+
+            self.recorder = EventRecorder(event_log, self.time_ms)
+        self.record_path = record
+        self.schedule_recorder = None
+        if record is not None:
+            from replay import ScheduleRecorder
+
+            self.schedule_recorder = ScheduleRecorder()
 
         # Parse and create routers, clients, and links
         self.routers = self.parse_routers(net_json["routers"], RouterClass)
         self.clients = self.parse_clients(net_json["clients"], self.client_send_rate)
-        self.links = self.parse_links(net_json["links"])
+        self.links = self.parse_links(net_json.section("links"))
 
         # Parse link changes
-        if "changes" in net_json:
-            self.changes = self.parse_changes(net_json["changes"])
-        else:
-            self.changes = None
+        self.last_change_time = 0
+        self.changes = self.parse_changes(net_json.section("changes"))
 
         # Parse correct routes and create some tracking fields
-        self.correct_routes = self.parse_correct_routes(net_json["correct_routes"])
+        self.route_phases = None
+        self.changes_applied = 0
+        if auto_routes:
+            from ground_truth import route_phases
+
+            self.route_phases = {
+                phase["changes"]: self.parse_correct_routes(phase["routes"])
+                for phase in route_phases(self.topology())
+            }
+            self.correct_routes = self.route_phases[0]
+        else:
+            self.correct_routes = self.parse_correct_routes(
+                net_json.section("correct_routes")
+            )
+        net_json.close()
+        self.profiler = None
+        if profile_router is not None:
+            from profiling import SamplingProfiler
+
+            self.profiler = SamplingProfiler(self.routers[profile_router])
         self.threads = []
         self.routes = {}
+        # Routes of a source are only written under its own lock, so clients do not
+        # contend with each other; routes_lock guards resets and the counters below
+        self.source_locks = {addr: threading.Lock() for addr in self.clients}
         self.routes_lock = threading.Lock()
+        self.bad_routes = 0  # Number of recorded routes that are not correct
+        self.routes_version = 0  # Increased whenever a route or its label changes
+        self.route_strings = {}  # {label_incorrect: (routes_version, route string)}
+
+    def make_scheduler(self):
+        """Create the scheduler of the selected engine."""
+        if self.engine == "des":
+            return EventScheduler()
+        if self.engine == "asyncio":
+            return AsyncioRuntime()
+        return DeliveryScheduler()
 
     def parse_routers(self, router_params, RouterClass):
         """Parse routes from the `router_params` dict."""
         routers = {}
         for addr in router_params:
             routers[addr] = RouterClass(
-                addr, heartbeat_time=self.latency_multiplier * 10
+                addr, heartbeat_time=self.heartbeat_time
             )
+            routers[addr].metrics = self.metrics.router(addr)
+            if self.timings is not None:
+                self.timings.instrument_router(routers[addr])
+            if self.recorder is not None:
+                self.recorder.instrument_router(routers[addr])
+            if self.schedule_recorder is not None:
+                self.schedule_recorder.instrument_router(
+                    routers[addr], self.heartbeat_time
+                )
         return routers
 
     def parse_clients(self, client_params, client_send_rate):
         """Parse clients from `client_params` dict."""
         clients = {}
         for addr in client_params:
+            probes = None
+            if self.probes is not None:
+                probes = ProbeSchedule(
+                    addr, client_params, client_send_rate, **self.probes
+                )
             clients[addr] = Client(
-                addr, client_params, client_send_rate, self.update_route
+                addr, client_params, client_send_rate, self.update_route, probes
             )
         return clients
 
@@ -97,31 +211,119 @@ class Network:
         """Parse links from the `link_params` dict."""
         links = {}
         for addr1, addr2, p1, p2, c12, c21 in link_params:
-            link = Link(addr1, addr2, c12, c21, self.latency_multiplier)
+            link = self.make_link(addr1, addr2, c12, c21)
             links[(addr1, addr2)] = (p1, p2, c12, c21, link)
         return links
 
+    def make_link(self, addr1, addr2, c12, c21):
+        """Create a link between `addr1` and `addr2` driven by this network's engine."""
+        link = Link(
+            addr1,
+            addr2,
+            c12,
+            c21,
+            self.latency_multiplier,
+            scheduler=self.scheduler,
+            metrics=self.metrics.link(addr1, addr2),
+        )
+        if self.timings is not None:
+            self.timings.instrument_link(link)
+        if self.recorder is not None:
+            self.recorder.instrument_link(link)
+        return link
+
     def parse_changes(self, changes_params):
-        """Parse link changes from the `changes_params` dict."""
+        """Parse link changes from the `changes_params` list, or return None if
+        there are none."""
         changes = queue.PriorityQueue()
         for change in changes_params:
             changes.put(change)
-        return changes
+            self.last_change_time = max(
+                self.last_change_time, change[0] * self.latency_multiplier
+            )
+        return None if changes.empty() else changes
+
+    def topology(self):
+        """Return the routers, clients, links and changes as a configuration dict,
+        the input of ground_truth.route_phases."""
+        return {
+            "routers": list(self.routers),
+            "clients": list(self.clients),
+            "links": [
+                [addr1, addr2, p1, p2, c12, c21]
+                for (addr1, addr2), (p1, p2, c12, c21, _) in self.links.items()
+            ],
+            "changes": sorted(self.changes.queue) if self.changes else [],
+        }
 
     def parse_correct_routes(self, routes_params):
-        """Parse correct routes from the `routes_params` dict/"""
-        correct_routes = defaultdict(list)
+        """Parse correct routes from the `routes_params` dict into sets of tuples."""
+        correct_routes = defaultdict(set)
         for route in routes_params:
             src, dst = route[0], route[-1]
-            correct_routes[(src, dst)].append(route)
+            correct_routes[(src, dst)].add(tuple(route))
         return correct_routes
 
+    def time_ms(self):
+        """Return the current time of the network in ms."""
+        if self.engine == "des":
+            return self.scheduler.time_ms()
+        return int(round(time.time() * 1000))
+
+    def wait(self, duration_ms):
+        """Let the network run for `duration_ms` ms."""
+        if self.engine == "des":
+            self.scheduler.run(self.scheduler.time_ms() + duration_ms)
+        else:
+            time.sleep(duration_ms / 1000)
+
     def run(self):
         """Run the network.
 
-        Start threads for each client and router. Start thread to track link changes.
-        If not visualizing, wait until end time and print the final routes.
+        Start threads (or schedule events) for each client and router and for link
+        changes. If not visualizing, wait until end time (or until the routing has
+        converged with `early_stop`) and print the final routes.
         """
+        if self.profiler is not None:
+            self.profiler.start()
+        self.start()
+        if not self.visualize:
+            signal.signal(signal.SIGINT, self.handle_interrupt)
+            if self.early_stop:
+                from convergence import ConvergenceMonitor
+
+                monitor = ConvergenceMonitor(self, self.quiet_ms)
+                monitor.start()
+                if monitor.wait(self.end_time):
+                    self.converged_at_ms = monitor.converged_at_ms
+                    sys.stdout.write(f"\nConverged at {self.converged_at_ms} ms\n")
+                else:
+                    sys.stdout.write(f"\nNot converged by {self.end_time} ms\n")
+            else:
+                self.wait(self.end_time)
+            self.final_routes()
+            if self.profiler is not None:
+                self.profiler.stop()
+            sys.stdout.write("\n" + self.get_route_string() + "\n")
+            self.join_all()
+            if self.recorder is not None:
+                self.recorder.close()
+            if self.schedule_recorder is not None:
+                self.schedule_recorder.save(self.record_path)
+
+    def start(self):
+        """Start the clients, routers and link changes on the selected engine."""
+        if self.engine == "des":
+            self.start_events()
+        elif self.engine == "asyncio":
+            self.scheduler.start(self)
+        else:
+            self.start_threads()
+
+    def start_threads(self):
+        """Start threads for each client and router, the link delivery scheduler and
+        a thread for link changes."""
+        self.scheduler.start()
         for router in self.routers.values():
             thread = RouterThread(router)
             thread.start()
@@ -135,12 +337,27 @@ class Network:
             self.handle_changes_thread = HandleChangesThread(self)
             self.handle_changes_thread.start()
 
-        if not self.visualize:
-            signal.signal(signal.SIGINT, self.handle_interrupt)
-            time.sleep(self.end_time / 1000)
-            self.final_routes()
-            sys.stdout.write("\n" + self.get_route_string() + "\n")
-            self.join_all()
+    def start_events(self):
+        """Schedule the main loops of clients and routers and all link changes on the
+        discrete-event scheduler."""
+        for router in self.routers.values():
+            # Handle arrivals as soon as they happen, and call handle_time on every tick
+            router.inbox_listener = lambda router=router: self.scheduler.schedule(
+                0, router.process_inbox
+            )
+            self.scheduler.schedule_periodic(router.TICK_MS, router.step)
+        for client in self.clients.values():
+            self.scheduler.schedule_periodic(self.TICK_MS, client.step)
+        self.add_links()
+        if self.changes:
+            while not self.changes.empty():
+                change_time, target, change = self.changes.get()
+                self.scheduler.schedule_at(
+                    change_time * self.latency_multiplier,
+                    self.apply_change,
+                    change,
+                    target,
+                )
 
     def add_links(self):
         """Add links to clients and routers."""
@@ -170,89 +387,156 @@ class Network:
             ) - current_time
             if wait_time > 0:
                 time.sleep(wait_time / 1000)
-
-            # Link changes
-            if change == "up":
-                addr1, addr2, p1, p2, c12, c21 = target
-                link = Link(addr1, addr2, c12, c21, self.latency_multiplier)
-                self.links[(addr1, addr2)] = (p1, p2, c12, c21, link)
+            self.apply_change(change, target)
+
+    def apply_change(self, change, target):
+        """Apply a single link change from the `changes` schedule."""
+        if change == "up":
+            addr1, addr2, p1, p2, c12, c21 = target
+            link = self.make_link(addr1, addr2, c12, c21)
+            self.links[(addr1, addr2)] = (p1, p2, c12, c21, link)
+            if addr1 in self.routers:
                 self.routers[addr1].change_link(("add", p1, addr2, link, c12))
+            if addr2 in self.routers:
                 self.routers[addr2].change_link(("add", p2, addr1, link, c21))
-            elif change == "down":
-                addr1, addr2 = target
-                p1, p2, _, _, link = self.links[(addr1, addr2)]
+        elif change == "down":
+            addr1, addr2 = target
+            p1, p2, _, _, link = self.links[(addr1, addr2)]
+            if addr1 in self.routers:
                 self.routers[addr1].change_link(("remove", p1))
+            if addr2 in self.routers:
                 self.routers[addr2].change_link(("remove", p2))
-
-            # Update visualization
-            if hasattr(Network, "visualize_changes_callback"):
-                Network.visualize_changes_callback(change, target)
+        elif change == "cost":
+            addr1, addr2, c12, c21 = target
+            p1, p2, _, _, link = self.links[(addr1, addr2)]
+            link.change_latency(addr1, c12)
+            link.change_latency(addr2, c21)
+            self.links[(addr1, addr2)] = (p1, p2, c12, c21, link)
+            if addr1 in self.routers:
+                self.routers[addr1].change_link(("cost", p1, c12))
+            if addr2 in self.routers:
+                self.routers[addr2].change_link(("cost", p2, c21))
+
+        if self.probe_changed_first:
+            self.prioritize_probes(target[0], target[1])
+        self.advance_route_phase()
+
+        # Update visualization
+        if hasattr(Network, "visualize_changes_callback"):
+            Network.visualize_changes_callback(change, target)
+
+    def prioritize_probes(self, addr1, addr2):
+        """Have the clients probe first the pairs whose last route visited `addr1` or
+        `addr2`."""
+        affected = defaultdict(list)
+        # Clients may add new pairs concurrently, so iterate over a snapshot
+        for (src, dst), (route, _, _) in list(self.routes.items()):
+            if addr1 in route or addr2 in route:
+                affected[src].append(dst)
+        for src, dsts in affected.items():
+            self.clients[src].probes.prioritize(dsts)
+
+    def advance_route_phase(self):
+        """Count one applied link change and switch to the correct routes of the
+        next phase once all changes at the same time have been applied."""
+        self.changes_applied += 1
+        if self.route_phases and self.changes_applied in self.route_phases:
+            with self.routes_lock:
+                self.correct_routes = self.route_phases[self.changes_applied]
 
     def update_route(self, src, dst, route):
         """
         Callback function used by clients to update the current routes taken by
         traceroute packets.
         """
-        self.routes_lock.acquire()
-        time_ms = int(round(time.time() * 1000))
-        is_good = route in self.correct_routes[(src, dst)]
-        try:
-            _, _, current_time = self.routes[(src, dst)]
-            if time_ms > current_time:
-                self.routes[(src, dst)] = (route, is_good, time_ms)
-        except KeyError:
-            self.routes[(src, dst)] = (route, is_good, time_ms)
-        finally:
-            self.routes_lock.release()
+        time_ms = self.time_ms()
+        key = (src, dst)
+        is_good = tuple(route) in self.correct_routes.get(key, ())
+        with self.source_locks[src]:
+            previous = self.routes.get(key)
+            if previous is not None and time_ms <= previous[2]:
+                return
+            self.routes[key] = (route, is_good, time_ms)
+            if previous is None or previous[1] != is_good or previous[0] != route:
+                with self.routes_lock:
+                    if previous is not None and not previous[1]:
+                        self.bad_routes -= 1
+                    if not is_good:
+                        self.bad_routes += 1
+                    self.routes_version += 1
+
+    def all_routes_correct(self):
+        """Return True if routes were recorded and all of them are correct."""
+        return len(self.routes) > 0 and self.bad_routes == 0
 
     def get_route_string(self, label_incorrect=True):
         """
         Create a string with all the current routes found by traceroute packets and
-        whether they are correct.
+        whether they are correct. The string is cached until a route changes.
         """
-        self.routes_lock.acquire()
+        with self.routes_lock:
+            version = self.routes_version
+            cached = self.route_strings.get(label_incorrect)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            routes = list(self.routes.items())
+            all_correct = self.all_routes_correct()
+
         route_strings = []
-        all_correcct = True
-        for src, dst in self.routes:
-            route, is_good, _ = self.routes[(src, dst)]
+        for (src, dst), (route, is_good, _) in routes:
             info = "" if (is_good or not label_incorrect) else "Incorrect Route"
             route_strings.append(f"{src} -> {dst}: {route} {info}")
-            if not is_good:
-                all_correcct = False
         route_strings.sort()
-        if all_correcct and len(self.routes) > 0:
+        if all_correct:
             route_strings.append("\nSUCCESS: All Routes correct!")
         else:
             route_strings.append("\nFAILURE: Not all routes are correct")
         route_string = "\n".join(route_strings)
-        self.routes_lock.release()
+        with self.routes_lock:
+            self.route_strings[label_incorrect] = (version, route_string)
         return route_string
 
     def get_route_pickle(self):
         """Create a pickle with the current routes found by traceroute packets."""
-        self.routes_lock.acquire()
-        route_pickle = pickle.dumps(self.routes)
-        self.routes_lock.release()
-        return route_pickle
+        return pickle.dumps(dict(self.routes))
 
     def reset_routes(self):
         """Reset the routes found by traceroute packets."""
-        self.routes_lock.acquire()
-        self.routes = {}
-        self.routes_lock.release()
+        for lock in self.source_locks.values():
+            lock.acquire()
+        with self.routes_lock:
+            self.routes = {}
+            self.bad_routes = 0
+            self.routes_version += 1
+        for lock in self.source_locks.values():
+            lock.release()
 
     def final_routes(self):
-        """Have the clients send one final batch of traceroute packets."""
+        """Have the clients send one final batch of traceroute packets. With
+        `early_stop`, stop waiting as soon as every traceroute has arrived."""
         self.reset_routes()
         for client in self.clients.values():
             client.last_send()
-        time.sleep(4 * self.client_send_rate / 1000)
+        if not self.early_stop:
+            self.wait(4 * self.client_send_rate)
+            return
+        deadline = self.time_ms() + 4 * self.client_send_rate
+        while self.time_ms() < deadline:
+            self.wait(min(self.TICK_MS, deadline - self.time_ms()))
+            if all(route for route, _, _ in list(self.routes.values())):
+                return
 
     def join_all(self):
+        if self.engine == "des":
+            return
+        if self.engine == "asyncio":
+            self.scheduler.stop()
+            return
         if self.changes:
             self.handle_changes_thread.join()
         for thread in self.threads:
             thread.join()
+        self.scheduler.stop()
 
     def handle_interrupt(self, signum, frame):
         self.join_all()
@@ -265,7 +549,7 @@ def main():
     parser.add_argument(
         "net_json_path",
         type=str,
-        help="Path to the network simulation configuration file (JSON).",
+        help="Path to the network simulation configuration file (JSON, or binary from topology.py).",
     )
     parser.add_argument(
         "router",
@@ -275,7 +559,146 @@ def main():
         default=None,
         help="DV for DVrouter and LS for LSrouter. If not provided, Router is used.",
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["threads", "asyncio", "des"],
+        default="threads",
+        help="threads and asyncio run in real time; des runs a discrete-event "
+        "simulation.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of worker processes to partition the network across "
+        "(0 for one per CPU core). Requires a real-time engine.",
+    )
+    parser.add_argument(
+        "--auto-routes",
+        action="store_true",
+        help="Compute the correct routes of every phase from the links instead of "
+        "reading correct_routes from the configuration file.",
+    )
+    parser.add_argument(
+        "--early-stop",
+        action="store_true",
+        help="End the run once the routing has converged after the last link change "
+        "instead of at end_time, and print the convergence instant.",
+    )
+    parser.add_argument(
+        "--quiet-ms",
+        type=int,
+        default=None,
+        help="How long the routing must stay unchanged to declare convergence with "
+        "--early-stop. Defaults to one heartbeat plus two client send periods.",
+    )
+    parser.add_argument(
+        "--probe-sample",
+        type=int,
+        default=0,
+        help="Traceroute destinations per client and send period, taken from a "
+        "random rotation that covers every pair (0 for all clients).",
+    )
+    parser.add_argument(
+        "--probe-budget",
+        type=int,
+        default=0,
+        help="Maximum traceroute packets per client and send period (0 for no "
+        "limit).",
+    )
+    parser.add_argument(
+        "--probe-stagger",
+        action="store_true",
+        help="Give every client a random phase offset within the send period.",
+    )
+    parser.add_argument(
+        "--probe-changed-first",
+        action="store_true",
+        help="After a link change, first probe the pairs whose route visited the "
+        "changed link.",
+    )
+    parser.add_argument(
+        "--probe-seed", type=int, default=0, help="Seed of the probe schedules."
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve router and link metrics over HTTP on this port while running "
+        "(Prometheus format at /metrics, JSON at /metrics.json).",
+    )
+    parser.add_argument(
+        "--no-metrics",
+        action="store_true",
+        help="Do not count router and link metrics.",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        type=str,
+        help="Write router and link metrics to this file at the end of the run (JSON "
+        "if it ends with .json, Prometheus format otherwise).",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Time the callbacks and compute steps of every router and print their "
+        "p50, p99 and max to stderr at the end of the run.",
+    )
+    parser.add_argument(
+        "--profile-router",
+        type=str,
+        help="Sample the stacks of this router while running and write them in the "
+        "collapsed format for flamegraphs to --profile-out.",
+    )
+    parser.add_argument(
+        "--profile-out",
+        type=str,
+        default="profile.collapsed",
+        help="Output file of --profile-router.",
+    )
+    parser.add_argument(
+        "--event-log",
+        type=str,
+        help="Record every packet sent and delivered by links and the packet and "
+        "link callbacks of routers to this binary file (see eventlog.py).",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        help="Save the inputs of every router to this file, to replay the routers "
+        "deterministically with replay.py. Set PYTHONHASHSEED to also reproduce the "
+        "order of the packets they send.",
+    )
     args = parser.parse_args()
+    probes = None
+    if (
+        args.probe_sample
+        or args.probe_budget
+        or args.probe_stagger
+        or args.probe_changed_first
+    ):
+        probes = {
+            "sample": args.probe_sample,
+            "budget": args.probe_budget,
+            "stagger": args.probe_stagger,
+            "changed_first": args.probe_changed_first,
+            "seed": args.probe_seed,
+        }
+    local_options = (
+        args.early_stop
+        or probes is not None
+        or args.metrics_port is not None
+        or args.metrics_out
+        or args.timings
+        or args.profile_router
+        or args.event_log
+        or args.record
+    )
+    if args.shards != 1 and local_options:
+        parser.error(
+            "--early-stop, --probe-*, --metrics-*, --timings, --profile-router, "
+            "--event-log and --record are not supported with --shards"
+        )
 
     RouterClass = Router
     if args.router == "DV":
@@ -287,8 +710,41 @@ def main():
 
         RouterClass = LSrouter
 
-    net = Network(args.net_json_path, RouterClass, visualize=False)
+    if args.shards == 1:
+        net = Network(
+            args.net_json_path,
+            RouterClass,
+            visualize=False,
+            engine=args.engine,
+            auto_routes=args.auto_routes,
+            early_stop=args.early_stop,
+            quiet_ms=args.quiet_ms,
+            probes=probes,
+            collect_metrics=not args.no_metrics,
+            timings=args.timings,
+            profile_router=args.profile_router,
+            event_log=args.event_log,
+            record=args.record,
+        )
+        if args.metrics_port is not None:
+            net.metrics.serve(args.metrics_port)
+    else:
+        from shard import ShardedNetwork
+
+        net = ShardedNetwork(
+            args.net_json_path,
+            RouterClass,
+            engine=args.engine,
+            shards=args.shards,
+            auto_routes=args.auto_routes,
+        )
     net.run()
+    if args.metrics_out:
+        net.metrics.write(args.metrics_out)
+    if args.timings:
+        net.timings.report()
+    if args.profile_router:
+        net.profiler.write(args.profile_out)
 
 
 class RouterThread(threading.Thread):
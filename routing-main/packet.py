@@ -22,21 +22,54 @@ class Packet:
     TRACEROUTE = 1
     ROUTING = 2
 
+    __slots__ = ("kind", "src_addr", "dst_addr", "content", "_route")
+
     def __init__(self, kind, src_addr, dst_addr, content=None):
         self.kind = kind
         self.src_addr = src_addr
         self.dst_addr = dst_addr
         self.content = content
-        self.route = [src_addr]
+        # The route is a chain of (addr, previous) pairs ending at the last hop.
+        # Copies share the chain and extend it without modifying it.
+        self._route = (src_addr, None)
+
+    @property
+    def route(self):
+        """The list of addresses the packet has visited, starting at `src_addr`.
+
+        Returns a new list every time; modifying it does not affect the packet.
+        """
+        route = []
+        node = self._route
+        while node is not None:
+            route.append(node[0])
+            node = node[1]
+        route.reverse()
+        return route
+
+    @route.setter
+    def route(self, route):
+        node = None
+        for addr in route:
+            node = (addr, node)
+        self._route = node
 
     def copy(self):
-        """Create a deep copy of the packet.
+        """Create a copy of the packet that does not alias the original.
 
         This gets called automatically when the packet is sent to avoid aliasing issues.
+        String content is immutable and the route chain is never modified in place, so
+        both are shared with the copy and copying takes constant time.
         """
-        content = copy.deepcopy(self.content)
-        p = Packet(self.kind, self.src_addr, self.dst_addr, content=content)
-        p.route = list(self.route)
+        content = self.content
+        if not (content is None or isinstance(content, str)):
+            content = copy.deepcopy(content)
+        p = Packet.__new__(Packet)
+        p.kind = self.kind
+        p.src_addr = self.src_addr
+        p.dst_addr = self.dst_addr
+        p.content = content
+        p._route = self._route
         return p
 
     @property
@@ -51,7 +84,7 @@ class Packet:
 
     def add_to_route(self, addr):
         """DO NOT CALL from DVrouter or LSrouter!"""
-        self.route.append(addr)
+        self._route = (addr, self._route)
 
     def animate_send(self, src, dst, latency):
         """DO NOT CALL from DVrouter or LSrouter!"""
@@ -0,0 +1,217 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+# Router callbacks, then internal compute steps of DVrouter and LSrouter. Each one
+# that a router has is timed; times are inclusive of nested timed calls.
+TIMED_METHODS = (
+    "handle_packet",
+    "handle_time",
+    "handle_new_link",
+    "handle_remove_link",
+    "handle_link_cost",
+    "handle_link_changes",
+    "recompute_routes",
+    "send_vector",
+    "flush_updates",
+    "_run_dijkstra",
+    "_update_spf",
+    "_broadcast_lsp",
+    "_expire_lsps",
+)
+SUB_BUCKETS = 4  # Buckets per power of two, so a bucket is at most 25% wide
+
+
+class LatencyHistogram:
+    """
+    The LatencyHistogram class counts durations in log-scaled buckets, so recording
+    is O(1) and the memory use does not grow with the number of samples.
+
+    Percentiles are the upper bound of their bucket, within 25% of the true value;
+    the maximum is exact.
+    """
+
+    def __init__(self):
+        self.buckets = Counter()  # {bucket index: count}
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        """Record one duration of `ns` nanoseconds."""
+        bits = ns.bit_length()
+        if bits > 3:
+            index = (bits << 2) | ((ns >> (bits - 3)) & 3)
+        else:
+            index = ns
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    @staticmethod
+    def _upper_bound(index):
+        if index < 16:
+            return index
+        bits, sub = index >> 2, index & 3
+        return ((4 + sub + 1) << (bits - 3)) - 1
+
+    def percentile(self, p):
+        """Return an upper bound of the `p`-th percentile (0-100) in ns."""
+        if not self.count:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        """Return count, mean, p50, p99 and max in microseconds."""
+        return {
+            "count": self.count,
+            "mean_us": round(self.total_ns / self.count / 1000, 3) if self.count else 0,
+            "p50_us": round(self.percentile(50) / 1000, 3),
+            "p99_us": round(self.percentile(99) / 1000, 3),
+            "max_us": round(self.max_ns / 1000, 3),
+        }
+
+
+class Timings:
+    """
+    The Timings class times the callbacks and compute steps of routers and the
+    deliveries of links, with one LatencyHistogram per router and method.
+
+    Timing is opt-in: `instrument_router` and `instrument_link` replace the methods
+    of one object with timed wrappers, and nothing else is slowed down.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # {(owner, method): LatencyHistogram}
+
+    def _timed(self, owner, name, method):
+        histogram = self.histograms.setdefault((owner, name), LatencyHistogram())
+        clock = time.perf_counter_ns
+        record = histogram.record
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(clock() - start)
+
+        return timed
+
+    def instrument_router(self, router):
+        """Time the methods of TIMED_METHODS that `router` has."""
+        for name in TIMED_METHODS:
+            method = getattr(router, name, None)
+            if method is not None:
+                setattr(router, name, self._timed(router.addr, name, method))
+
+    def instrument_link(self, link):
+        """Time the deliveries of `link`. All links share one histogram."""
+        link._deliver = self._timed("links", "deliver", link._deliver)
+
+    def summary(self):
+        """Return {owner: {method: summary}} for every method that was called."""
+        result = {}
+        for (owner, name), histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                result.setdefault(owner, {})[name] = histogram.summary()
+        return result
+
+    def report(self, file=sys.stderr):
+        """Print a table of count, p50, p99 and max per router and method."""
+        print(
+            f"{'owner':<12} {'method':<20} {'count':>8} {'p50 us':>10} "
+            f"{'p99 us':>10} {'max us':>10}",
+            file=file,
+        )
+        for owner, methods in self.summary().items():
+            for name, s in methods.items():
+                print(
+                    f"{owner:<12} {name:<20} {s['count']:>8} {s['p50_us']:>10} "
+                    f"{s['p99_us']:>10} {s['max_us']:>10}",
+                    file=file,
+                )
+
+
+class SamplingProfiler:
+    """
+    The SamplingProfiler class samples the Python stacks that are running code of
+    one router and writes them in the collapsed format of flamegraph.pl and
+    speedscope ("frame;frame;frame count" per line, outermost frame first).
+
+    A background thread looks at the stacks of all threads every `interval_ms` and
+    keeps those with a frame of a method of `router`, so it works whether the
+    router runs in its own thread or shares one with the whole network. Frames are
+    matched by their code object, and `self` is only looked up in frames of the
+    router's methods, so the profiled threads' frames do not get locals dicts.
+
+    Parameters
+    ----------
+    router
+        The router to profile.
+    interval_ms
+        The interval between samples.
+    """
+
+    def __init__(self, router, interval_ms=1):
+        self.router = router
+        self.codes = set()  # Code objects of the methods of the router's class
+        for cls in type(router).__mro__:
+            for value in vars(cls).values():
+                code = getattr(getattr(value, "__func__", value), "__code__", None)
+                if code is not None:
+                    self.codes.add(code)
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()  # {collapsed stack: samples}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._sample(frame)
+
+    def _sample(self, frame):
+        frames = []
+        in_router = False
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            if not in_router and code in self.codes:
+                in_router = frame.f_locals.get("self") is self.router
+            frame = frame.f_back
+        if in_router:
+            self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Return the samples in the collapsed stack format."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
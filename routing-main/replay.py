@@ -0,0 +1,265 @@
+import argparse
+import hashlib
+import importlib
+import os
+import pickle
+import sys
+import time
+from functools import wraps
+from packet import Packet
+
+VERSION = 2
+
+# Events of a router schedule
+TIME = "t"  # ("t", time_ms): handle_time
+PACKET = "p"  # ("p", port, kind, src, dst, content, route): handle_packet
+LINKS = "l"  # ("l", changes): handle_link_changes
+
+
+class ScheduleRecorder:
+    """
+    The ScheduleRecorder class records, for every router of a run, the ordered
+    schedule of its inputs: the packets it handles, the batches of links added and
+    removed and the times `handle_time` is called with.
+
+    A router only sees the network through these calls, so re-running it against
+    its schedule reproduces the run exactly, whatever the thread scheduling and
+    clock were (see `replay`). A digest of the packets every router sends and its
+    final forwarding table are saved too, so a replay can check that it did.
+
+    Routers iterate sets of addresses, whose order depends on the hash seed of the
+    process, so the packets sent only match if the run was recorded with a fixed
+    PYTHONHASHSEED. The seed is saved and `main` replays under the same one.
+    """
+
+    def __init__(self):
+        self.routers = {}  # {addr: router}
+        self.schedules = {}  # {addr: [event]}
+        self.digests = {}  # {addr: hash of the packets sent}
+        self.router_class = None
+        self.heartbeat_time = None
+
+    def instrument_router(self, router, heartbeat_time):
+        """Record the schedule of `router`, created with `heartbeat_time`."""
+        RouterClass = type(router)
+        self.router_class = f"{RouterClass.__module__}.{RouterClass.__qualname__}"
+        self.heartbeat_time = heartbeat_time
+        self.routers[router.addr] = router
+        schedule = self.schedules[router.addr] = []
+        self.digests[router.addr] = _record_sends(router)
+        record = schedule.append
+        handle_packet = router.handle_packet
+        handle_link_changes = router.handle_link_changes
+        handle_time = router.handle_time
+
+        @wraps(handle_packet)
+        def recorded_handle_packet(port, packet):
+            record(
+                (
+                    PACKET,
+                    port,
+                    packet.kind,
+                    packet.src_addr,
+                    packet.dst_addr,
+                    packet.content,
+                    packet.route,
+                )
+            )
+            return handle_packet(port, packet)
+
+        @wraps(handle_link_changes)
+        def recorded_handle_link_changes(changes):
+            record((LINKS, list(changes)))
+            return handle_link_changes(changes)
+
+        @wraps(handle_time)
+        def recorded_handle_time(time_ms):
+            record((TIME, time_ms))
+            return handle_time(time_ms)
+
+        router.handle_packet = recorded_handle_packet
+        router.handle_link_changes = recorded_handle_link_changes
+        router.handle_time = recorded_handle_time
+
+    def save(self, path):
+        """Write the schedules to `path`. Call once the routers have stopped."""
+        recording = {
+            "version": VERSION,
+            "router_class": self.router_class,
+            "heartbeat_time": self.heartbeat_time,
+            "hash_seed": os.environ.get("PYTHONHASHSEED"),
+            "schedules": self.schedules,
+            "digests": {addr: h.hexdigest() for addr, h in self.digests.items()},
+            "tables": {
+                addr: dict(getattr(router, "forwarding_table", {}))
+                for addr, router in self.routers.items()
+            },
+        }
+        with open(path, "wb") as f:
+            pickle.dump(recording, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class ReplayLink:
+    """Stands in for the links of a replayed router: sent packets are dropped."""
+
+    def send(self, packet, src):
+        pass
+
+
+def _record_sends(router):
+    """Hash every packet `router` sends and return the hash object."""
+    digest = hashlib.blake2b(digest_size=16)
+    send = router.send
+
+    @wraps(send)
+    def hashed_send(port, packet):
+        digest.update(
+            repr((port, packet.kind, packet.src_addr, packet.dst_addr, packet.content))
+            .encode("utf-8")
+        )
+        return send(port, packet)
+
+    router.send = hashed_send
+    return digest
+
+
+def load(path):
+    """Load a recording written by ScheduleRecorder."""
+    with open(path, "rb") as f:
+        recording = pickle.load(f)
+    if recording.get("version") != VERSION:
+        raise ValueError(f"{path} is not a recording of version {VERSION}")
+    return recording
+
+
+def router_class(name):
+    """Import the router class called `name` ("module.Class")."""
+    module, _, qualname = name.rpartition(".")
+    RouterClass = importlib.import_module(module)
+    for part in qualname.split("."):
+        RouterClass = getattr(RouterClass, part)
+    return RouterClass
+
+
+def replay_router(addr, schedule, RouterClass, heartbeat_time, instrument=None):
+    """Create a router and run it against `schedule` as fast as possible. Return
+    the router and the hash of the packets it sent.
+
+    `instrument(router)` is called before replaying, e.g. to time the router.
+    """
+    router = RouterClass(addr, heartbeat_time=heartbeat_time)
+    digest = _record_sends(router)
+    if instrument is not None:
+        instrument(router)
+    for event in schedule:
+        kind = event[0]
+        if kind == TIME:
+            router.handle_time(event[1])
+        elif kind == PACKET:
+            _, port, packet_kind, src, dst, content, route = event
+            packet = Packet(packet_kind, src, dst, content)
+            packet.route = route
+            router.handle_packet(port, packet)
+        else:
+            for change in event[1]:
+                if change[0] == "add":
+                    router.links[change[1]] = ReplayLink()
+                elif change[0] == "remove":
+                    router.links.pop(change[1], None)
+            router.handle_link_changes(event[1])
+    return router, digest
+
+
+def replay(recording, routers=None, RouterClass=None, instrument=None):
+    """Replay the routers `routers` (default all) of `recording` one after another
+    and return {addr: (seconds, events, sends match, table matches)}. Whether the
+    sends match is None if the recording has no fixed hash seed.
+
+    With `RouterClass` the schedules are replayed against another implementation;
+    its results then need not match the recording.
+    """
+    if RouterClass is None:
+        RouterClass = router_class(recording["router_class"])
+    results = {}
+    for addr in routers or sorted(recording["schedules"]):
+        schedule = recording["schedules"][addr]
+        start = time.perf_counter()
+        router, digest = replay_router(
+            addr, schedule, RouterClass, recording["heartbeat_time"], instrument
+        )
+        seconds = time.perf_counter() - start
+        sends_match = None
+        if recording["hash_seed"] is not None:
+            sends_match = digest.hexdigest() == recording["digests"][addr]
+        table = dict(getattr(router, "forwarding_table", {}))
+        table_matches = table == recording["tables"][addr]
+        results[addr] = (seconds, len(schedule), sends_match, table_matches)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay the routers of a run recorded with network.py --record."
+    )
+    parser.add_argument("path", type=str, help="The recording.")
+    parser.add_argument(
+        "--routers", type=str, nargs="+", help="Replay only these routers."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Replay this many times, e.g. to profile."
+    )
+    parser.add_argument(
+        "--router-class",
+        type=str,
+        help="Replay against this router class (module.Class) instead of the "
+        "recorded one, e.g. to compare two versions of a router.",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Time the callbacks and compute steps of the routers (see "
+        "profiling.py) and print their p50, p99 and max.",
+    )
+    args = parser.parse_args()
+
+    recording = load(args.path)
+    hash_seed = recording["hash_seed"]
+    if hash_seed is None:
+        print(
+            "Recorded without a fixed PYTHONHASHSEED: comparing forwarding tables only"
+        )
+    elif os.environ.get("PYTHONHASHSEED") != hash_seed:
+        # The hash seed can only be set when the interpreter starts
+        os.environ["PYTHONHASHSEED"] = hash_seed
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    RouterClass = router_class(args.router_class) if args.router_class else None
+    timings = None
+    if args.timings:
+        from profiling import Timings
+
+        timings = Timings()
+    instrument = timings.instrument_router if timings is not None else None
+
+    mismatches = 0
+    for run in range(args.repeat):
+        results = replay(recording, args.routers, RouterClass, instrument)
+        total = sum(seconds for seconds, _, _, _ in results.values())
+        events = sum(count for _, count, _, _ in results.values())
+        print(f"Run {run + 1}: {len(results)} routers, {events} events in {total:.3f} s")
+        for addr, (seconds, count, sends_match, table_matches) in results.items():
+            if sends_match is False or not table_matches:
+                mismatches += 1
+                sends = {None: "not compared", True: "match", False: "differ"}
+                print(
+                    f"  {addr}: differs from the recording "
+                    f"(sent packets {sends[sends_match]}, "
+                    f"forwarding table {'matches' if table_matches else 'differs'})"
+                )
+    if timings is not None:
+        timings.report(sys.stdout)
+    if mismatches and RouterClass is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
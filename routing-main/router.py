@@ -1,5 +1,6 @@
 import time
 import queue
+from metrics import NullMetrics
 
 
 class Router:
@@ -12,6 +13,8 @@ class Router:
     - handle_packet
     - handle_new_link
     - handle_remove_link
+    - handle_link_cost (optional, defaults to removing and re-adding the link)
+    - handle_link_changes (optional, to handle simultaneous link changes at once)
     - handle_time
     - __repr__ (optional, for your own debugging)
 
@@ -23,56 +26,158 @@ class Router:
         Routing information should be sent at least once every heartbeat_time ms.
     """
 
+    TICK_MS = 100  # Interval between calls to handle_time
+
     def __init__(self, addr, heartbeat_time=None):
         self.addr = addr
         self.links = {}  # Links indexed by port
-        self.link_changes = queue.Queue()  # Thread-safe queue for link changes
+        # Thread-safe inbox for arriving packets and link changes
+        self.inbox = queue.Queue()
+        # Optional callback run whenever something is put in the inbox
+        self.inbox_listener = None
         self.keep_running = True
+        # Counters, replaced by those of the network's registry (see metrics.py)
+        self.metrics = NullMetrics("router", addr)
+
+    def _post(self, item):
+        """Put `item` in the inbox and wake up whoever is waiting on it."""
+        self.inbox.put(item)
+        if self.inbox_listener is not None:
+            self.inbox_listener()
 
     def change_link(self, change):
         """Add, remove, or change the cost of a link.
 
-        The `change` argument is a tuple with first element being "add" or "remove".
+        The `change` argument is a tuple with first element being "add", "remove" or
+        "cost".
         """
-        self.link_changes.put(change)
+        self._post(("change", change))
+
+    def deliver(self, port, link, packet):
+        """Called by `link` when `packet` arrives on port number `port`."""
+        self._post(("packet", port, link, packet))
 
     def add_link(self, port, endpointAddr, link, cost):
         """Add new link to router."""
-        if port in self.links:
-            self.remove_link(port)
-        self.links[port] = link
-        self.handle_new_link(port, endpointAddr, cost)
+        self.apply_link_changes([("add", port, endpointAddr, link, cost)])
 
     def remove_link(self, port):
         """Remove link from router."""
-        self.links = {p: link for p, link in self.links.items() if p != port}
-        self.handle_remove_link(port)
+        self.apply_link_changes([("remove", port)])
+
+    def apply_link_changes(self, changes):
+        """Apply a batch of link changes taken from the inbox, in order, then pass
+        them to `handle_link_changes` at once.
+
+        Adding a link on a port that is in use removes the old link first. A cost
+        change on a port without a link is ignored.
+        """
+        batch = []
+        for change in changes:
+            if change[0] == "add":
+                _, port, endpoint, link, cost = change
+                if port in self.links:
+                    self.links.pop(port).disconnect(self.addr)
+                    batch.append(("remove", port))
+                self.links[port] = link
+                link.connect(self.addr, self.deliver, port, link)
+                batch.append(("add", port, endpoint, cost))
+            elif change[0] == "remove":
+                port = change[1]
+                if port in self.links:
+                    self.links.pop(port).disconnect(self.addr)
+                batch.append(("remove", port))
+            elif change[0] == "cost":
+                _, port, cost = change
+                link = self.links.get(port)
+                if link is not None:
+                    endpoint = link.e2 if link.e1 == self.addr else link.e1
+                    batch.append(("cost", port, endpoint, cost))
+        if batch:
+            self.handle_link_changes(batch)
 
     def run(self):
-        """Main loop of router."""
+        """Main loop of router.
+
+        Block on the inbox until a packet or link change arrives, handle everything that
+        is waiting, and call `handle_time` every `TICK_MS` ms.
+        """
+        next_time = time.time() * 1000 + self.TICK_MS
         while self.keep_running:
-            time.sleep(0.1)
-            time_ms = int(round(time.time() * 1000))
+            timeout = (next_time - time.time() * 1000) / 1000
             try:
-                change = self.link_changes.get_nowait()
-                if change[0] == "add":
-                    self.add_link(*change[1:])
-                elif change[0] == "remove":
-                    self.remove_link(*change[1:])
+                self.process_inbox(self.inbox.get(timeout=max(timeout, 0)))
             except queue.Empty:
                 pass
-            for port in self.links.keys():
-                packet = self.links[port].recv(self.addr)
-                if packet:
-                    self.handle_packet(port, packet)
-            self.handle_time(time_ms)
+            time_ms = time.time() * 1000
+            if time_ms >= next_time:
+                self.tick(int(round(time_ms)))
+                next_time = time_ms + self.TICK_MS
+
+    def step(self, time_ms):
+        """Handle everything waiting in the inbox, then call `handle_time` with
+        `time_ms`.
+
+        The discrete-event engine calls this on its simulated clock instead of `run`.
+        """
+        self.process_inbox()
+        self.tick(time_ms)
+
+    def tick(self, time_ms):
+        """Call `handle_time` with `time_ms`. Every engine fires the timer through
+        this method."""
+        self.metrics.inc("router_ticks_total")
+        self.handle_time(time_ms)
+
+    def process_inbox(self, item=None):
+        """Handle `item`, if given, and every packet and link change waiting in the
+        inbox. Consecutive link changes are applied as one batch."""
+        changes = []
+        while True:
+            if item is None:
+                try:
+                    item = self.inbox.get_nowait()
+                except queue.Empty:
+                    break
+            if item[0] == "change":
+                changes.append(item[1])
+            else:
+                if changes:
+                    self.apply_link_changes(changes)
+                    changes = []
+                self._dispatch(item)
+            item = None
+        if changes:
+            self.apply_link_changes(changes)
+
+    def _dispatch(self, item):
+        """Handle a single item taken from the inbox."""
+        if item[0] == "packet":
+            _, port, link, packet = item
+            self.metrics.inc("router_packets_total", port, packet.kind, "in")
+            if packet.content:
+                self.metrics.add(
+                    "router_bytes_total", len(packet.content), port, packet.kind, "in"
+                )
+            # Drop packets still in the inbox from a link that has since been removed
+            if self.links.get(port) is link:
+                self.handle_packet(port, packet)
+            else:
+                self.metrics.inc("router_packets_dropped_total")
+        else:
+            self.apply_link_changes([item[1]])
 
     def send(self, port, packet):
         """Send a packet out given port."""
         try:
             self.links[port].send(packet, self.addr)
         except KeyError:
-            pass
+            return
+        self.metrics.inc("router_packets_total", port, packet.kind, "out")
+        if packet.content:
+            self.metrics.add(
+                "router_bytes_total", len(packet.content), port, packet.kind, "out"
+            )
 
     def handle_packet(self, port, packet):
         """Process incoming packet.
@@ -129,6 +234,50 @@ class Router:
         """
         pass
 
+    def handle_link_cost(self, port, endpoint, cost):
+        """Handle a change of the cost of an existing link.
+
+        Subclasses may override this method to update their routes in place. The
+        default implementation handles it as the removal of the link followed by the
+        addition of a link with the new cost.
+
+        Parameters
+        ----------
+        port
+            The port number of the link.
+        endpoint
+            The address of the other endpoint of the link.
+        cost
+            The new link cost.
+        """
+        self.handle_remove_link(port)
+        self.handle_new_link(port, endpoint, cost)
+
+    def handle_link_changes(self, changes):
+        """Handle link changes that happened at the same time.
+
+        Subclasses may override this method to update their routes once for the
+        whole batch. The default implementation calls `handle_new_link`,
+        `handle_remove_link` or `handle_link_cost` for each change in order.
+
+        This method is called with the link changes waiting in the inbox, for
+        example all the links of a router that failed. The links of the router are
+        already updated when it is called.
+
+        Parameters
+        ----------
+        changes
+            A list of ("add", port, endpoint, cost), ("remove", port) and ("cost",
+            port, endpoint, cost) tuples, in the order the changes happened.
+        """
+        for change in changes:
+            if change[0] == "add":
+                self.handle_new_link(*change[1:])
+            elif change[0] == "cost":
+                self.handle_link_cost(*change[1:])
+            else:
+                self.handle_remove_link(change[1])
+
     def handle_time(self, time_ms):
         """Handle current time.
 
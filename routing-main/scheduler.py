@@ -0,0 +1,79 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class DeliveryScheduler:
+    """
+    The DeliveryScheduler class delivers packets for all links of a network from a
+    single timer heap serviced by one thread, instead of one sleeping thread per
+    packet.
+
+    Callbacks due at the same time run in the order they were scheduled, so packets
+    sent in one direction of a link keep their FIFO order.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.keep_running = True
+        self.scheduled = 0  # Total number of callbacks scheduled
+        self.delivered = 0  # Total number of callbacks run
+
+    @property
+    def in_flight(self):
+        """Number of callbacks (packets) scheduled but not yet delivered."""
+        return self.scheduled - self.delivered
+
+    def time_ms(self):
+        """Return the current time of the scheduler clock in ms."""
+        return time.monotonic() * 1000
+
+    def schedule(self, delay, fn, *args):
+        """Call `fn(*args)` from the scheduler thread after `delay` ms."""
+        due = self.time_ms() + delay
+        with self._cond:
+            self.scheduled += 1
+            heapq.heappush(self._events, (due, next(self._counter), fn, args))
+            if self._events[0][0] == due:
+                self._cond.notify()
+
+    def start(self):
+        """Start the scheduler thread."""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread. Pending callbacks are dropped."""
+        with self._cond:
+            self.keep_running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        """Main loop of the scheduler thread."""
+        events = self._events
+        while True:
+            with self._cond:
+                while self.keep_running:
+                    if not events:
+                        self._cond.wait()
+                        continue
+                    wait_time = events[0][0] - self.time_ms()
+                    if wait_time <= 0:
+                        break
+                    self._cond.wait(wait_time / 1000)
+                if not self.keep_running:
+                    return
+                now = self.time_ms()
+                due = []
+                while events and events[0][0] <= now:
+                    due.append(heapq.heappop(events))
+            for _, _, fn, args in due:
+                fn(*args)
+            with self._cond:
+                self.delivered += len(due)
@@ -0,0 +1,263 @@
+import multiprocessing
+import os
+import signal
+import threading
+from collections import defaultdict, deque
+from client import Client
+from network import Network, HandleChangesThread
+
+
+def partition(routers, clients, links, num_shards):
+    """Assign every router and client to one of `num_shards` shards.
+
+    Routers are taken in breadth-first order over the topology and cut into contiguous
+    chunks of equal size, so that most neighbors share a shard. Every client goes to
+    the shard of the router it is attached to. Return a dict mapping each address to
+    its shard index.
+    """
+    routers = list(routers)
+    neighbors = defaultdict(list)
+    for addr1, addr2 in links:
+        neighbors[addr1].append(addr2)
+        neighbors[addr2].append(addr1)
+    router_set = set(routers)
+
+    order = []
+    seen = set()
+    for root in routers:
+        if root in seen:
+            continue
+        seen.add(root)
+        frontier = deque([root])
+        while frontier:
+            addr = frontier.popleft()
+            order.append(addr)
+            for neighbor in neighbors[addr]:
+                if neighbor in router_set and neighbor not in seen:
+                    seen.add(neighbor)
+                    frontier.append(neighbor)
+
+    chunk = max(1, -(-len(order) // num_shards))
+    shard_of = {addr: i // chunk for i, addr in enumerate(order)}
+    for addr in clients:
+        attached = [n for n in neighbors[addr] if n in shard_of]
+        shard_of[addr] = shard_of[attached[0]] if attached else 0
+    return shard_of
+
+
+class ShardedNetwork(Network):
+    """
+    The ShardedNetwork class runs a network partitioned across worker processes, so
+    that the simulation is not limited to a single core by the GIL.
+
+    Each worker process builds the routers and clients of its shard and the links
+    touching them, and runs them on a real-time engine. Packets on links that cross
+    shards are carried over inter-process queues. This coordinator process applies the
+    link changes and gathers the routes found by traceroute packets.
+
+    Parameters
+    ----------
+    net_json_path
+        The path to the JSON file that contains the network configurations.
+    RouterClass
+        Whether to use DVrouter, LSrouter, or the default router.
+    engine
+        The real-time engine to run in every worker, "threads" or "asyncio".
+    shards
+        The number of worker processes. Defaults to the number of CPU cores.
+    auto_routes
+        Whether to compute the correct routes from the links, as in `Network`.
+    """
+
+    def __init__(
+        self,
+        net_json_path,
+        RouterClass,
+        engine="asyncio",
+        shards=None,
+        auto_routes=False,
+    ):
+        if engine == "des":
+            raise ValueError("Sharded networks require a real-time engine")
+        self.net_json_path = net_json_path
+        self.RouterClass = RouterClass
+        self.num_shards = shards or os.cpu_count()
+        self.workers = []
+        super().__init__(
+            net_json_path, RouterClass, engine=engine, auto_routes=auto_routes
+        )
+
+    # The coordinator only needs the addresses and the link table, not the objects
+    def make_scheduler(self):
+        return None  # Every shard runs its own engine
+
+    def parse_routers(self, router_params, RouterClass):
+        return dict.fromkeys(router_params)
+
+    def parse_clients(self, client_params, client_send_rate):
+        return dict.fromkeys(client_params)
+
+    def parse_links(self, link_params):
+        return {
+            (addr1, addr2): (p1, p2, c12, c21, None)
+            for addr1, addr2, p1, p2, c12, c21 in link_params
+        }
+
+    def start(self):
+        """Partition the network and start one worker process per shard."""
+        self.shard_of = partition(
+            self.routers, self.clients, self.links, self.num_shards
+        )
+        ctx = multiprocessing.get_context()
+        self.inboxes = [ctx.Queue() for _ in range(self.num_shards)]
+        self.results = ctx.Queue()
+        for index in range(self.num_shards):
+            worker = ctx.Process(
+                target=run_shard,
+                args=(
+                    index,
+                    self.net_json_path,
+                    self.RouterClass,
+                    self.engine,
+                    self.shard_of,
+                    self.inboxes,
+                    self.results,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+        for _ in range(self.num_shards):
+            self.results.get()  # ("ready", index)
+
+        self.collect_thread = threading.Thread(target=self.collect_results)
+        self.collect_thread.start()
+        if self.changes:
+            self.handle_changes_thread = HandleChangesThread(self)
+            self.handle_changes_thread.start()
+
+    def collect_results(self):
+        """Record routes reported by the workers until all of them have stopped."""
+        running = self.num_shards
+        while running:
+            message = self.results.get()
+            if message[0] == "route":
+                self.update_route(*message[1:])
+            elif message[0] == "stopped":
+                running -= 1
+
+    def apply_change(self, change, target):
+        """Send a link change to the shards of both endpoints."""
+        for index in {self.shard_of[target[0]], self.shard_of[target[1]]}:
+            self.inboxes[index].put(("change", change, target))
+        self.advance_route_phase()
+
+    def final_routes(self):
+        """Have the clients of every shard send one final batch of traceroute
+        packets."""
+        self.reset_routes()
+        for inbox in self.inboxes:
+            inbox.put(("final",))
+        self.wait(4 * self.client_send_rate)
+
+    def join_all(self):
+        if self.changes:
+            self.handle_changes_thread.join()
+        for inbox in self.inboxes:
+            inbox.put(("stop",))
+        self.collect_thread.join()
+        for worker in self.workers:
+            worker.join()
+
+
+class ShardNetwork(Network):
+    """
+    The ShardNetwork class is the part of a ShardedNetwork that runs in one worker
+    process. It only builds the routers and clients assigned to its shard and the
+    links touching them, and forwards packets for remote endpoints to their shard.
+    """
+
+    def __init__(
+        self, index, net_json_path, RouterClass, engine, shard_of, inboxes, results
+    ):
+        self.index = index
+        self.shard_of = shard_of
+        self.inboxes = inboxes
+        self.results = results
+        super().__init__(net_json_path, RouterClass, engine=engine)
+
+    def is_local(self, addr):
+        return self.shard_of[addr] == self.index
+
+    def parse_routers(self, router_params, RouterClass):
+        local = [addr for addr in router_params if self.is_local(addr)]
+        return super().parse_routers(local, RouterClass)
+
+    def parse_clients(self, client_params, client_send_rate):
+        clients = {}
+        for addr in client_params:
+            if self.is_local(addr):
+                clients[addr] = Client(
+                    addr, client_params, client_send_rate, self.update_route
+                )
+        return clients
+
+    def parse_links(self, link_params):
+        local = [
+            params
+            for params in link_params
+            if self.is_local(params[0]) or self.is_local(params[1])
+        ]
+        return super().parse_links(local)
+
+    def parse_changes(self, changes_params):
+        return None  # Changes are applied by the coordinator
+
+    def parse_correct_routes(self, routes_params):
+        return defaultdict(set)  # Routes are checked by the coordinator
+
+    def make_link(self, addr1, addr2, c12, c21):
+        """Create a link, forwarding packets for a remote endpoint to its shard."""
+        link = super().make_link(addr1, addr2, c12, c21)
+        for addr in (addr1, addr2):
+            if not self.is_local(addr):
+                link.connect(addr, self.forward, (addr1, addr2), addr)
+        return link
+
+    def forward(self, key, dst, packet):
+        """Carry `packet` on link `key` to `dst` in another shard."""
+        self.inboxes[self.shard_of[dst]].put(("packet", key, dst, packet))
+
+    def update_route(self, src, dst, route):
+        self.results.put(("route", src, dst, route))
+
+    def serve(self):
+        """Run the shard until the coordinator stops it."""
+        self.start()
+        self.results.put(("ready", self.index))
+        inbox = self.inboxes[self.index]
+        while True:
+            message = inbox.get()
+            if message[0] == "packet":
+                _, key, dst, packet = message
+                # The sending shard already counted and recorded the delivery
+                if key in self.links:
+                    self.links[key][4]._hand_off(dst, packet)
+            elif message[0] == "change":
+                self.apply_change(*message[1:])
+            elif message[0] == "final":
+                for client in self.clients.values():
+                    client.last_send()
+            elif message[0] == "stop":
+                super().join_all()
+                self.results.put(("stopped", self.index))
+                return
+
+
+def run_shard(index, net_json_path, RouterClass, engine, shard_of, inboxes, results):
+    """Entry point of a shard worker process."""
+    # Let the coordinator handle interrupts and shut the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ShardNetwork(
+        index, net_json_path, RouterClass, engine, shard_of, inboxes, results
+    ).serve()
@@ -0,0 +1,209 @@
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTERS = ("DV", "LS")
+SUCCESS_MESSAGE = "SUCCESS: All Routes correct!"
+FAILURE_MESSAGE = "FAILURE: Not all routes are correct"
+CONVERGED = re.compile(r"^Converged at (\d+) ms$", re.MULTILINE)
+running = set()  # Processes of the runs in progress, stopped on Ctrl-C
+
+
+def run_one(scenario, router, engine, extra_args, timeout, repeat):
+    """Run network.py on one scenario in a new process and return its result.
+
+    The process gets its own process group, so a run that times out is stopped
+    together with any worker processes it started (e.g. with --shards).
+    """
+    command = [sys.executable, os.path.join(ROOT, "network.py"), scenario, router]
+    command += ["--engine", engine] + list(extra_args)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        start_new_session=True,
+    )
+    running.add(process)
+    try:
+        output, _ = process.communicate(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        _kill(process)
+        output, _ = process.communicate()
+        timed_out = True
+    finally:
+        running.discard(process)
+    wall_s = round(time.perf_counter() - start, 3)
+
+    lines = output.rstrip().splitlines()
+    last_line = lines[-1] if lines else ""
+    if timed_out:
+        status = "timeout"
+    elif last_line == SUCCESS_MESSAGE:
+        status = "pass"
+    elif last_line == FAILURE_MESSAGE:
+        status = "fail"
+    else:
+        status = "error"  # Crashed, or printed no verdict
+    converged = CONVERGED.search(output)
+    return {
+        "scenario": os.path.basename(scenario),
+        "router": router,
+        "engine": engine,
+        "repeat": repeat,
+        "status": status,
+        "correct": status == "pass",
+        "returncode": process.returncode,
+        "wall_s": wall_s,
+        "converged_at_ms": int(converged.group(1)) if converged else None,
+        "output": output if status != "pass" else "",
+    }
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass  # Already exited
+
+
+def find_scenarios(scenarios, patterns):
+    """Return the scenario paths to run: `scenarios`, or every JSON file next to
+    network.py, keeping those whose file name matches one of `patterns`."""
+    if not scenarios:
+        scenarios = sorted(glob.glob(os.path.join(ROOT, "*.json")))
+    scenarios = [os.path.abspath(path) for path in scenarios]
+    if patterns:
+        scenarios = [
+            path
+            for path in scenarios
+            if any(
+                fnmatch.fnmatch(os.path.basename(path), pattern)
+                or pattern in os.path.basename(path)
+                for pattern in patterns
+            )
+        ]
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run network.py on every scenario with DVrouter and LSrouter in "
+        "parallel and check that the routes are correct. Unknown options are "
+        "passed on to network.py (e.g. --early-stop).",
+    )
+    parser.add_argument(
+        "scenarios",
+        type=str,
+        nargs="*",
+        help="Network configuration files. Defaults to every JSON file next to "
+        "network.py.",
+    )
+    parser.add_argument(
+        "--routers", type=str, nargs="+", choices=ROUTERS, default=list(ROUTERS)
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        type=str,
+        action="append",
+        default=[],
+        help="Only run scenarios whose file name contains or matches this glob "
+        "pattern. Can be given several times.",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["threads", "asyncio", "des"],
+        default="threads",
+        help="Engine of network.py.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Run every scenario this many times."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of runs at once. Defaults to one per CPU core.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="Seconds after which a run is stopped and counted as timed out.",
+    )
+    parser.add_argument("--json", type=str, help="Write the results to this JSON file.")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Print the output of runs that did not pass.",
+    )
+    args, extra_args = parser.parse_known_args()
+
+    scenarios = find_scenarios(args.scenarios, args.filter)
+    runs = [
+        (scenario, router, repeat)
+        for router in args.routers
+        for scenario in scenarios
+        for repeat in range(args.repeat)
+    ]
+    if not runs:
+        parser.error("no scenario to run")
+    jobs = args.jobs if args.jobs is not None else os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(runs)))
+
+    start = time.perf_counter()
+    results = [None] * len(runs)  # In the order of the runs, not of completion
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = {
+            executor.submit(
+                run_one, scenario, router, args.engine, extra_args, args.timeout, repeat
+            ): n
+            for n, (scenario, router, repeat) in enumerate(runs)
+        }
+        for future in as_completed(futures):
+            result = results[futures[future]] = future.result()
+            print(
+                f"{result['status'].upper():<8} {result['scenario']:<32} "
+                f"{result['router']:<3} {result['wall_s']:>8.2f} s",
+                flush=True,
+            )
+            if args.verbose and result["output"]:
+                print(result["output"])
+    except KeyboardInterrupt:
+        # The runs are in their own sessions and do not get the interrupt
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in list(running):
+            _kill(process)
+        sys.exit(130)
+    executor.shutdown()
+    wall_s = time.perf_counter() - start
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    passed = sum(result["correct"] for result in results)
+    print("=" * 64)
+    print(f"TESTS PASSED: {passed}/{len(results)} in {wall_s:.1f} s")
+    sys.exit(0 if passed == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
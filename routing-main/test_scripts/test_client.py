@@ -0,0 +1,89 @@
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import Client, ProbeSchedule  # noqa: E402
+
+CLIENTS = [f"c{i}" for i in range(20)]
+
+
+def sent_times(client, times):
+    """Call `handle_time` at every time in `times` and return those that sent."""
+    sent = []
+    client.update_fn = lambda src, dst, route: sent.append(now)
+    for now in times:
+        client.handle_time(now)
+    return sorted(set(sent))
+
+
+def test_first_batch_waits_for_offset():
+    probes = ProbeSchedule("c0", CLIENTS, 1000, sample=2, stagger=True)
+    probes.offset = 900
+    client = Client("c0", CLIENTS, 1000, None, probes)
+    # The first tick puts the last batch at time 0, which must not restart the delay
+    assert sent_times(client, range(100, 3000, 100)) == [1100, 2200]
+
+
+def test_first_batch_at_time_zero():
+    probes = ProbeSchedule("c0", CLIENTS, 1000, sample=2)
+    client = Client("c0", CLIENTS, 1000, None, probes)
+    assert sent_times(client, range(0, 2500, 100)) == [100, 1200, 2300]
+
+
+@pytest.mark.parametrize("sample", [1, 3, 7, 20])
+def test_rotation_walks_fixed_permutation(sample):
+    probes = ProbeSchedule("c0", CLIENTS, 1000, sample=sample, seed=5)
+    batches = [probes.next_batch() for _ in range(3 * len(CLIENTS))]
+    assert all(len(batch) == sample for batch in batches)
+    walked = [dst for batch in batches for dst in batch]
+    # The same permutation every cycle, so every client within ceil(C / K) batches
+    assert sorted(walked[: len(CLIENTS)]) == sorted(CLIENTS)
+    assert walked == walked[: len(CLIENTS)] * (len(walked) // len(CLIENTS))
+    window = math.ceil(len(CLIENTS) / sample)
+    for start in range(len(batches) - window + 1):
+        seen = {dst for batch in batches[start : start + window] for dst in batch}
+        assert seen == set(CLIENTS)
+
+
+def test_same_seed_same_schedule():
+    def schedule(addr, seed):
+        probes = ProbeSchedule(addr, CLIENTS, 1000, sample=4, stagger=True, seed=seed)
+        return probes.offset, [probes.next_batch() for _ in range(5)]
+
+    assert schedule("c0", 1) == schedule("c0", 1)
+    assert schedule("c0", 1) != schedule("c0", 2)
+    assert schedule("c0", 1) != schedule("c1", 1)
+
+
+@pytest.mark.parametrize("budget", range(1, 11))
+def test_priority_takes_at_most_half(budget):
+    probes = ProbeSchedule("c0", CLIENTS, 1000, sample=6, budget=budget)
+    prioritized = CLIENTS[::-1]
+    probes.prioritize(prioritized)
+    probed = []
+    for _ in range(len(CLIENTS)):
+        rotation = probes.order[probes.position :] + probes.order[: probes.position]
+        batch = probes.next_batch()
+        assert len(batch) <= budget
+        pending = [dst for dst in prioritized if dst not in probed]
+        first = pending[: budget // 2]
+        # Prioritized destinations go first, in order, then the rotation continues
+        assert batch[: len(first)] == first
+        rotated = rotation[: min(6, budget - len(first))]
+        rest = [dst for dst in rotated if dst not in first]
+        assert batch[len(first) :] == rest
+        probed += first
+
+
+def test_priority_without_budget():
+    probes = ProbeSchedule("c0", CLIENTS, 1000, sample=4)
+    probes.prioritize(["c5", "c6"])
+    probes.prioritize(["c6", "c7"])
+    batch = probes.next_batch()
+    assert batch[:3] == ["c5", "c6", "c7"]
+    assert len(batch) <= 7
+    assert probes.next_batch() == probes.order[4:8]
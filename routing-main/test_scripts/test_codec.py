@@ -0,0 +1,118 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec  # noqa: E402
+from codec import INFINITY, MAGIC  # noqa: E402
+
+compact = codec.get_codec("compact")
+json_codec = codec.get_codec("json")
+
+MESSAGES = [
+    {},
+    [],
+    {"A": 0, "B": 1, "c": 63, "d": 64, "e": 127},
+    # Negative costs and costs whose zigzag varint takes several bytes
+    {"A": -1, "B": -64, "C": -65, "D": 200, "E": 1 << 20, "F": -(1 << 40)},
+    {"A": INFINITY, "B": 3, "C": INFINITY},
+    ["delta", {"A": 2, "B": INFINITY, "C": -3}],
+    {"src": "R1", "seq": 300, "neighbors": {"R2": 1, "R3": 130}, "age": 0},
+    # Non-string keys and non-integer values bypass the dict fast path
+    {1: "a", -2: "b", 1000: {"x": [1, 2.5, None, True, False]}},
+    {"k": "v", "n": None, "f": -0.5, "l": [INFINITY, -INFINITY]},
+    # Strings repeated as keys and values, and non-ASCII strings
+    {"é": "é", "路由": ["路由", "é"]},
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_compact_round_trip(message):
+    content = compact.encode(message)
+    assert isinstance(content, str)
+    assert content.startswith(MAGIC)
+    assert compact.decode(content) == message
+    assert codec.decode(content) == message
+
+
+# JSON turns integer keys into strings, so only messages with string keys
+@pytest.mark.parametrize("message", MESSAGES[:7] + MESSAGES[8:])
+def test_json_round_trip(message):
+    content = json_codec.encode(message)
+    assert codec.decode(content) == message
+
+
+def test_int_keys_stay_int():
+    decoded = compact.decode(compact.encode({7: 1, "7": 2}))
+    assert decoded == {7: 1, "7": 2}
+
+
+def test_infinity_is_one_byte():
+    with_inf = compact.encode({"A": INFINITY})
+    with_zero = compact.encode({"A": 0})
+    assert len(with_inf) == len(with_zero) - 1
+
+
+@pytest.mark.parametrize("value", [0, 1, -1, 63, -64, 64, -65, 8191, 8192, 1 << 62])
+def test_varint_boundaries(value):
+    assert compact.decode(compact.encode({"A": value})) == {"A": value}
+    assert compact.decode(compact.encode([value])) == [value]
+
+
+def test_trailing_bytes():
+    content = compact.encode({"A": 1})
+    with pytest.raises(ValueError):
+        compact.decode(content + "\x00")
+
+
+@pytest.mark.parametrize("message", MESSAGES[1:])
+def test_truncated_input(message):
+    content = compact.encode(message)
+    for end in range(len(MAGIC), len(content)):
+        with pytest.raises(ValueError):
+            compact.decode(content[:end])
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",
+        "not a message",
+        MAGIC + "\x00\x63",  # Unknown tag
+        MAGIC + "\x00\x04\x00",  # String index outside an empty table
+        MAGIC + "\x00\x07\x01\x04\x00\x03\x02",  # Dict key outside the table
+        MAGIC + "\x01\x05abc",  # String shorter than its length
+        MAGIC + "\x00\x03Ā",  # Character outside latin-1
+        MAGIC + "\x00\x07\x01\x06\x00\x06\x00",  # Dict keyed by a list
+        MAGIC + "\x00\x07\x01\x00\x00",  # Dict keyed by None
+        MAGIC + "\x00" + "\x06\x01" * 100000 + "\x06\x00",  # Nested too deeply
+        "[" * 100000 + "]" * 100000,  # JSON nested too deeply
+        "{broken json",
+    ],
+)
+def test_malformed_input(content):
+    with pytest.raises(ValueError):
+        codec.decode(content)
+
+
+def test_max_depth():
+    message = []
+    for _ in range(codec.MAX_DEPTH - 2):
+        message = [message]
+    message = {"A": message}
+    assert compact.decode(compact.encode(message)) == message
+    with pytest.raises(ValueError):
+        compact.decode(compact.encode([message]))
+
+
+@pytest.mark.parametrize("key", [None, True, 1.5, ("A", 1)])
+def test_unsupported_keys(key):
+    with pytest.raises(TypeError):
+        compact.encode({key: 1})
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codec.get_codec("xml")
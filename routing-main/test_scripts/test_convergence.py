@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from convergence import ConvergenceMonitor  # noqa: E402
+
+
+class FakeRouter:
+    def __init__(self):
+        self.forwarding_table = {}
+
+
+class FakeNetwork:
+    """The parts of Network that ConvergenceMonitor uses, on a manual clock. The
+    functions in `events` run when the clock reaches their time."""
+
+    TICK_MS = 100
+
+    def __init__(self, last_change_time=0, events=()):
+        self.now = 1000
+        self.last_change_time = last_change_time
+        self.routers = {"A": FakeRouter(), "B": FakeRouter(), "c": object()}
+        self.routes = {}
+        self.routes_lock = threading.Lock()
+        self.events = sorted(events, key=lambda event: event[0])
+
+    def time_ms(self):
+        return self.now
+
+    def wait(self, duration_ms):
+        self.now += duration_ms
+        while self.events and self.events[0][0] <= self.now - 1000:
+            self.events.pop(0)[1](self)
+
+
+def set_table(addr, dst, port):
+    return lambda network: network.routers[addr].forwarding_table.update({dst: port})
+
+
+def set_route(pair, route):
+    return lambda network: network.routes.update({pair: (route, True, network.now)})
+
+
+def test_converges_after_last_routing_change():
+    network = FakeNetwork(
+        events=[
+            (300, set_table("A", "B", 1)),
+            (500, set_route(("c", "d"), ["c", "A", "B", "d"])),
+            (900, set_table("B", "A", 2)),
+            (1200, set_route(("c", "d"), [])),  # A traceroute on its way
+        ]
+    )
+    monitor = ConvergenceMonitor(network, quiet_ms=1000)
+    monitor.start()
+    assert monitor.wait(10000)
+    assert monitor.converged_at_ms == 900
+    assert network.now - 1000 == 1900
+    assert monitor.routes == {("c", "d"): ["c", "A", "B", "d"]}
+
+
+def test_waits_for_last_scheduled_change():
+    network = FakeNetwork(last_change_time=3000)
+    monitor = ConvergenceMonitor(network, quiet_ms=500)
+    monitor.start()
+    assert monitor.wait(10000)
+    # Nothing changed at all, but a link change was still to come until 3000 ms
+    assert monitor.converged_at_ms == 3000
+    assert network.now - 1000 == 3500
+
+
+def test_not_converged_by_timeout():
+    flapping = [(t, set_table("A", "B", t % 200)) for t in range(100, 5000, 100)]
+    network = FakeNetwork(events=flapping)
+    monitor = ConvergenceMonitor(network, quiet_ms=300)
+    monitor.start()
+    assert not monitor.wait(2000)
+    assert monitor.converged_at_ms is None
+    assert network.now - 1000 == 2000
+
+
+def test_table_modified_during_fingerprint():
+    network = FakeNetwork()
+    monitor = ConvergenceMonitor(network, quiet_ms=300)
+    monitor.start()
+    assert not monitor.poll()
+
+    class Mutating(dict):
+        def items(self):
+            raise RuntimeError("dictionary changed size during iteration")
+
+    network.routers["A"].forwarding_table = Mutating()
+    # Counted as a change, so the quiet period starts over
+    assert monitor.poll()
@@ -0,0 +1,86 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from des import EventScheduler  # noqa: E402
+from DVrouter import DVrouter  # noqa: E402
+from LSrouter import LSrouter  # noqa: E402
+from network import Network  # noqa: E402
+
+SUCCESS_MESSAGE = "SUCCESS: All Routes correct!"
+
+
+def run_des(name, RouterClass):
+    """Run a scenario on the discrete-event engine; return its routes, the time it
+    converged and its output."""
+    path = os.path.join(ROOT, name)
+    network = Network(path, RouterClass, engine="des", early_stop=True)
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        network.run()
+    routes = {key: (route, time_ms) for key, (route, _, time_ms) in network.routes.items()}
+    return routes, network.converged_at_ms, output.getvalue()
+
+
+def run_network(*args):
+    """Run network.py on 01_small_net.json with `args`; return its output."""
+    command = [sys.executable, "network.py", "01_small_net.json", *args]
+    result = subprocess.run(
+        command, cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_event_order():
+    scheduler = EventScheduler()
+    calls = []
+    scheduler.schedule(30, calls.append, "c")
+    scheduler.schedule(10, calls.append, "a1")
+    scheduler.schedule_at(10, calls.append, "a2")  # Same time: in scheduling order
+    scheduler.schedule(20, lambda: scheduler.schedule(0, calls.append, "b2"))
+    scheduler.schedule(20, calls.append, "b1")
+    scheduler.schedule(50, calls.append, "late")
+    scheduler.run(30)
+    assert calls == ["a1", "a2", "b1", "b2", "c"]
+    assert scheduler.time_ms() == 30
+    assert len(scheduler) == 1
+
+
+def test_periodic_and_clock():
+    scheduler = EventScheduler()
+    times = []
+    scheduler.schedule_periodic(100, lambda t: times.append((t, scheduler.time_ms())))
+    scheduler.run(350)
+    assert times == [(100, 100), (200, 200), (300, 300)]
+    # The clock reaches `until` even without an event at that time
+    assert scheduler.time_ms() == 350
+    scheduler.run(400)
+    assert times[-1] == (400, 400)
+
+
+@pytest.mark.parametrize("RouterClass", [DVrouter, LSrouter])
+def test_des_is_deterministic(RouterClass):
+    first = run_des("06_pg242_net_events.json", RouterClass)
+    second = run_des("06_pg242_net_events.json", RouterClass)
+    assert SUCCESS_MESSAGE in first[2]
+    assert first[1] is not None
+    assert first == second
+
+
+@pytest.mark.parametrize("router", ["DV", "LS"])
+def test_asyncio_engine(router):
+    output = run_network(router, "--engine", "asyncio", "--early-stop")
+    assert output.rstrip().endswith(SUCCESS_MESSAGE)
+
+
+def test_sharded_engine():
+    # Two shards, so that links between them carry packets across processes
+    output = run_network("LS", "--shards", "2")
+    assert output.rstrip().endswith(SUCCESS_MESSAGE)
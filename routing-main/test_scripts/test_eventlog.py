@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+import eventlog  # noqa: E402
+from link import Link  # noqa: E402
+from LSrouter import LSrouter  # noqa: E402
+from packet import Packet  # noqa: E402
+
+
+class InstantScheduler:
+    """Deliver every packet as soon as it is sent, on the sending thread."""
+
+    def schedule(self, delay, fn, *args):
+        fn(*args)
+
+
+def test_round_trip_from_threads(tmp_path):
+    path = str(tmp_path / "events.bin")
+    local = threading.local()
+    # Small buffers, so that the threads' records are interleaved in the file
+    recorder = eventlog.EventRecorder(path, lambda: local.now, buffer_records=8)
+    links = [Link(e1, e2, 1, 1, 100, InstantScheduler()) for e1, e2 in ("AB", "BC")]
+    for link in links:
+        recorder.instrument_link(link)
+    threads, sends = 4, 50
+
+    def send(thread):
+        link = links[thread % 2]
+        for n in range(sends):
+            # Times interleave across the threads
+            local.now = n * threads + thread
+            kind = Packet.ROUTING if n % 2 else Packet.TRACEROUTE
+            content = "x" * (thread + 1) if kind == Packet.ROUTING else None
+            link.send(Packet(kind, link.e1, link.e2, content), link.e1)
+
+    workers = [threading.Thread(target=send, args=(t,)) for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    recorder.close()
+
+    log = eventlog.load(path)
+    assert len(log) == recorder.records == 2 * threads * sends
+    times = log.records["time_ms"]
+    assert np.all(times[1:] >= times[:-1])
+    assert sorted(set(times.tolist())) == list(range(threads * sends))
+
+    routing = sends // 2
+    routing_bytes = routing * sum(t + 1 for t in range(threads))
+    assert log.totals() == {
+        ("send", "routing"): (threads * routing, routing_bytes),
+        ("send", "traceroute"): (threads * routing, 0),
+        ("deliver", "routing"): (threads * routing, routing_bytes),
+        ("deliver", "traceroute"): (threads * routing, 0),
+    }
+    # Threads 0 and 2 send on A-B, 1 and 3 on B-C
+    assert log.per_link() == {
+        "A-B": (2 * routing, routing * (1 + 3)),
+        "B-C": (2 * routing, routing * (2 + 4)),
+    }
+    assert log.per_link("deliver", "traceroute") == {
+        "A-B": (2 * routing, 0),
+        "B-C": (2 * routing, 0),
+    }
+    sent = log.select("send", "routing")
+    assert set(log.address(sent["src"])) == {"A", "B"}
+    assert set(log.address(sent["dst"])) == {"B", "C"}
+    assert set(log.link(sent["link"])) == {"A-B", "B-C"}
+
+
+def test_router_events(tmp_path):
+    path = str(tmp_path / "events.bin")
+    clock = iter(range(100))
+    recorder = eventlog.EventRecorder(path, lambda: next(clock))
+    router = LSrouter("A", heartbeat_time=1000)
+    recorder.instrument_router(router)
+    link = Link("A", "B", 1, 1, 100, InstantScheduler())
+    router.add_link(1, "B", link, 3)
+    router.handle_packet(1, Packet(Packet.TRACEROUTE, "x", "y"))
+    router.remove_link(1)
+    recorder.close()
+
+    log = eventlog.load(path)
+    events = [eventlog.EVENT_NAMES[e] for e in log.records["event"]]
+    assert events == ["link_up", "handle", "link_down"]
+    up, handle, down = log.records
+    assert list(log.address([up["src"], up["dst"], handle["src"]])) == ["A", "B", "x"]
+    assert (up["link"], up["size"], handle["link"]) == (1, 3, 1)
+    assert down["dst"] == eventlog.NONE and log.address(down["dst"]) is None
+
+
+def test_empty_and_foreign_files(tmp_path):
+    path = str(tmp_path / "events.bin")
+    eventlog.EventRecorder(path, lambda: 0).close()
+    log = eventlog.load(path)
+    assert len(log) == 0 and log.totals() == {} and log.per_link() == {}
+    other = tmp_path / "other.bin"
+    other.write_bytes(b"not a log")
+    with pytest.raises(ValueError):
+        eventlog.load(str(other))
@@ -0,0 +1,25 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_network  # noqa: E402
+
+
+def test_same_seed_same_network():
+    first = generate_network.generate("waxman", 40, seed=3, flaps=2)
+    second = generate_network.generate("waxman", 40, seed=3, flaps=2)
+    assert first == second
+    assert first["correct_routes"]
+
+
+def test_skip_routes_above_threshold(monkeypatch, capsys):
+    monkeypatch.setattr(generate_network, "MAX_ROUTE_ENTRIES", 20 * 19)
+    net_json = generate_network.generate("ring", 20, clients=0)
+    assert len(net_json["clients"]) == 20
+    assert net_json["correct_routes"] == []
+    assert "--auto-routes" in capsys.readouterr().err
+
+    net_json = generate_network.generate("ring", 20, clients=19)
+    assert net_json["correct_routes"]
@@ -0,0 +1,44 @@
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_network  # noqa: E402
+import ground_truth  # noqa: E402
+
+
+def test_long_paths():
+    # The shortest routes cross half of the ring, far more hops than the
+    # recursion limit
+    n = 3000
+    routers = [f"R{i}" for i in range(n)]
+    links = {(routers[i], routers[(i + 1) % n]): (1, 1) for i in range(n)}
+    links[("A", routers[0])] = (1, 1)
+    links[("B", routers[n // 2])] = (1, 1)
+    routes = ground_truth.correct_routes(routers, ["A", "B"], links)
+
+    a_to_b = sorted(route for route in routes if route[0] == "A" and route[-1] == "B")
+    assert len(a_to_b) == 2
+    for route in a_to_b:
+        assert len(route) == n // 2 + 3
+        assert route[1] == "R0" and route[-2] == routers[n // 2]
+    assert a_to_b[0][2] == "R1" and a_to_b[1][2] == routers[n - 1]
+    assert ["A", "R0", "A"] in routes
+
+
+def test_memory_scales_with_clients():
+    # Distances are only computed to the routers of the clients: a full matrix of
+    # this topology would take 20000^2 * 4 bytes = 1.6 GB
+    net_json = generate_network.generate(
+        "scale-free", 20000, seed=1, clients=4, routes=False
+    )
+    tracemalloc.start()
+    try:
+        phases = ground_truth.route_phases(net_json, cache_dir=None)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(phases[-1]["routes"]) >= 4 * 4
+    assert peak < 64 << 20
@@ -0,0 +1,139 @@
+import copy
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec  # noqa: E402
+import metrics  # noqa: E402
+from DVrouter import INFINITY, DVrouter  # noqa: E402
+from LSrouter import LSrouter  # noqa: E402
+from packet import Packet  # noqa: E402
+
+ROUTERS = [f"R{i}" for i in range(8)]
+CLIENTS = ["c0", "c1"]
+PORTS = range(4)
+
+
+class FakeLink:
+    def __init__(self, e1, e2):
+        self.e1, self.e2 = e1, e2
+
+    def connect(self, addr, deliver, port, link):
+        pass
+
+    def disconnect(self, addr):
+        pass
+
+    def send(self, packet, src):
+        pass
+
+
+def make_router(RouterClass):
+    router = RouterClass("A", heartbeat_time=1000)
+    router.metrics = metrics.Registry().router("A")
+    return router
+
+
+def random_link_changes(rng):
+    """Return a batch of random link changes of router A."""
+    changes = []
+    for _ in range(rng.randint(1, 3)):
+        port = rng.choice(PORTS)
+        action = rng.choice(["add", "add", "remove", "cost"])
+        if action == "add":
+            endpoint = rng.choice(ROUTERS + CLIENTS)
+            changes.append(("add", port, endpoint, FakeLink("A", endpoint), rng.randint(1, 4)))
+        elif action == "remove":
+            changes.append(("remove", port))
+        else:
+            changes.append(("cost", port, rng.randint(1, 4)))
+    return changes
+
+
+def random_neighbors(rng, src):
+    """Return random LSP neighbors of `src`, with small costs so that ties are
+    common."""
+    others = [addr for addr in ["A"] + ROUTERS + CLIENTS if addr != src]
+    return {addr: rng.randint(1, 3) for addr in rng.sample(others, rng.randint(0, 4))}
+
+
+def full_dijkstra(router):
+    """Return the forwarding table and costs of a full Dijkstra on the state of
+    `router`."""
+    fresh = make_router(LSrouter)
+    fresh.link_state_db = copy.deepcopy(router.link_state_db)
+    fresh.link_costs = dict(router.link_costs)
+    fresh.neighbor_endpoints = dict(router.neighbor_endpoints)
+    fresh._run_dijkstra()
+    return fresh.forwarding_table, fresh.spf_dist
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_ls_incremental_spf_matches_dijkstra(seed):
+    rng = random.Random(seed)
+    router = make_router(LSrouter)
+    compact = codec.get_codec("compact")
+    seq = dict.fromkeys(ROUTERS, 0)
+    now = 0
+    for _ in range(80):
+        roll = rng.random()
+        if roll < 0.1:
+            # LSPs that were not refreshed for max_age ms expire
+            now += rng.randint(0, router.max_age // 2)
+            router.handle_time(now)
+        elif roll < 0.4:
+            router.apply_link_changes(random_link_changes(rng))
+        else:
+            src = rng.choice(ROUTERS)
+            seq[src] += 1
+            lsp = {"src": src, "seq": seq[src], "neighbors": random_neighbors(rng, src)}
+            packet = Packet(Packet.ROUTING, src, None, content=compact.encode(lsp))
+            router.handle_packet(rng.choice(PORTS), packet)
+        forwarding_table, dist = full_dijkstra(router)
+        assert router.forwarding_table == forwarding_table
+        assert router.spf_dist == dist
+
+
+def full_recompute(router):
+    """Return the forwarding table and routes_via of a full recompute_routes on a
+    fresh router with the links and neighbor vectors of `router`."""
+    fresh = make_router(DVrouter)
+    fresh.link_costs = dict(router.link_costs)
+    fresh.neighbor_endpoints = dict(router.neighbor_endpoints)
+    fresh.endpoint_ports = copy.deepcopy(router.endpoint_ports)
+    fresh.neighbor_vectors = copy.deepcopy(router.neighbor_vectors)
+    fresh.recompute_routes()
+    return fresh.forwarding_table, fresh.routes_via
+
+
+def non_empty(routes_via):
+    return {port: dsts for port, dsts in routes_via.items() if dsts}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_dv_incremental_recompute_matches_full(seed):
+    rng = random.Random(seed)
+    router = make_router(DVrouter)
+    compact = codec.get_codec("compact")
+    destinations = ROUTERS + CLIENTS
+    for _ in range(80):
+        if rng.random() < 0.3 or not router.link_costs:
+            router.apply_link_changes(random_link_changes(rng))
+        else:
+            # A full vector or a delta, with unreachable and poisoned entries
+            port = rng.choice(list(router.link_costs))
+            vector = {
+                dst: rng.choice([1, 2, 3, 4, INFINITY])
+                for dst in rng.sample(destinations, rng.randint(0, 5))
+            }
+            content = ["delta", vector] if rng.random() < 0.5 else vector
+            src = router.neighbor_endpoints[port]
+            packet = Packet(Packet.ROUTING, src, None, content=compact.encode(content))
+            router.handle_packet(port, packet)
+        forwarding_table, routes_via = full_recompute(router)
+        assert router.forwarding_table == forwarding_table
+        assert non_empty(router.routes_via) == non_empty(routes_via)
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+from link import Link  # noqa: E402
+from packet import Packet  # noqa: E402
+from scheduler import DeliveryScheduler  # noqa: E402
+
+
+def delivered(registry, src):
+    return registry.get("link_packets_total", src=src, event="delivered")
+
+
+def test_hand_off_is_not_counted():
+    # A packet crossing shards is delivered by the sending shard, which counts it,
+    # then handed off to the endpoint by the receiving shard
+    registry = metrics.Registry()
+    link = Link("A", "B", 1, 1, 1, metrics=registry.link("A", "B"))
+    received = []
+    link.connect("B", received.append)
+    packet = Packet(Packet.ROUTING, "A", None, content="x")
+    link._deliver("B", packet)
+    link._hand_off("B", packet)
+    assert received == [packet, packet]
+    assert delivered(registry, "A") == 1
+
+
+def send_all(link, sends):
+    """Send one packet per `(src, content)` of `sends` on `link`; return {content:
+    delivery delay in ms} once all have arrived."""
+    arrivals = {}
+    done = threading.Event()
+
+    def receive(packet):
+        arrivals[packet.content] = time.monotonic()
+        if len(arrivals) == len(sends):
+            done.set()
+
+    link.connect("A", receive)
+    link.connect("B", receive)
+    start = time.monotonic()
+    for src, content in sends:
+        if link.scheduler is not None:
+            # The scheduler takes the latency when the packet is sent
+            link.change_latency(src, int(content))
+        link.send(Packet(Packet.ROUTING, src, None, content=content), src)
+    assert done.wait(5)
+    return {int(content): (t - start) * 1000 for content, t in arrivals.items()}
+
+
+@pytest.mark.parametrize("use_scheduler", [True, False])
+def test_delivery_in_latency_order(use_scheduler):
+    # Latencies of 90 ms from A to B and 30 ms from B to A
+    scheduler = DeliveryScheduler() if use_scheduler else None
+    if scheduler is not None:
+        scheduler.start()
+    try:
+        link = Link("A", "B", 90, 30, 1, scheduler=scheduler)
+        delays = send_all(link, [("A", "90"), ("B", "30")])
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
+    assert sorted(delays, key=delays.get) == [30, 90]
+    for latency, delay in delays.items():
+        assert latency <= delay < latency + 100
+
+
+def test_scheduler_latency_changes():
+    scheduler = DeliveryScheduler()
+    scheduler.start()
+    try:
+        link = Link("A", "B", 1, 1, 1, scheduler=scheduler)
+        delays = send_all(link, [("A", "120"), ("A", "40"), ("A", "80")])
+    finally:
+        scheduler.stop()
+    assert sorted(delays, key=delays.get) == [40, 80, 120]
+    for latency, delay in delays.items():
+        assert latency <= delay < latency + 100
+    assert scheduler.scheduled == scheduler.delivered == 3
+
+
+def test_scheduler_keeps_fifo_order():
+    scheduler = DeliveryScheduler()
+    scheduler.start()
+    try:
+        link = Link("A", "B", 10, 10, 1, scheduler=scheduler)
+        received = []
+        link.connect("B", lambda packet: received.append(packet.content))
+        for n in range(50):
+            link.send(Packet(Packet.ROUTING, "A", None, content=str(n)), "A")
+        deadline = time.monotonic() + 5
+        while len(received) < 50 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    assert received == [str(n) for n in range(50)]
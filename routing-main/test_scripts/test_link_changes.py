@@ -0,0 +1,162 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec  # noqa: E402
+import metrics  # noqa: E402
+from DVrouter import DVrouter  # noqa: E402
+from LSrouter import LSrouter  # noqa: E402
+from packet import Packet  # noqa: E402
+from router import Router  # noqa: E402
+
+
+class FakeLink:
+    def __init__(self, e1="A", e2=None):
+        self.e1, self.e2 = e1, e2
+        self.sent = []
+        self.connected = set()
+
+    def connect(self, addr, deliver, port, link):
+        self.connected.add(addr)
+
+    def disconnect(self, addr):
+        self.connected.discard(addr)
+
+    def send(self, packet, src):
+        self.sent.append(packet)
+
+
+def make_router(RouterClass):
+    router = RouterClass("A", heartbeat_time=1000)
+    registry = metrics.Registry()
+    router.metrics = registry.router("A")
+    return router, registry
+
+
+def post_all(router, changes):
+    for change in changes:
+        router.change_link(change)
+    router.process_inbox()
+
+
+@pytest.mark.parametrize("RouterClass", [Router, DVrouter, LSrouter])
+def test_batch_updates_links(RouterClass):
+    router, _ = make_router(RouterClass)
+    links = [FakeLink() for _ in range(3)]
+    post_all(router, [("add", port, f"R{port}", links[port], 1) for port in range(3)])
+    assert router.links == {0: links[0], 1: links[1], 2: links[2]}
+    post_all(router, [("remove", 0), ("remove", 1)])
+    assert router.links == {2: links[2]}
+    assert "A" not in links[0].connected and "A" in links[2].connected
+
+
+def add_links(router, costs):
+    """Add a link of cost `costs[port]` to router f"R{port}" on every port."""
+    links = [FakeLink("A", f"R{port}") for port in range(len(costs))]
+    changes = [("add", port, f"R{port}", links[port], c) for port, c in enumerate(costs)]
+    post_all(router, changes)
+    return links
+
+
+def test_default_calls_every_handler():
+    calls = []
+
+    class Recorder(Router):
+        def handle_new_link(self, port, endpoint, cost):
+            calls.append(("add", port, endpoint, cost))
+
+        def handle_remove_link(self, port):
+            calls.append(("remove", port))
+
+    router = Recorder("A")
+    old, new = FakeLink(), FakeLink()
+    # Adding on a port in use removes the old link first
+    post_all(router, [("add", 1, "B", old, 2), ("add", 1, "C", new, 3)])
+    assert calls == [("add", 1, "B", 2), ("remove", 1), ("add", 1, "C", 3)]
+    assert router.links == {1: new}
+    # A cost change is a removal followed by an addition, unless handle_link_cost is
+    # overridden; a cost change on a port without a link is ignored
+    calls.clear()
+    post_all(router, [("cost", 1, 5), ("cost", 2, 5)])
+    assert calls == [("remove", 1), ("add", 1, new.e2, 5)]
+    assert router.links == {1: new}
+
+
+def test_ls_one_lsp_per_batch():
+    router, registry = make_router(LSrouter)
+    links = [FakeLink() for _ in range(4)]
+    post_all(router, [("add", port, f"R{port}", links[port], 1) for port in range(4)])
+    assert router.sequence_number == 1
+    assert registry.get("router_route_computations_total", type="spf_incremental") == 1
+    post_all(router, [("remove", port) for port in range(3)])
+    assert router.sequence_number == 2
+    assert router.link_state_db["A"][1] == {"R3": 1}
+
+
+def test_dv_one_recompute_per_batch():
+    router, registry = make_router(DVrouter)
+    links = [FakeLink() for _ in range(4)]
+    post_all(router, [("add", port, f"R{port}", links[port], port + 1) for port in range(4)])
+    assert registry.get("router_route_computations_total", type="recompute") == 1
+    assert router.forwarding_table["R2"] == (2, 3)
+    post_all(router, [("remove", port) for port in range(3)])
+    assert registry.get("router_route_computations_total", type="recompute") == 2
+    assert set(router.forwarding_table) == {"A", "R3"}
+    assert set(router.routes_via) == {3}
+
+
+def test_ls_cost_change_reoriginates_lsp():
+    router, registry = make_router(LSrouter)
+    links = add_links(router, [1, 1])
+    sent = [len(link.sent) for link in links]
+    post_all(router, [("cost", 0, 4)])
+    assert router.sequence_number == 2
+    assert router.link_state_db["A"][1] == {"R0": 4, "R1": 1}
+    # One LSP per neighbor and no database sync, unlike a removal and an addition
+    assert [len(link.sent) - n for link, n in zip(links, sent)] == [1, 1]
+    assert registry.get("router_route_computations_total", type="spf_incremental") == 2
+
+
+def test_dv_cost_change_keeps_neighbor_vectors():
+    router, _ = make_router(DVrouter)
+    add_links(router, [1, 5])
+    router.neighbor_vectors[0] = {"R1": 1}
+    router.neighbor_vectors[1] = {"R0": 1}
+    router.recompute_routes()
+    assert router.forwarding_table["R1"] == (0, 2)
+    # More expensive: the routes through the port move away
+    post_all(router, [("cost", 0, 10)])
+    assert router.forwarding_table == {"A": (None, 0), "R0": (1, 6), "R1": (1, 5)}
+    assert router.neighbor_vectors[0] == {"R1": 1}
+    assert router.routes_via[0] == set()
+    # Cheaper again: the destinations advertised by the neighbor move back
+    post_all(router, [("cost", 0, 1)])
+    assert router.forwarding_table == {"A": (None, 0), "R0": (0, 1), "R1": (0, 2)}
+
+
+def test_dv_zero_coalesce_sends_in_callback():
+    router, _ = make_router(DVrouter)
+    links = add_links(router, [1, 1])
+    # The new neighbors get the full vector in the callback that added them
+    assert all(len(link.sent) == 1 for link in links)
+    router.neighbor_vectors[0] = {}
+    vector = codec.get_codec("compact").encode({"X": 2})
+    router.handle_packet(0, Packet(Packet.ROUTING, "R0", None, content=vector))
+    # The delta for the new destination goes out before any handle_time
+    assert router.forwarding_table["X"] == (0, 3)
+    assert codec.decode(links[1].sent[-1].content) == ["delta", {"X": 3}]
+    # Poisoned for the neighbor it goes through, which already had it as unreachable
+    assert len(links[0].sent) == 1
+
+
+def test_dv_coalesce_waits_for_tick():
+    router = DVrouter("A", heartbeat_time=1000, coalesce_time=200)
+    links = add_links(router, [1, 1])
+    assert all(not link.sent for link in links)
+    router.handle_time(100)
+    assert all(not link.sent for link in links)
+    router.handle_time(200)
+    assert all(len(link.sent) == 1 for link in links)
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import json
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+from DVrouter import DVrouter  # noqa: E402
+from LSrouter import LSrouter  # noqa: E402
+from network import Network  # noqa: E402
+
+ROUTERS, CLIENTS = ("A", "E"), ("b", "c", "d")
+
+
+def run_small_net(RouterClass, collect_metrics=True):
+    path = os.path.join(ROOT, "01_small_net.json")
+    network = Network(path, RouterClass, engine="des", collect_metrics=collect_metrics)
+    with contextlib.redirect_stdout(io.StringIO()):
+        network.run()
+    return network.metrics
+
+
+def link_totals(registry, metric):
+    """Return {(endpoint, kind, "sent" or "delivered"): total} of `metric`, by the
+    endpoint that sent the packets or that they were delivered to."""
+    totals = Counter()
+    for name, labels, value in registry.samples():
+        if name == metric:
+            src, kind, event = labels["src"], labels["kind"], labels["event"]
+            if event == "delivered":
+                e1, e2 = labels["link"].split("-")
+                src = e2 if src == e1 else e1
+            totals[src, kind, event] += value
+    return totals
+
+
+@pytest.mark.parametrize("RouterClass", [DVrouter, LSrouter])
+def test_totals_after_small_run(RouterClass):
+    registry = run_small_net(RouterClass)
+    for unit in ("packets", "bytes"):
+        links = link_totals(registry, f"link_{unit}_total")
+        for router in ROUTERS:
+            for kind in ("routing", "traceroute"):
+                # What a router sends and receives is what its links carry
+                out = registry.get(
+                    f"router_{unit}_total", router=router, kind=kind, direction="out"
+                )
+                assert out == links[router, kind, "sent"]
+                received = registry.get(
+                    f"router_{unit}_total", router=router, kind=kind, direction="in"
+                )
+                assert received == links[router, kind, "delivered"]
+        # Nothing is lost in a run without link changes, but the last heartbeats
+        # may still be in flight when it ends
+        for kind in ("routing", "traceroute"):
+            sent = sum(v for k, v in links.items() if k[1:] == (kind, "sent"))
+            delivered = sum(v for k, v in links.items() if k[1:] == (kind, "delivered"))
+            assert delivered <= sent
+            if kind == "traceroute":
+                assert delivered == sent
+
+    # Every client probes every client each send period, and every probe arrives
+    links = link_totals(registry, "link_packets_total")
+    probes = [links[client, "traceroute", "sent"] for client in CLIENTS]
+    assert probes[0] > 0 and probes[0] % len(CLIENTS) == 0
+    assert probes == [probes[0]] * len(CLIENTS)
+    assert sum(links[c, "traceroute", "delivered"] for c in CLIENTS) == sum(probes)
+    assert registry.get("link_packets_total", kind="routing", src="b") == 0
+    assert registry.get("router_packets_dropped_total") == 0
+
+    ticks = [registry.get("router_ticks_total", router=r) for r in ROUTERS]
+    assert ticks[0] > 0 and ticks == [ticks[0]] * len(ROUTERS)
+    for router in ROUTERS:
+        assert registry.get("router_route_computations_total", router=router) > 0
+        # A route to the other router and to each client
+        changes = registry.get("router_forwarding_changes_total", router=router)
+        assert changes >= len(ROUTERS) - 1 + len(CLIENTS)
+
+
+def test_exports_match_samples():
+    registry = run_small_net(LSrouter)
+    samples = registry.samples()
+    assert json.loads(registry.to_json()) == [
+        {"metric": m, "labels": labels, "value": v} for m, labels, v in samples
+    ]
+    lines = registry.to_prometheus().splitlines()
+    values = [line for line in lines if not line.startswith("#")]
+    assert len(values) == len(samples)
+    total = sum(int(line.rsplit(" ", 1)[1]) for line in values)
+    assert total == sum(v for _, _, v in samples)
+    assert 'router_lsps_total{router="A",result="accepted"}' in "\n".join(values)
+
+
+def test_disabled_registry_counts_nothing():
+    registry = run_small_net(LSrouter, collect_metrics=False)
+    assert registry.samples() == []
+    assert isinstance(registry.router("A"), metrics.NullMetrics)
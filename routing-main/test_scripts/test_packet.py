@@ -0,0 +1,67 @@
+import os
+import pickle
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packet import Packet  # noqa: E402
+
+
+def test_route_matches_list_model():
+    # Every packet is checked against the list the original Packet kept, through
+    # copies that branch from shared prefixes of the chain
+    rng = random.Random(0)
+    packets = [(Packet(Packet.TRACEROUTE, "a", "b"), ["a"])]
+    for n in range(500):
+        packet, route = rng.choice(packets)
+        if rng.random() < 0.5:
+            packet.add_to_route(f"R{n}")
+            route.append(f"R{n}")
+        else:
+            packets.append((packet.copy(), list(route)))
+    for packet, route in packets:
+        assert packet.route == route
+
+
+def test_copies_branch_from_shared_prefix():
+    packet = Packet(Packet.TRACEROUTE, "a", "b")
+    packet.add_to_route("R1")
+    left, right = packet.copy(), packet.copy()
+    left.add_to_route("R2")
+    right.add_to_route("R3")
+    right.add_to_route("b")
+    assert packet.route == ["a", "R1"]
+    assert left.route == ["a", "R1", "R2"]
+    assert right.route == ["a", "R1", "R3", "b"]
+
+
+def test_route_is_a_new_list():
+    packet = Packet(Packet.TRACEROUTE, "a", "b")
+    packet.route.append("R1")
+    assert packet.route == ["a"]
+    packet.route = ["a", "R1", "R2"]
+    packet.add_to_route("b")
+    assert packet.route == ["a", "R1", "R2", "b"]
+
+
+def test_slots_and_pickle():
+    packet = Packet(Packet.ROUTING, "a", None, content="x")
+    packet.add_to_route("R1")
+    assert not hasattr(packet, "__dict__")
+    # Shards pass packets between processes
+    clone = pickle.loads(pickle.dumps(packet))
+    assert (clone.kind, clone.src_addr, clone.dst_addr, clone.content) == (
+        Packet.ROUTING,
+        "a",
+        None,
+        "x",
+    )
+    assert clone.route == ["a", "R1"]
+
+
+def test_copy_does_not_alias_content():
+    packet = Packet(Packet.ROUTING, "a", None, content={"A": [1]})
+    clone = packet.copy()
+    clone.content["A"].append(2)
+    assert packet.content == {"A": [1]}
@@ -0,0 +1,83 @@
+import math
+import os
+import random
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LSrouter import LSrouter  # noqa: E402
+from profiling import LatencyHistogram, SamplingProfiler, Timings  # noqa: E402
+
+
+def true_percentile(values, p):
+    """The smallest value with at least `p` percent of `values` at or below it."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)), 1) - 1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_percentile_within_a_quarter(seed):
+    rng = random.Random(seed)
+    # From a few ns to about a second, spread evenly over the orders of magnitude
+    values = [int(10 ** rng.uniform(0, 9)) for _ in range(2000)]
+    histogram = LatencyHistogram()
+    for ns in values:
+        histogram.record(ns)
+    for p in (0, 1, 10, 25, 50, 75, 90, 99, 99.9, 100):
+        exact = true_percentile(values, p)
+        assert exact <= histogram.percentile(p) <= exact * 1.25
+    assert histogram.percentile(100) == histogram.max_ns == max(values)
+    assert histogram.count == len(values) and histogram.total_ns == sum(values)
+
+
+def test_every_bucket_within_a_quarter():
+    for ns in range(1 << 14):
+        histogram = LatencyHistogram()
+        histogram.record(ns)
+        histogram.record(1 << 20)  # So that the bound of `ns` is not capped by max_ns
+        assert ns <= histogram.percentile(50) <= ns * 1.25
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0
+    assert histogram.summary() == {
+        "count": 0,
+        "mean_us": 0,
+        "p50_us": 0,
+        "p99_us": 0,
+        "max_us": 0,
+    }
+
+
+def test_timings_count_calls():
+    router = LSrouter("A", heartbeat_time=1000)
+    timings = Timings()
+    timings.instrument_router(router)
+    for time_ms in range(0, 1000, 100):
+        router.handle_time(time_ms)
+    summary = timings.summary()["A"]
+    assert summary["handle_time"]["count"] == 10
+    # Methods that were never called are left out
+    assert "handle_packet" not in summary
+
+
+def test_sampling_profiler_finds_router():
+    router = LSrouter("A", heartbeat_time=1000)
+    profiler = SamplingProfiler(router, interval_ms=1)
+
+    def busy(time_ms):
+        end = time.perf_counter() + 0.2
+        while time.perf_counter() < end:
+            pass
+
+    router.handle_time = busy
+    profiler.start()
+    router.step(0)  # Runs handle_time below Router.step on this thread
+    profiler.stop()
+    assert profiler.samples > 0
+    stack = "router.py:step;router.py:tick;test_profiling.py:busy"
+    assert stack in profiler.collapsed()
@@ -0,0 +1,90 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import run_tests  # noqa: E402
+
+# Stands in for network.py: behaves according to the name of the scenario
+FAKE_NETWORK = textwrap.dedent(
+    f"""
+    import os, sys, time
+    name = os.path.basename(sys.argv[1])
+    print("b -> c: ['b', 'A', 'c']")
+    if name.startswith("pass"):
+        print("Converged at 1200 ms")
+        print({run_tests.SUCCESS_MESSAGE!r})
+    elif name.startswith("fail"):
+        print({run_tests.FAILURE_MESSAGE!r})
+    elif name.startswith("crash"):
+        raise RuntimeError("boom")
+    elif name.startswith("silent"):
+        pass
+    else:
+        time.sleep(60)
+    """
+)
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    (tmp_path / "network.py").write_text(FAKE_NETWORK)
+    for name in ("01_small_net.json", "02_small_net_events.json", "05_pg242_net.json"):
+        (tmp_path / name).write_text("{}")
+    monkeypatch.setattr(run_tests, "ROOT", str(tmp_path))
+    return tmp_path
+
+
+def names(paths):
+    return [os.path.basename(path) for path in paths]
+
+
+def test_find_scenarios(root):
+    every = ["01_small_net.json", "02_small_net_events.json", "05_pg242_net.json"]
+    assert names(run_tests.find_scenarios([], [])) == every
+    # Substrings and glob patterns; a scenario matching several is listed once
+    assert names(run_tests.find_scenarios([], ["small"])) == every[:2]
+    assert names(run_tests.find_scenarios([], ["0[15]_*", "pg242"])) == [
+        every[0],
+        every[2],
+    ]
+    assert run_tests.find_scenarios([], ["missing"]) == []
+    # Paths given on the command line are kept, in their order, and made absolute
+    given = [str(root / every[2]), os.path.relpath(root / every[0])]
+    expected = [str(root / every[2]), str(root / every[0])]
+    assert run_tests.find_scenarios(given, []) == expected
+    assert names(run_tests.find_scenarios(given, ["small"])) == [every[0]]
+
+
+@pytest.mark.parametrize(
+    "name, status, converged",
+    [("pass", "pass", 1200), ("fail", "fail", None), ("crash", "error", None)],
+)
+def test_status(root, name, status, converged):
+    result = run_tests.run_one(f"{name}.json", "LS", "des", ["--early-stop"], 30, 2)
+    assert result["status"] == status
+    assert result["correct"] == (status == "pass")
+    assert result["converged_at_ms"] == converged
+    assert (result["scenario"], result["router"], result["repeat"]) == (
+        f"{name}.json",
+        "LS",
+        2,
+    )
+    # The output is only kept for runs that did not pass
+    assert (result["output"] == "") == (status == "pass")
+    assert (result["returncode"] != 0) == (status == "error")
+
+
+def test_no_verdict_is_an_error(root):
+    result = run_tests.run_one("silent.json", "DV", "threads", [], 30, 0)
+    assert result["status"] == "error" and result["returncode"] == 0
+
+
+def test_timeout(root):
+    result = run_tests.run_one("slow.json", "DV", "threads", [], 0.5, 0)
+    assert result["status"] == "timeout" and not result["correct"]
+    assert result["wall_s"] < 30
+    assert run_tests.running == set()
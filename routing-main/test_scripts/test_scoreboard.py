@@ -0,0 +1,89 @@
+import itertools
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from LSrouter import LSrouter  # noqa: E402
+from network import Network  # noqa: E402
+
+GOOD = ["b", "A", "E", "d"]
+BAD = ["b", "A", "c", "A", "E", "d"]
+
+
+def make_network():
+    """A network that is not started, on the simulated clock, so that the test
+    decides when routes arrive."""
+    return Network(os.path.join(ROOT, "01_small_net.json"), LSrouter, engine="des")
+
+
+def test_bad_route_count():
+    network = make_network()
+    assert not network.all_routes_correct()  # No route recorded yet
+    network.update_route("b", "d", [])  # A traceroute sent, not arrived
+    assert network.bad_routes == 1
+    network.wait(1)
+    network.update_route("b", "d", GOOD)
+    assert network.bad_routes == 0 and network.all_routes_correct()
+    network.wait(1)
+    network.update_route("b", "d", BAD)
+    network.update_route("c", "d", ["c", "A", "E", "d"])
+    assert network.bad_routes == 1 and not network.all_routes_correct()
+    network.wait(1)
+    network.update_route("b", "d", GOOD)
+    assert network.bad_routes == 0 and network.all_routes_correct()
+    network.reset_routes()
+    assert network.routes == {} and network.bad_routes == 0
+
+
+def test_older_route_is_ignored():
+    network = make_network()
+    network.wait(10)
+    network.update_route("b", "d", GOOD)
+    # A route recorded at the same instant as the last one does not replace it
+    network.update_route("b", "d", BAD)
+    assert network.routes[("b", "d")] == (GOOD, True, 10)
+    assert network.bad_routes == 0
+
+
+def test_route_string_follows_changes():
+    network = make_network()
+    network.wait(1)
+    network.update_route("b", "d", GOOD)
+    first = network.get_route_string()
+    assert first.endswith("SUCCESS: All Routes correct!")
+    assert network.get_route_string() is first  # Cached while nothing changes
+    network.wait(1)
+    network.update_route("b", "d", BAD)
+    second = network.get_route_string()
+    assert f"b -> d: {BAD} Incorrect Route" in second
+    assert second.endswith("FAILURE: Not all routes are correct")
+    assert "Incorrect Route" not in network.get_route_string(label_incorrect=False)
+
+
+def test_concurrent_sources():
+    network = make_network()
+    network.time_ms = itertools.count(1).__next__  # Every update is newer
+    routes = {
+        ("b", "d"): (GOOD, BAD),
+        ("c", "d"): (["c", "A", "E", "d"], ["c", "A", "b", "A", "E", "d"]),
+        ("d", "b"): (["d", "E", "A", "b"], ["d", "E", "d", "E", "A", "b"]),
+    }
+    barrier = threading.Barrier(len(routes))
+
+    def flap(src, dst):
+        good, bad = routes[src, dst]
+        barrier.wait()
+        for n in range(3001):
+            network.update_route(src, dst, bad if n % 2 else good)
+
+    threads = [threading.Thread(target=flap, args=pair) for pair in routes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The counter of bad routes agrees with the routes after racing updates
+    assert network.bad_routes == 0 and network.all_routes_correct()
+    assert all(is_good for _, is_good, _ in network.routes.values())
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import topology  # noqa: E402
+
+SCENARIOS = ["01_small_net.json", "06_pg242_net_events.json", "07_pg242_net_costs.json"]
+
+
+def read_all(scenario):
+    """Read a scenario in the order Network does."""
+    result = {
+        "routers": scenario["routers"],
+        "clients": scenario["clients"],
+        "links": list(scenario.section("links")),
+        "changes": list(scenario.section("changes")),
+        "correct_routes": list(scenario.section("correct_routes")),
+    }
+    for key in scenario.keys():
+        result[key] = scenario[key]
+    return result
+
+
+def expected(net_json):
+    return dict(net_json, changes=net_json.get("changes", []))
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+@pytest.mark.parametrize("chunk_size", [7, 1 << 20])
+def test_json_streaming(name, chunk_size, monkeypatch):
+    # Small chunks split keys, strings and numbers across reads
+    monkeypatch.setattr(topology, "CHUNK_SIZE", chunk_size)
+    path = os.path.join(ROOT, name)
+    with open(path) as f:
+        net_json = json.load(f)
+    with topology.open_scenario(path) as scenario:
+        assert read_all(scenario) == expected(net_json)
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+def test_binary_round_trip(name, tmp_path):
+    path = os.path.join(ROOT, name)
+    with open(path) as f:
+        net_json = json.load(f)
+    binary = str(tmp_path / "net.topo")
+    topology.convert(path, binary)
+    with topology.open_scenario(binary) as scenario:
+        assert isinstance(scenario, topology.BinaryScenario)
+        assert read_all(scenario) == expected(net_json)
+
+
+def test_sections_in_any_order(tmp_path):
+    with open(os.path.join(ROOT, "02_small_net_events.json")) as f:
+        net_json = json.load(f)
+    # Sections first and keys last: everything read ahead is kept until asked for
+    reordered = {key: net_json[key] for key in reversed(list(net_json))}
+    path = str(tmp_path / "net.json")
+    with open(path, "w") as f:
+        json.dump(reordered, f)
+    with topology.open_scenario(path) as scenario:
+        assert read_all(scenario) == expected(net_json)
+
+
+def test_missing_changes(tmp_path):
+    path = str(tmp_path / "net.json")
+    with open(path, "w") as f:
+        json.dump({"routers": ["A"], "clients": [], "links": []}, f)
+    with topology.open_scenario(path) as scenario:
+        assert not scenario.has_section("changes")
+        assert list(scenario.section("changes")) == []
+        assert "end_time" not in scenario
+
+
+def test_truncated_json(tmp_path):
+    path = str(tmp_path / "net.json")
+    with open(path, "w") as f:
+        f.write('{"routers": ["A"], "links": [["A", "B", 1, 1, 2')
+    with topology.open_scenario(path) as scenario:
+        with pytest.raises(ValueError):
+            list(scenario.section("links"))
@@ -0,0 +1,374 @@
+import abc
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+from collections import deque
+
+# The sections of a scenario that can be large: they are read one element at a time
+SECTIONS = ("links", "changes", "correct_routes")
+
+# Compact binary format, written by `convert`: the magic bytes, the table of
+# contents, the sections, then the JSON header with every other key and the table of
+# addresses that the sections refer to by index.
+MAGIC = b"RTTOPO01"
+TOC = struct.Struct("<QQQQQ")  # links, changes, routes, route words, header offset
+LINK = struct.Struct("<IIiiii")  # addr1, addr2, port1, port2, cost12, cost21
+CHANGE = struct.Struct("<dIIiiiiB3x")  # time, addr1, addr2, ports, costs, kind
+CHANGE_KINDS = ("up", "down", "cost")
+ROUTE_WORD = struct.Struct("<I")  # A route is its length followed by its addresses
+CHUNK_SIZE = 1 << 20
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class Scenario(abc.ABC):
+    """
+    The Scenario class reads a network configuration one section at a time, so the
+    links, changes and correct routes of very large scenarios are never held in
+    memory as JSON.
+
+    Every key other than SECTIONS is available with `scenario[key]`; the sections
+    are iterated once each with `section(name)`. Use `open_scenario` to open a JSON
+    or binary file.
+    """
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, KeyError) is not KeyError
+
+    @abc.abstractmethod
+    def get(self, key, default=None):
+        """Return the value of `key`, or `default` if it is missing."""
+
+    @abc.abstractmethod
+    def keys(self):
+        """Return the keys other than SECTIONS."""
+
+    @abc.abstractmethod
+    def section(self, name):
+        """Iterate over the elements of section `name`; nothing if it is missing."""
+
+    @abc.abstractmethod
+    def has_section(self, name):
+        """Return whether the scenario has section `name`."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JsonScenario(Scenario):
+    """
+    A Scenario read from a JSON file with a streaming parser.
+
+    The file is parsed in order. Sections are streamed as long as they are iterated
+    in the order they appear in the file, after the keys needed to use them, which
+    is the order `generate_network.py` writes. Whatever is read ahead of what was
+    asked for is kept until it is asked for, so any order still works.
+
+    Parameters
+    ----------
+    path
+        The JSON configuration file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "r", encoding="utf-8")
+        self.events = _parse_object(self.file)
+        self.header = {}
+        self.buffers = {}  # {section: deque of elements read ahead}
+        self.current = None  # The section being read
+        self.finished = set()  # Sections read to their end
+        self.done = False
+
+    def _next_event(self, keep):
+        """Read the next event of the file. Elements of sections other than `keep`
+        are kept in their buffer; return the event."""
+        event = next(self.events, None)
+        if event is None:
+            self.done = True
+            return None
+        kind, key, value = event
+        if kind == "value":
+            self.header[key] = value
+        elif kind == "start":
+            self.current = key
+            self.buffers.setdefault(key, deque())
+        elif kind == "item":
+            if key != keep:
+                self.buffers[key].append(value)
+        else:
+            self.current = None
+            self.finished.add(key)
+        return event
+
+    def get(self, key, default=None):
+        while key not in self.header and not self.done:
+            self._next_event(keep=None)
+        return self.header.get(key, default)
+
+    def keys(self):
+        while not self.done:
+            self._next_event(keep=None)
+        return list(self.header)
+
+    def has_section(self, name):
+        while name not in self.buffers and not self.done:
+            self._next_event(keep=None)
+        return name in self.buffers
+
+    def section(self, name):
+        while True:
+            buffer = self.buffers.get(name)
+            if buffer:
+                yield buffer.popleft()
+            elif name in self.finished or self.done:
+                return
+            else:
+                event = self._next_event(keep=name)
+                if event is not None and event[0] == "item" and event[1] == name:
+                    yield event[2]
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryScenario(Scenario):
+    """
+    A Scenario read from the compact binary format written by `convert`. The file
+    is memory-mapped and sections are unpacked one element at a time.
+
+    Parameters
+    ----------
+    path
+        The binary configuration file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a binary topology")
+        counts = TOC.unpack_from(self.data, len(MAGIC))
+        self.num_links, self.num_changes, self.num_routes, route_words = counts[:4]
+        self.header = json.loads(self.data[counts[4] :].decode("utf-8"))
+        self.addresses = self.header.pop("addresses")
+        self.links_offset = len(MAGIC) + TOC.size
+        self.changes_offset = self.links_offset + self.num_links * LINK.size
+        self.routes_offset = self.changes_offset + self.num_changes * CHANGE.size
+        self.routes_end = self.routes_offset + route_words * ROUTE_WORD.size
+        self.sections = self.header.pop("sections")
+
+    def get(self, key, default=None):
+        return self.header.get(key, default)
+
+    def keys(self):
+        return list(self.header)
+
+    def has_section(self, name):
+        return name in self.sections
+
+    def section(self, name):
+        if not self.has_section(name):
+            return iter(())
+        if name == "links":
+            return self._links()
+        if name == "changes":
+            return self._changes()
+        return self._routes()
+
+    def _links(self):
+        addresses = self.addresses
+        view = memoryview(self.data)[self.links_offset : self.changes_offset]
+        for a1, a2, p1, p2, c12, c21 in LINK.iter_unpack(view):
+            yield [addresses[a1], addresses[a2], p1, p2, c12, c21]
+
+    def _changes(self):
+        addresses = self.addresses
+        view = memoryview(self.data)[self.changes_offset : self.routes_offset]
+        for t, a1, a2, p1, p2, c12, c21, kind in CHANGE.iter_unpack(view):
+            t = int(t) if t.is_integer() else t
+            kind = CHANGE_KINDS[kind]
+            if kind == "up":
+                yield [t, [addresses[a1], addresses[a2], p1, p2, c12, c21], kind]
+            elif kind == "cost":
+                yield [t, [addresses[a1], addresses[a2], c12, c21], kind]
+            else:
+                yield [t, [addresses[a1], addresses[a2]], kind]
+
+    def _routes(self):
+        addresses = self.addresses
+        # Native unsigned ints, which are the little-endian words written by convert
+        # on every platform the simulator runs on
+        words = memoryview(self.data)[self.routes_offset : self.routes_end].cast("I")
+        i = 0
+        for _ in range(self.num_routes):
+            length = words[i]
+            yield [addresses[a] for a in words[i + 1 : i + 1 + length]]
+            i += 1 + length
+
+    def close(self):
+        try:
+            self.data.close()
+        except BufferError:
+            pass  # A section is still being iterated; the map closes with it
+
+
+def open_scenario(path):
+    """Open a JSON or binary configuration file as a Scenario."""
+    with open(path, "rb") as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    return BinaryScenario(path) if binary else JsonScenario(path)
+
+
+def convert(src, dst):
+    """Convert the configuration file `src` to the binary format in `dst`."""
+    with open_scenario(src) as scenario, open(dst, "wb") as f:
+        addresses = list(scenario["routers"]) + list(scenario["clients"])
+        index = {addr: i for i, addr in enumerate(addresses)}
+        f.write(MAGIC)
+        f.write(TOC.pack(0, 0, 0, 0, 0))
+
+        num_links = 0
+        for a1, a2, p1, p2, c12, c21 in scenario.section("links"):
+            f.write(LINK.pack(index[a1], index[a2], p1, p2, c12, c21))
+            num_links += 1
+
+        num_changes = 0
+        for t, target, kind in scenario.section("changes"):
+            if kind == "up":
+                a1, a2, p1, p2, c12, c21 = target
+            elif kind == "cost":
+                (a1, a2, c12, c21), p1, p2 = target, 0, 0
+            else:
+                (a1, a2), p1, p2, c12, c21 = target, 0, 0, 0, 0
+            kind = CHANGE_KINDS.index(kind)
+            f.write(CHANGE.pack(t, index[a1], index[a2], p1, p2, c12, c21, kind))
+            num_changes += 1
+
+        num_routes = route_words = 0
+        for route in scenario.section("correct_routes"):
+            words = [len(route)] + [index[addr] for addr in route]
+            f.write(struct.pack(f"<{len(words)}I", *words))
+            num_routes += 1
+            route_words += len(words)
+
+        header_offset = f.tell()
+        header = {key: scenario[key] for key in scenario.keys()}
+        header["addresses"] = addresses
+        header["sections"] = [name for name in SECTIONS if scenario.has_section(name)]
+        f.write(json.dumps(header).encode("utf-8"))
+        f.seek(len(MAGIC))
+        f.write(TOC.pack(num_links, num_changes, num_routes, route_words, header_offset))
+
+
+def _parse_object(f):
+    """Parse the JSON object in file `f` incrementally. Yield ("value", key, value)
+    for its keys other than SECTIONS, and ("start", key, None), ("item", key,
+    element) for every element and ("end", key, None) for the arrays of SECTIONS."""
+    reader = _Reader(f)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key in SECTIONS and reader.peek() == "[":
+            reader.expect("[")
+            yield ("start", key, None)
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield ("item", key, reader.value())
+                    if reader.expect(",", "]") == "]":
+                        break
+            yield ("end", key, None)
+        else:
+            yield ("value", key, reader.value())
+        if reader.expect(",", "}") == "}":
+            return
+
+
+class _Reader:
+    """Reads JSON values from a file in chunks."""
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # Read at least as much as is left, so a large value is retried O(log n) times
+        chunk = self.f.read(max(CHUNK_SIZE, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Skip whitespace and return the next character."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError("Unexpected end of JSON input")
+            self._fill()
+
+    def expect(self, *chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected {' or '.join(chars)} at {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a network configuration file to the compact binary "
+        "format, which network.py and the other tools read like JSON."
+    )
+    parser.add_argument("src", type=str, help="The JSON configuration file.")
+    parser.add_argument("dst", type=str, help="The binary file to write.")
+    args = parser.parse_args()
+    convert(args.src, args.dst)
+    print(
+        f"{args.src}: {os.path.getsize(args.src)} bytes, "
+        f"{args.dst}: {os.path.getsize(args.dst)} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
 import argparse
 from tkinter import *
 import tkinter.font
-import json
 import _thread
 import time
 from router import Router
 from network import Network
+from topology import open_scenario
 from packet import Packet
 
 
@@ -230,6 +230,13 @@ class App:
             addr1, addr2 = target
             self.canvas.delete(self.lines[(addr1, addr2)])
             self.canvas.delete(self.line_labels[(addr1, addr2)])
+        elif change == "cost":
+            addr1, addr2, c12, c21 = target
+            self.canvas.delete(self.lines[(addr1, addr2)])
+            self.canvas.delete(self.line_labels[(addr1, addr2)])
+            new_line, new_label = self.draw_line(addr1, addr2, c12, c21)
+            self.lines[(addr1, addr2)] = new_line
+            self.line_labels[(addr1, addr2)] = new_label
 
 
 def main():
@@ -237,7 +244,7 @@ def main():
     parser.add_argument(
         "net_json_path",
         type=str,
-        help="Path to the network simulation configuration file (JSON).",
+        help="Path to the network simulation configuration file (JSON or binary).",
     )
     parser.add_argument(
         "router",
@@ -247,10 +254,20 @@ def main():
         default=None,
         help="DV for DVrouter and LS for LSrouter. If not provided, Router is used.",
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="Run routers and clients in their own threads or as asyncio tasks.",
+    )
     args = parser.parse_args()
 
-    with open(args.net_json_path, "r") as f:
-        visualize_params = json.load(f)
+    with open_scenario(args.net_json_path) as scenario:
+        visualize_params = {
+            "visualize": scenario["visualize"],
+            "links": list(scenario.section("links")),
+        }
 
     RouterClass = Router
     if args.router == "DV":
@@ -262,7 +279,7 @@ def main():
 
         RouterClass = LSrouter
 
-    net = Network(args.net_json_path, RouterClass, visualize=True)
+    net = Network(args.net_json_path, RouterClass, visualize=True, engine=args.engine)
     root = Tk()
     root.wm_title("Network Visualization")
     App(root, net, visualize_params)